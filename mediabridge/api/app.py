@@ -1,11 +1,13 @@
 import os
+import queue
 
 import typer
 from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
+from mediabridge.api.recommendations import get_recommender, parse_request
 from mediabridge.config.backend import ENV_TO_CONFIG
 from mediabridge.db.tables import Base
 
@@ -51,6 +53,32 @@ def create_app(config_name: str | None = None) -> Flask:
             movies_list = [row._asdict() for row in movies]
             return jsonify(movies_list), 200
 
+    @app.route("/api/v1/recommendations", methods=["POST"])  # type: ignore
+    def recommendations() -> tuple[Response, int]:
+        try:
+            req = parse_request(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            movie_ids = get_recommender(app).submit(
+                req, app.config["RECOMMENDER_TIMEOUT_SECONDS"]
+            )
+        except queue.Full:
+            return jsonify({"error": "Too busy, please retry."}), 503
+        except TimeoutError:
+            return jsonify({"error": "Timed out, please retry."}), 503
+
+        select = text("SELECT * FROM movie_title WHERE id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(select, {"ids": movie_ids}).fetchall()
+        by_id = {row.id: row._asdict() for row in rows}
+        movies_list = [
+            by_id.get(i, {"id": i, "year": None, "title": None}) for i in movie_ids
+        ]
+        return jsonify(movies_list), 200
+
     return app
 
 
@@ -1,7 +1,17 @@
+import queue
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from flask import Flask
 from flask.testing import FlaskClient
 from sqlalchemy import text
 
 from mediabridge.api.app import create_app, db
+from mediabridge.api.recommendations import get_recommender
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.engine.model_artifact import export_model
 
 
 class MovieSearchTest:
@@ -9,10 +19,10 @@ class MovieSearchTest:
         ins = """
         INSERT INTO movie_title (id, year, title)
         VALUES
-            ('1', 2010, 'Inception'),
-            ('2', 1999, 'The Matrix'),
-            ('3', 1994, 'The Shawshank Redemption'),
-            ('4', 1994, 'Toy Story')
+            (1, 2010, 'Inception'),
+            (2, 1999, 'The Matrix'),
+            (3, 1994, 'The Shawshank Redemption'),
+            (4, 1994, 'Toy Story')
         """
         with db.engine.connect() as conn:
             conn.execute(text(ins))
@@ -26,7 +36,7 @@ class MovieSearchTest:
         response = client.get("/api/v1/movie/search?q=Inception")
         assert response.status_code == 200
         data = response.get_json()
-        assert data == [{"id": "1", "year": 2010, "title": "Inception"}]
+        assert data == [{"id": 1, "year": 2010, "title": "Inception"}]
 
     def test_movie_search_multiple_results(self, client: FlaskClient) -> None:
         self._insert_movies()
@@ -34,8 +44,8 @@ class MovieSearchTest:
         assert response.status_code == 200
         data = response.get_json()
         assert data == [
-            {"id": "1", "year": 2010, "title": "Inception"},
-            {"id": "3", "year": 1994, "title": "The Shawshank Redemption"},
+            {"id": 1, "year": 2010, "title": "Inception"},
+            {"id": 3, "year": 1994, "title": "The Shawshank Redemption"},
         ]
 
     def test_movie_search_no_results(self, client: FlaskClient) -> None:
@@ -50,3 +60,72 @@ class MovieSearchTest:
         assert response.status_code == 400
         data = response.get_json()
         assert data == {"error": "Query parameter 'q' is required."}
+
+
+class RecommendationsTest:
+    @pytest.fixture
+    def serving_app(
+        self,
+        app: Flask,
+        two_tastes_model: Any,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> Flask:
+        """Serves the two tastes model, whose odd users like odd movies."""
+        monkeypatch.delenv("MONGODB_URI", raising=False)  # scoring needs no Mongo
+        id_maps = IdMaps(
+            IdMap.from_ids(np.arange(200)), IdMap.from_ids(np.arange(40) + 100)
+        )
+        export_model(two_tastes_model, id_maps, tmp_path)
+        app.config["RECOMMENDER_MODEL"] = tmp_path
+        movies = ", ".join(f"({i}, 2000, 'Movie {i}')" for i in range(100, 140))
+        with db.engine.connect() as conn:
+            conn.execute(text(f"INSERT INTO movie_title VALUES {movies}"))
+            conn.commit()
+        return app
+
+    def test_recommendations(self, serving_app: Flask) -> None:
+        with serving_app.test_client() as client:
+            response = client.post(
+                "/api/v1/recommendations",
+                json={"liked_movie_ids": [101, "103"], "limit": 5},
+            )
+        assert response.status_code == 200
+        movies = response.get_json()
+        assert len(movies) == 5
+        assert movies[0]["title"] == f"Movie {movies[0]['id']}"
+        ids = [movie["id"] for movie in movies]
+        assert not {101, 103} & set(ids)
+        assert sum(i % 2 == 1 for i in ids) >= 4
+
+    def test_overloaded(
+        self, serving_app: Flask, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        def full(request: Any, timeout: float | None = None) -> list[int]:
+            raise queue.Full
+
+        monkeypatch.setattr(get_recommender(serving_app), "submit", full)
+        with serving_app.test_client() as client:
+            response = client.post(
+                "/api/v1/recommendations", json={"liked_movie_ids": [101]}
+            )
+        assert response.status_code == 503
+        assert "error" in response.get_json()
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {},
+            {"liked_movie_ids": []},
+            {"liked_movie_ids": "1"},
+            {"liked_movie_ids": [1, "x"]},
+            {"liked_movie_ids": [1], "limit": 0},
+            {"liked_movie_ids": [1], "disliked_movie_ids": None},
+            {"liked_movie_ids": [True]},
+            {"liked_movie_ids": [1], "limit": True},
+        ],
+    )
+    def test_bad_request(self, client: FlaskClient, body: dict[str, Any]) -> None:
+        response = client.post("/api/v1/recommendations", json=body)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
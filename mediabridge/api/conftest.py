@@ -1,10 +1,13 @@
-from typing import Generator
+from typing import Any, Generator
 
+import numpy as np
 import pytest
 from flask import Flask
 from flask.testing import FlaskClient
+from scipy.sparse import coo_matrix
 
 from mediabridge.api.app import create_app, db
+from mediabridge.recommender.import_utils import import_lightfm_silently
 
 
 @pytest.fixture
@@ -41,3 +44,19 @@ def client(app: Flask) -> Generator[FlaskClient, None, None]:
     """
     with app.test_client() as client:
         yield client
+
+
+@pytest.fixture(scope="session")
+def two_tastes_model() -> Any:
+    """A small LightFM model of 200 users and 40 movies, trained once.
+
+    Odd users like odd movies and dislike even ones, and vice versa.
+    """
+    rng = np.random.default_rng(0)
+    pairs = np.unique(rng.integers(0, 200 * 40, 4_000))
+    user, movie = pairs // 40, pairs % 40
+    rating = np.where(user % 2 == movie % 2, 1, -1)
+    LightFM = import_lightfm_silently()
+    model = LightFM(no_components=8, loss="logistic", random_state=0)
+    model.fit(coo_matrix((rating, (user, movie)), shape=(200, 40)), epochs=20)
+    return model
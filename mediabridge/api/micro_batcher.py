@@ -0,0 +1,114 @@
+"""
+Coalesces concurrent requests into batches, each processed with one call.
+
+Scoring a batch of users is one matrix multiply, which costs little more than
+scoring a single user. So rather than score each request on its own thread,
+request threads submit() to a queue, and a single worker thread takes
+whatever has arrived within max_wait seconds of the first queued request, up
+to max_batch, and processes it all at once. When idle, a request waits at
+most max_wait extra. Under load, throughput grows with the batch size,
+while latency stays roughly flat.
+
+At most max_queue requests wait at a time; beyond that, submit() fails fast
+with queue.Full, so that an overloaded server sheds load instead of queueing
+requests that would time out anyway. A request that does time out is
+cancelled, and left out of its batch if that has not started yet.
+"""
+
+import logging
+import os
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from time import monotonic
+from typing import Generic, TypeVar
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH = 64
+MAX_WAIT_SECONDS = 0.005
+MAX_QUEUE = 1_024
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        process: Callable[[list[T]], list[R]],
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT_SECONDS,
+        max_queue: int = MAX_QUEUE,
+    ) -> None:
+        """process() maps a batch of requests to their results, in order."""
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.batches = self.requests = 0
+        self._queue: queue.Queue[tuple[T, Future[R]]] = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = 0
+
+    def submit(self, request: T, timeout: float | None = None) -> R:
+        """Blocks until the request's batch is processed, returning its result.
+
+        Raises queue.Full if max_queue requests are already waiting, and
+        TimeoutError after timeout seconds.
+        """
+        self._ensure_worker()
+        future: Future[R] = Future()
+        self._queue.put_nowait((request, future))
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def _ensure_worker(self) -> None:
+        # Started on first use, and again in a forked child, which has no threads.
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue(self.max_queue)
+                self._thread = threading.Thread(
+                    target=self._run, name="micro-batcher", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self) -> None:
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            deadline = monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(pending.get(timeout=max(0, deadline - monotonic())))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: list[tuple[T, Future[R]]]) -> None:
+        # Drops the requests that timed out, and marks the rest as running.
+        batch = [
+            (request, future)
+            for request, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        try:
+            results = self.process([request for request, _ in batch])
+            assert len(results) == len(batch), (len(results), len(batch))
+        except Exception as e:
+            log.exception(f"Failed a batch of {len(batch)} requests")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,75 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+import pytest
+
+from mediabridge.api.micro_batcher import MicroBatcher
+
+
+def _squares(batch: list[int]) -> list[int]:
+    sleep(0.01)  # as if scoring took a while, so requests pile up meanwhile
+    return [i * i for i in batch]
+
+
+class MicroBatcherTest:
+    def test_concurrent_requests_are_batched(self) -> None:
+        batcher = MicroBatcher(_squares, max_batch=8, max_wait=0.005)
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(batcher.submit, range(64)))
+        assert results == [i * i for i in range(64)]
+        assert batcher.requests == 64
+        assert batcher.batches < 32
+
+    def test_failed_batch(self) -> None:
+        def fail(batch: list[int]) -> list[int]:
+            raise ValueError("no model")
+
+        batcher = MicroBatcher(fail)
+        with pytest.raises(ValueError, match="no model"):
+            batcher.submit(1)
+        # The worker survives, for later batches.
+        batcher.process = _squares
+        assert batcher.submit(3) == 9
+
+    def test_timed_out_request_is_skipped(self) -> None:
+        started, release = threading.Event(), threading.Event()
+        processed: list[int] = []
+
+        def process(batch: list[int]) -> list[int]:
+            processed.extend(batch)
+            started.set()
+            release.wait()
+            return batch
+
+        batcher = MicroBatcher(process, max_wait=0)
+        with ThreadPoolExecutor(1) as pool:
+            first = pool.submit(batcher.submit, 1)
+            started.wait()  # the worker is busy with request 1
+            with pytest.raises(TimeoutError):
+                batcher.submit(2, timeout=0.01)
+            release.set()
+            assert first.result() == 1
+        assert batcher.submit(3) == 3
+        assert processed == [1, 3]
+
+    def test_full_queue(self) -> None:
+        started, release = threading.Event(), threading.Event()
+
+        def process(batch: list[int]) -> list[int]:
+            started.set()
+            release.wait()
+            return batch
+
+        batcher = MicroBatcher(process, max_wait=0, max_queue=1)
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(batcher.submit, 1)
+            started.wait()
+            second = pool.submit(batcher.submit, 2)
+            while batcher._queue.empty():
+                sleep(0.001)
+            with pytest.raises(queue.Full):
+                batcher.submit(3)
+            release.set()
+            assert (first.result(), second.result()) == (1, 2)
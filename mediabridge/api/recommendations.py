@@ -0,0 +1,111 @@
+"""
+Serves POST /api/v1/recommendations, for a user who liked some movies.
+
+Request bodies are JSON, e.g.
+
+    {"liked_movie_ids": [1, 16377], "disliked_movie_ids": [], "limit": 10}
+
+and the response lists up to limit movies, best first, as
+{"id": ..., "year": ..., "title": ...} objects, like a movie search does.
+
+Concurrent requests are micro-batched, see micro_batcher.py, and scored by one
+RecommendationEngine.recommend_new_users() call per batch, with results cached
+per seed set and model version.
+"""
+
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from flask import Flask
+
+from mediabridge.api.micro_batcher import MicroBatcher
+from mediabridge.definitions import LIGHTFM_MODEL_PKL
+from mediabridge.engine.model_artifact import SERVING_DIR, current_link
+from mediabridge.engine.recommendation_engine import RecommendationEngine
+from mediabridge.engine.result_cache import ResultCache
+
+MAX_LIMIT = 100
+
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RecommendationRequest:
+    liked: tuple[int, ...]
+    disliked: tuple[int, ...] = ()
+    limit: int = 10
+
+
+def _is_int(value: Any) -> bool:
+    # JSON true and false are bools, which Python counts as ints.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _movie_ids(body: dict[str, Any], field: str) -> tuple[int, ...]:
+    ids = body.get(field, [])
+    if not isinstance(ids, list) or not all(
+        _is_int(i) or (isinstance(i, str) and i.isdigit()) for i in ids
+    ):
+        raise ValueError(f"'{field}' must be a list of movie ids.")
+    return tuple(map(int, ids))
+
+
+def parse_request(body: Any) -> RecommendationRequest:
+    """Validates a request body, raising ValueError with a message for the user."""
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object.")
+    liked = _movie_ids(body, "liked_movie_ids")
+    if not liked:
+        raise ValueError("'liked_movie_ids' is required.")
+    limit = body.get("limit", 10)
+    if not _is_int(limit) or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"'limit' must be an integer from 1 to {MAX_LIMIT}.")
+    return RecommendationRequest(liked, _movie_ids(body, "disliked_movie_ids"), limit)
+
+
+def recommend_batch(
+    engine: RecommendationEngine, requests: list[RecommendationRequest]
+) -> list[list[int]]:
+    """Scores the requests with one engine call per distinct limit."""
+    results: list[list[int]] = [[] for _ in requests]
+    for limit in {r.limit for r in requests}:
+        rows = [i for i, r in enumerate(requests) if r.limit == limit]
+        recommended = engine.recommend_new_users(
+            [requests[i].liked for i in rows],
+            limit,
+            [requests[i].disliked for i in rows],
+        )
+        for i, movie_ids in zip(rows, recommended):
+            results[i] = movie_ids
+    return results
+
+
+def _default_model() -> Path:
+    """The exported model, if there is one, else the pickled model file."""
+    serving_dir: Path = SERVING_DIR
+    return serving_dir if current_link(serving_dir).exists() else LIGHTFM_MODEL_PKL
+
+
+def get_recommender(
+    app: Flask,
+) -> MicroBatcher[RecommendationRequest, list[int]]:
+    """The app's batcher, whose engine loads the model on first use."""
+    with _lock:
+        if "recommender" not in app.extensions:
+            engine = RecommendationEngine(
+                [],
+                app.config.get("RECOMMENDER_MODEL") or _default_model(),
+                cache=ResultCache(db_file=app.config.get("RECOMMENDER_CACHE_DB")),
+            )
+            app.extensions["recommender"] = MicroBatcher(
+                lambda requests: recommend_batch(engine, requests),
+                app.config["RECOMMENDER_MAX_BATCH"],
+                app.config["RECOMMENDER_MAX_WAIT_MS"] / 1000,
+                app.config["RECOMMENDER_MAX_QUEUE"],
+            )
+        batcher: MicroBatcher[RecommendationRequest, list[int]] = app.extensions[
+            "recommender"
+        ]
+        return batcher
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Dict, Type
 
 from mediabridge.definitions import SQL_CONNECT_STRING
@@ -5,6 +6,15 @@ from mediabridge.definitions import SQL_CONNECT_STRING
 
 class BaseConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # A pickled model file or serving directory; by default the exported model.
+    RECOMMENDER_MODEL: Path | None = None
+    # Persists cached recommendations across restarts, if set.
+    RECOMMENDER_CACHE_DB: Path | None = None
+    RECOMMENDER_MAX_BATCH = 64
+    RECOMMENDER_MAX_WAIT_MS = 5.0
+    # Requests beyond this many waiting get a 503.
+    RECOMMENDER_MAX_QUEUE = 1_024
+    RECOMMENDER_TIMEOUT_SECONDS = 10.0
 
 
 class ProductionConfig(BaseConfig):
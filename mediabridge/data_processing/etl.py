@@ -1,43 +1,86 @@
-import io
 import logging
-import re
-from collections.abc import Generator
+import sqlite3
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import closing
 from pathlib import Path
-from subprocess import PIPE, Popen
 from time import time
+from typing import Any
 
+import numpy as np
 import pandas as pd
-from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.sql import text
-from tqdm import tqdm
 
+from mediabridge.data_processing.id_map import build_id_maps
+from mediabridge.data_processing.rating_parser import (
+    TRAINING_DIR,
+    UNKNOWN_DAY,
+    RatingBatch,
+    RatingFile,
+    find_rating_files,
+    iter_rating_batches,
+)
+from mediabridge.data_processing.sampling import Sample, SampleBy
 from mediabridge.data_processing.wiki_to_netflix import read_netflix_txt
 from mediabridge.db.tables import (
     DB_FILE,
+    MOVIE_STATS_V_DDL,
     POPULAR_MOVIE_QUERY,
     PROLIFIC_USER_QUERY,
-    Rating,
+    RATING_INDEXES,
+    RATING_V_DDL,
     create_tables,
     get_engine,
+    sqlite_ddl,
 )
-from mediabridge.definitions import NETFLIX_DATA_DIR, OUTPUT_DIR, TITLES_TXT
+from mediabridge.definitions import NETFLIX_DATA_DIR, TITLES_TXT
 
 log = logging.getLogger(__name__)
 
-RATING_CSV = OUTPUT_DIR / "rating.csv"  # uncompressed, to accommodate sqlite .import
-
-GLOB = "mv_00*.txt"
-
-
-def etl(max_reviews: int, *, regen: bool = False) -> None:
-    """Extracts, transforms, and loads ratings data into a combined uniform CSV + rating table.
-
-    If CSV or table have already been computed, we skip repeating that work to save time.
+# Rows accumulated, then sorted by primary key, before each round of INSERTs.
+# Sorted batches keep B-tree page writes local, at ~9 bytes per buffered row.
+BULK_LOAD_ROWS = 4_000_000
+
+# Rows per fetchmany() when reading the rating table back out.
+CHUNK_ROWS = 1_000_000
+
+# e.g. [("rating", "!=", 3), ("user_id", "<=", 798)], ANDed together.
+# Understood by both the sqlite and the Parquet readers of the ratings.
+Filters = Sequence[tuple[str, str, Any]]
+_SQL_OPERATORS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+_RATING_COLUMNS = ("user_id", "movie_id", "rating", "day")
+
+# Trade durability for speed while loading; the load is simply re-run on failure.
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -1048576",  # KiB, so 1 GiB of page cache
+]
+
+
+def etl(
+    max_reviews: int,
+    *,
+    regen: bool = False,
+    workers: int = 1,
+    movie_ids: Iterable[int] = (),
+    sample: Sample | None = None,
+) -> None:
+    """Extracts, transforms, and loads ratings data into a uniform rating table.
+
+    The ingested_file manifest records each training_set file already loaded,
+    so a re-run only processes files that are missing or have changed,
+    e.g. after an interrupted load. Listing movie_ids forces their reload.
+    A sample loads only a subset of users' or movies' ratings; changing to a
+    different sample, or back to the full dataset, reloads all ratings.
+    The training_set files are parsed by a pool of `workers` processes, and
+    the parsed batches are streamed directly into sqlite, with no staging CSV.
 
     When doing maintenance on this code, remove the "no cover" pragma and force
-    an eight-minute re-run to exercise changed code, then put the pragma back.
-    It is always safe to force a re-run with:
-    $ (cd out && rm -f rating.csv movies.sqlite)
+    a re-run to exercise changed code, then put the pragma back.
+    It is always safe to force a full re-run with:
+    $ (cd out && rm -f movies.sqlite)
     """
     diagnostic = "Please run `pipenv run mb init` to download the necessary dataset"
     assert NETFLIX_DATA_DIR.exists(), diagnostic
@@ -47,159 +90,349 @@ def etl(max_reviews: int, *, regen: bool = False) -> None:
         with get_engine().connect() as conn:
             conn.execute(text("DROP TABLE IF EXISTS rating"))
             conn.execute(text("DROP TABLE IF EXISTS movie_title"))
+            conn.execute(text("DROP TABLE IF EXISTS ingested_file"))
+            conn.execute(text("DROP TABLE IF EXISTS movie_stats"))
+            conn.execute(text("DROP TABLE IF EXISTS user_stats"))
             conn.commit()
 
     create_tables()
 
     log.info("Loading movie info into db...")
     etl_movie_title()
-    _etl_user_rating(max_reviews)
+    _etl_user_rating(max_reviews, workers, movie_ids, sample)
 
 
-# no cover: begin
+def _get_sample(conn: sqlite3.Connection) -> Sample | None:
+    query = "SELECT by, fraction, seed  FROM etl_sample"
+    row = conn.execute(query).fetchone()
+    return Sample(SampleBy(row[0]), row[1], row[2]) if row else None
+
+
+def _set_sample(conn: sqlite3.Connection, sample: Sample | None) -> None:
+    """Records a change of sample, which invalidates every manifest entry."""
+    conn.execute("DELETE FROM ingested_file")
+    conn.execute("DELETE FROM etl_sample")
+    if sample:
+        ins = "INSERT INTO etl_sample (by, fraction, seed)  VALUES (?, ?, ?)"
+        conn.execute(ins, (sample.by.value, sample.fraction, sample.seed))
+
 
+def find_stale_files(
+    in_files: Iterable[Path],
+    db_file: Path = DB_FILE,
+    movie_ids: Iterable[int] = (),
+    sample: Sample | None = None,
+) -> list[RatingFile]:
+    """Returns the ratings files that are missing from, or changed since, the manifest.
 
-def etl_movie_title() -> bool:
+    Files for the requested movie_ids are always returned, forcing their reload.
+    If the database holds a different sample, all files are stale.
+    """
+    query = "SELECT movie_id, size, mtime_ns  FROM ingested_file"
+    with closing(sqlite3.connect(db_file)) as conn:
+        manifest = {m: (size, mtime_ns) for m, size, mtime_ns in conn.execute(query)}
+        if _get_sample(conn) != sample:
+            manifest = {}
+    forced = set(movie_ids)
+    files = list(map(RatingFile.stat, in_files))
+    if sample:
+        files = sample.filter_files(files)
+    return [
+        f
+        for f in files
+        if f.movie_id in forced or manifest.get(f.movie_id) != (f.size, f.mtime_ns)
+    ]
+
+
+def _sort_by_key(batches: list[RatingBatch]) -> RatingBatch:
+    big = RatingBatch.concat(batches)
+    return big[np.lexsort((big.movie_id, big.user_id))]
+
+
+def _sorted_batches(
+    files: Iterable[RatingFile],
+    batches: Iterable[RatingBatch],
+    max_rows: int,
+    batch_rows: int,
+) -> Iterator[tuple[list[tuple[RatingFile, int]], RatingBatch]]:
+    """Regroups parsed batches into large ones, sorted by (user_id, movie_id).
+
+    Each regrouped batch comes with the (file, row count) pairs it wholly contains.
+    Stops once max_rows ratings have been produced, truncating the final batch;
+    a truncated file is not listed, so a later run reloads it.
+    """
+    pending: list[RatingBatch] = []
+    complete: list[tuple[RatingFile, int]] = []
+    num_pending = 0
+    remaining = max_rows
+    for f, batch in zip(files, batches):
+        pending.append(batch[: remaining - num_pending])
+        num_pending += len(pending[-1])
+        if len(pending[-1]) == len(batch):
+            complete.append((f, len(batch)))
+        if num_pending >= min(batch_rows, remaining):
+            yield complete, _sort_by_key(pending)
+            remaining -= num_pending
+            pending, complete, num_pending = [], [], 0
+            if remaining <= 0:
+                return
+    if pending:
+        yield complete, _sort_by_key(pending)
+
+
+def bulk_load_ratings(
+    files: Sequence[RatingFile],
+    batches: Iterable[RatingBatch],
+    db_file: Path = DB_FILE,
+    max_rows: int = 101_000_000,
+    batch_rows: int = BULK_LOAD_ROWS,
+    create_indexes: bool = True,
+    sample: Sample | None = None,
+) -> int:
+    """Replaces the ratings of the given files' movies with the given parsed batches.
+
+    There is one batch per file, in the same order. Rows go through the
+    in-process sqlite3 driver, in pre-sorted batches, under bulk-load pragmas.
+    Each batch is committed together with the manifest rows of the files it
+    holds, and with its contribution to the movie_stats and user_stats
+    aggregates, so an interrupted load resumes where it left off.
+    Without create_indexes, indexes dropped for a full load are left for the
+    caller to rebuild with create_rating_indexes().
+    The batches should already be filtered by the sample, if any; loading
+    a different sample than before first empties the rating table.
+    max_rows caps the size of the whole rating table, not the rows this call
+    adds, so that repeating a truncated load is a no-op, while a larger
+    max_rows resumes it.
+    Returns the number of rows inserted.
+    """
+    ins = "INSERT INTO rating (user_id, movie_id, rating, day)  VALUES (?, ?, ?, ?)"
+    ins_manifest = """
+    INSERT OR REPLACE INTO ingested_file (movie_id, file_name, size, mtime_ns, num_rows)
+    VALUES (?, ?, ?, ?, ?)
+    """
+    num_rows = 0
+    with closing(sqlite3.connect(db_file)) as conn:
+        for pragma in BULK_LOAD_PRAGMAS:
+            conn.execute(pragma)
+        with conn:
+            if _get_sample(conn) != sample:
+                _set_sample(conn, sample)
+            _delete_movies(conn, [f.movie_id for f in files])
+        # movie_stats sums to the table's row count, without a scan of the table.
+        count = "SELECT COALESCE(SUM(count), 0) FROM movie_stats"
+        (num_kept,) = conn.execute(count).fetchone()
+        remaining = max(0, max_rows - num_kept)
+        for complete, batch in _sorted_batches(files, batches, remaining, batch_rows):
+            rows = zip(
+                batch.user_id.tolist(),
+                batch.movie_id.tolist(),
+                batch.rating.tolist(),
+                batch.day.tolist(),
+            )
+            manifest_rows = [
+                (f.movie_id, f.path.name, f.size, f.mtime_ns, n) for f, n in complete
+            ]
+            with conn:  # one transaction per batch
+                conn.executemany(ins, rows)
+                conn.executemany(ins_manifest, manifest_rows)
+                _add_stats(conn, batch)
+            num_rows += len(batch)
+            log.info(f"{num_rows:_} rating rows loaded")
+        if create_indexes:
+            create_rating_indexes(conn)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode = DELETE")
+    return num_rows
+
+
+def create_rating_indexes(conn: sqlite3.Connection) -> None:
+    """Builds any secondary indexes of the rating table that were dropped for a load."""
+    for index in RATING_INDEXES:
+        conn.execute(sqlite_ddl(CreateIndex(index, if_not_exists=True)))
+
+
+def _add_stats(conn: sqlite3.Connection, batch: RatingBatch) -> None:
+    """Folds a batch of new ratings into the running per-movie and per-user aggregates."""
+    if not len(batch):
+        return  # e.g. nothing survived sampling
+    upsert_movie = """
+    INSERT INTO movie_stats (movie_id, count, n1, n2, n3, n4, n5)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (movie_id) DO UPDATE SET
+        count = count + excluded.count,
+        n1 = n1 + excluded.n1,
+        n2 = n2 + excluded.n2,
+        n3 = n3 + excluded.n3,
+        n4 = n4 + excluded.n4,
+        n5 = n5 + excluded.n5
+    """
+    upsert_user = """
+    INSERT INTO user_stats (user_id, count, sum)  VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum
+    """
+    # A (movie, stars) histogram, in a single bincount() pass.
+    movie_id = batch.movie_id.astype(np.int64)
+    hist = np.bincount(movie_id * 6 + batch.rating, minlength=6 * (movie_id.max() + 1))
+    hist = hist.reshape(-1, 6)[:, 1:]
+    movie_ids = np.flatnonzero(hist.sum(axis=1))
+    counts = hist[movie_ids].sum(axis=1)
+    conn.executemany(
+        upsert_movie,
+        (
+            (m, n, *h)
+            for m, n, h in zip(
+                movie_ids.tolist(), counts.tolist(), hist[movie_ids].tolist()
+            )
+        ),
+    )
+
+    user_ids, inverse = np.unique(batch.user_id, return_inverse=True)
+    counts = np.bincount(inverse)
+    sums = np.bincount(inverse, weights=batch.rating).astype(np.int64)
+    conn.executemany(
+        upsert_user, zip(user_ids.tolist(), counts.tolist(), sums.tolist())
+    )
+
+
+def _delete_movies(conn: sqlite3.Connection, movie_ids: list[int]) -> None:
+    """Forgets the ratings, aggregates, and manifest entries of some movies."""
+    (num_ingested,) = conn.execute("SELECT COUNT(*)  FROM ingested_file").fetchone()
+    if num_ingested == 0:
+        # Cheap truncate, e.g. after a crash. For a full load, it is faster to
+        # build the secondary indexes once at the end than to maintain them.
+        for index in RATING_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+        for table in ["rating", "movie_stats", "user_stats"]:
+            conn.execute(f"DELETE FROM {table}")
+        return
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS stale_movie (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM stale_movie")
+    conn.executemany("INSERT INTO stale_movie VALUES (?)", [(m,) for m in movie_ids])
+    stale = "movie_id IN (SELECT id FROM stale_movie)"  # via rating_movie_idx
+    conn.execute(f"""
+    INSERT INTO user_stats (user_id, count, sum)
+    SELECT user_id, -COUNT(*), -SUM(rating)  FROM rating  WHERE {stale}  GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum
+    """)
+    conn.execute("DELETE FROM user_stats  WHERE count = 0")
+    for table in ["rating", "movie_stats", "ingested_file"]:
+        conn.execute(f"DELETE FROM {table}  WHERE {stale}")
+
+
+def _to_sql_where(filters: Filters) -> tuple[str, list[Any]]:
+    terms, params = [], []
+    for column, op, value in filters:
+        assert column in _RATING_COLUMNS, column
+        if op == "in":
+            values = list(value)
+            terms.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+        else:
+            terms.append(f"{column} {_SQL_OPERATORS[op]} ?")
+            params.append(value)
+    return ("  WHERE " + "  AND ".join(terms) if terms else ""), params
+
+
+def iter_rating_table(
+    db_file: Path = DB_FILE,
+    chunk_rows: int = CHUNK_ROWS,
+    filters: Filters = (),
+) -> Iterator[RatingBatch]:
+    """Reads the rating table in large chunks, as typed NumPy columns.
+
+    Only ratings matching the filters are read. Filtering on a window of days,
+    e.g. [("day", ">=", first), ("day", "<", end)], is a range scan of
+    rating_day_idx, and on a range of users is a range scan of the table itself.
+    A rating with no day, as left by `mb migrate`, gets UNKNOWN_DAY.
+    """
+    where, params = _to_sql_where(filters)
+    query = f"""
+    SELECT user_id, movie_id, rating, COALESCE(day, {UNKNOWN_DAY})
+    FROM rating{where}
+    """
+    with closing(sqlite3.connect(db_file)) as conn:
+        cur = conn.execute(query, params)
+        while rows := cur.fetchmany(chunk_rows):
+            user_id, movie_id, rating, day = zip(*rows)
+            yield RatingBatch(
+                user_id=np.array(user_id, dtype=np.uint32),
+                movie_id=np.array(movie_id, dtype=np.uint16),
+                rating=np.array(rating, dtype=np.uint8),
+                day=np.array(day, dtype=np.uint16),
+            )
+
+
+def etl_movie_title(titles_txt: Path = TITLES_TXT, db_file: Path = DB_FILE) -> bool:
     """Returns whether or not loading took place (False if already loaded)."""
     query = "SELECT *  FROM movie_title  LIMIT 1"
-    # If there is already data in movie_title, skip reprocessing
-    if not pd.read_sql_query(query, get_engine()).empty:
-        log.warning(
-            "movie_title table already populated with data, skipping reprocessing..."
-        )
-        return False
-
-    columns = ["id", "year", "title"]
-    df = pd.DataFrame(read_netflix_txt(TITLES_TXT), columns=columns)
-    df["year"] = df.year.replace("NULL", pd.NA)
-    df["year"] = df.year.astype("Int16")
-
-    with get_engine().connect() as conn:
+    with closing(sqlite3.connect(db_file)) as conn:
+        # If there is already data in movie_title, skip reprocessing
+        if conn.execute(query).fetchone():
+            log.warning(
+                "movie_title table already populated with data, skipping reprocessing..."
+            )
+            return False
+
+        columns = ["id", "year", "title"]
+        df = pd.DataFrame(read_netflix_txt(titles_txt), columns=columns)
+        df["id"] = df.id.astype(int)
+        df["year"] = df.year.replace("NULL", pd.NA)
+        df["year"] = df.year.astype("Int16")
         df.to_sql("movie_title", conn, index=False, if_exists="append")
+        conn.commit()
     return True
 
 
-def _etl_user_rating(max_reviews: int) -> None:
-    """Writes out/rating.csv if needed, then populates rating table from it."""
-    training_folder = NETFLIX_DATA_DIR / "training_set/training_set"
-    path_re = re.compile(r"/mv_(\d{7}).txt$")
-    is_initial = True
-    if not RATING_CSV.exists():
-        # Transform to "tidy" data, per Hadley Wickham, with a uniform "movie_id" column.
-        in_files = sorted(training_folder.glob(GLOB))  # e.g. mv_0017770.txt
-        assert in_files
-        with open(RATING_CSV, "w") as fout:
-            for mv_ratings_file in tqdm(in_files, smoothing=0.01):
-                m = path_re.search(f"{mv_ratings_file}")
-                assert m
-                movie_id = int(m.group(1))
-                df = pd.DataFrame(_read_ratings(mv_ratings_file, movie_id))
-                assert not df.empty
-                df["movie_id"] = movie_id
-                df.to_csv(fout, index=False, header=is_initial)
-                is_initial = False
-
-    query = "SELECT *  FROM rating  LIMIT 1"
-    if pd.read_sql_query(query, get_engine()).empty:
-        _insert_ratings(RATING_CSV, max_reviews)
-
-
-def _insert_ratings(csv: Path, max_rows: int) -> None:
-    """Populates rating table from CSV, if needed."""
-
-    ins = "INSERT INTO rating  SELECT user_id, movie_id, rating  FROM rating_csv  ORDER BY 1, 2, 3"
-    with get_engine().connect() as conn:
-        print(f"\n{max_rows:_}", end="", flush=True)
-        t0 = time()
-        run_sqlite_child(
-            [
-                "DROP TABLE  IF EXISTS  rating_csv;",
-                ".mode csv",
-                ".headers on",
-                f".import {_get_input_csv(max_rows)} rating_csv",
-            ]
-        )
-        print(end=" rating rows ", flush=True)
-        conn.execute(text("DELETE FROM rating"))
-        conn.execute(text(ins))
-        conn.execute(text("DROP TABLE rating_csv"))
-        conn.commit()
-        conn.execute(text("VACUUM"))
-        _validate_rating_table()
-        print(f"written in {time() - t0:.3f} s")
-
-        _gen_reporting_tables()
-        #
-        # example elapsed times:
-        # 10_000_000 rating rows written in 18.560 s
-        #
-        # 101_000_000 rating rows written in 225.923 s (four minutes)
-        # ETL finished in 468.062 s (eight minutes)
-
-
-def _validate_rating_table() -> None:
-    """Verifies that the code defect of Issue 110 never crops up again."""
-    with Session(get_engine()) as sess:
-        # We expect strictly numeric data here, not a column heading text label.
-        q = sess.query(Rating).filter(Rating.user_id == "user_id")
-        assert 0 == len(list(q.all())), "Rating table contained header row"
-
-
-def _get_input_csv(max_rows: int, all_rows: int = 100_480_507) -> Path:
-    """Optionally subsets the input prize data, doing work only in the subset case."""
-    csv = RATING_CSV
-    if max_rows < all_rows:
-        df = pd.read_csv(csv, nrows=max_rows)
-        csv = OUTPUT_DIR / "rating-small.csv"
-        df.to_csv(csv, index=False)
-    assert csv.exists(), csv
-    return Path(csv)
-
-
-def run_sqlite_child(cmds: list[str]) -> None:
-    with Popen(
-        ["sqlite3", DB_FILE],
-        text=True,
-        stdin=PIPE,
-    ) as proc:
-        assert isinstance(proc.stdin, io.TextIOWrapper)
-        for cmd in cmds:
-            proc.stdin.write(f"{cmd}\n")
-
-
-def _read_ratings(
-    mv_ratings_file: Path,
-    movie_id: int,
-) -> Generator[dict[str, int], None, None]:
-    with open(mv_ratings_file, "r") as fin:
-        line = fin.readline()
-        assert line == f"{movie_id}:\n"
-        for line in fin:
-            user_id, rating, _ = line.strip().split(",")
-            yield {
-                "user_id": int(user_id),
-                "rating": int(rating),
-            }
-
-
-def _gen_reporting_tables() -> None:
-    """Generates a pair of reporting tables from scratch, discarding any old reporting rows."""
-    RATING_V_DDL = """
-    CREATE VIEW rating_v AS
-    SELECT user_id, rating, mt.*
-    FROM rating JOIN movie_title mt ON movie_id = mt.id
+def gen_reporting_tables(db_file: Path = DB_FILE) -> None:
+    """Generates a pair of reporting tables from scratch, discarding any old reporting rows.
+
+    This is cheap, as the ETL already maintains the movie_stats and user_stats
+    aggregates that the reports are drawn from.
     """
     tbl_qry = [
         ("popular_movie", POPULAR_MOVIE_QUERY),
         ("prolific_user", PROLIFIC_USER_QUERY),
     ]
-    with get_engine().connect() as conn:
-        conn.execute(text("DROP VIEW  IF EXISTS  rating_v"))
-        conn.execute(text(RATING_V_DDL))
+    with closing(sqlite3.connect(db_file)) as conn, conn:
+        conn.execute("DROP VIEW  IF EXISTS  rating_v")
+        conn.execute(RATING_V_DDL)
+        conn.execute("DROP VIEW  IF EXISTS  movie_stats_v")
+        conn.execute(MOVIE_STATS_V_DDL)
         for table, query in tbl_qry:
-            conn.execute(text(f"DELETE FROM {table}"))
-            conn.execute(text(f"INSERT INTO {table}  {query}"))
-            conn.commit()
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(f"INSERT INTO {table}  {query}")
+
+
+# no cover: begin
+
+
+def _etl_user_rating(
+    max_reviews: int,
+    workers: int = 1,
+    movie_ids: Iterable[int] = (),
+    sample: Sample | None = None,
+) -> None:
+    """Loads new or changed training_set files into the rating table."""
+    stale = find_stale_files(
+        find_rating_files(TRAINING_DIR), movie_ids=movie_ids, sample=sample
+    )
+    if not stale:
+        log.warning("rating table is up to date with training_set, skipping...")
+        return
+
+    print(f"\n{len(stale):_} ratings files", end="", flush=True)
+    t0 = time()
+    batch_filter = sample.filter_batch if sample else None
+    batches = iter_rating_batches([f.path for f in stale], workers, batch_filter)
+    num_rows = bulk_load_ratings(stale, batches, max_rows=max_reviews, sample=sample)
+    print(f", {num_rows:_} rating rows written in {time() - t0:.3f} s")
+
+    gen_reporting_tables()
+    build_id_maps().save()
 
 
 # no cover: end
@@ -0,0 +1,232 @@
+"""
+Times and memory-profiles each stage of the ETL, against a synthetic dataset.
+
+Runs entirely offline. Results are saved as JSON, and a later run can be
+compared against such a saved baseline, flagging any stage that got slower
+by more than a tolerance. Compare like with like: same dataset size, seed,
+worker count, and machine.
+
+Peak RSS is the process high-water mark, so it never decreases from one stage
+to the next. With --trace-memory, tracemalloc also reports the peak of each
+stage's own (python and NumPy) allocations, at some cost in speed.
+"""
+
+import json
+import logging
+import resource
+import sqlite3
+import tracemalloc
+from collections.abc import Callable
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any
+
+import typer
+from sqlalchemy import create_engine
+
+from mediabridge.data_processing.etl import (
+    bulk_load_ratings,
+    create_rating_indexes,
+    etl_movie_title,
+    find_stale_files,
+    gen_reporting_tables,
+)
+from mediabridge.data_processing.id_map import build_id_maps
+from mediabridge.data_processing.interaction_matrix import create_matrix
+from mediabridge.data_processing.parquet import RatingSource, export_ratings
+from mediabridge.data_processing.rating_parser import (
+    find_rating_files,
+    iter_rating_batches,
+)
+from mediabridge.data_processing.synthetic import generate_dataset
+from mediabridge.db.tables import SCHEMA_VERSION, Base
+from mediabridge.definitions import OUTPUT_DIR
+from mediabridge.profiling import max_rss_mb
+
+log = logging.getLogger(__name__)
+
+BENCH_DIR = OUTPUT_DIR / "bench"
+
+app = typer.Typer()
+
+
+@dataclass
+class StageResult:
+    stage: str
+    seconds: float
+    rows: int
+    max_rss_mb: float
+    child_max_rss_mb: float
+    traced_peak_mb: float | None = None
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _measure(stage: str, fn: Callable[[], int], trace_memory: bool) -> StageResult:
+    if trace_memory:
+        tracemalloc.start()
+    t0 = perf_counter()
+    rows = fn()
+    seconds = perf_counter() - t0
+    traced_peak_mb = None
+    if trace_memory:
+        traced_peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    result = StageResult(
+        stage=stage,
+        seconds=seconds,
+        rows=rows,
+        max_rss_mb=max_rss_mb(resource.RUSAGE_SELF),
+        child_max_rss_mb=max_rss_mb(resource.RUSAGE_CHILDREN),
+        traced_peak_mb=traced_peak_mb,
+    )
+    log.info(f"{stage}: {seconds:.3f} s, {result.rows_per_s:_.0f} rows/s")
+    return result
+
+
+def run_benchmark(
+    work_dir: Path,
+    num_movies: int = 1_000,
+    num_users: int = 10_000,
+    num_ratings: int = 1_000_000,
+    seed: int = 0,
+    workers: int = 1,
+    trace_memory: bool = False,
+) -> list[StageResult]:
+    """Generates a dataset in work_dir, then runs and measures each ETL stage."""
+    generate_dataset(work_dir, num_movies, num_users, num_ratings, seed)
+    in_files = find_rating_files(work_dir / "training_set/training_set")
+    db_file = work_dir / "movies.sqlite"
+    Base.metadata.create_all(create_engine(f"sqlite:///{db_file}"))
+    with closing(sqlite3.connect(db_file)) as conn:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    etl_movie_title(work_dir / "movie_titles.txt", db_file)
+
+    def parse() -> int:
+        return sum(map(len, iter_rating_batches(in_files, workers)))
+
+    def import_ratings() -> int:
+        stale = find_stale_files(in_files, db_file)
+        batches = iter_rating_batches([f.path for f in stale], workers)
+        num_rows: int = bulk_load_ratings(stale, batches, db_file, create_indexes=False)
+        return num_rows
+
+    def index() -> int:
+        with closing(sqlite3.connect(db_file)) as conn:
+            create_rating_indexes(conn)
+            (num_rows,) = conn.execute("SELECT COUNT(*)  FROM rating").fetchone()
+        return int(num_rows)
+
+    def export() -> int:
+        num_rows: int = export_ratings(db_file, work_dir / "parquet" / "rating")
+        return num_rows
+
+    def reporting() -> int:
+        gen_reporting_tables(db_file)
+        query = (
+            "SELECT (SELECT COUNT(*) FROM popular_movie) + COUNT(*)  FROM prolific_user"
+        )
+        with closing(sqlite3.connect(db_file)) as conn:
+            (num_rows,) = conn.execute(query).fetchone()
+        return int(num_rows)
+
+    def matrix() -> int:
+        id_maps = build_id_maps(db_file)
+        return int(create_matrix(RatingSource.sqlite, db_file, id_maps).nnz)
+
+    stages: list[tuple[str, Callable[[], int]]] = [
+        ("parse", parse),
+        ("import", import_ratings),
+        ("index", index),
+        ("export", export),
+        ("reporting", reporting),
+        ("matrix", matrix),
+    ]
+    return [_measure(stage, fn, trace_memory) for stage, fn in stages]
+
+
+def compare(
+    baseline: list[dict[str, Any]],
+    results: list[StageResult],
+    tolerance: float = 0.10,
+) -> list[str]:
+    """Returns a description of each stage that regressed by more than tolerance."""
+    old = {r["stage"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        if r.stage not in old or not old[r.stage]["seconds"]:
+            continue
+        ratio = r.seconds / old[r.stage]["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{r.stage}: {old[r.stage]['seconds']:.3f} s -> {r.seconds:.3f} s"
+                f" ({ratio - 1:+.0%})"
+            )
+    return regressions
+
+
+def _print_table(results: list[StageResult], baseline: list[dict[str, Any]]) -> None:
+    old = {r["stage"]: r["seconds"] for r in baseline}
+    print(
+        f"{'stage':<10} {'seconds':>9} {'rows/s':>13} {'rss MB':>8}"
+        f" {'traced MB':>9} {'vs base':>8}"
+    )
+    for r in results:
+        traced = "" if r.traced_peak_mb is None else f"{r.traced_peak_mb:.1f}"
+        vs = f"{r.seconds / old[r.stage] - 1:+.0%}" if old.get(r.stage) else ""
+        print(
+            f"{r.stage:<10} {r.seconds:>9.3f} {r.rows_per_s:>13_.0f}"
+            f" {r.max_rss_mb:>8.1f} {traced:>9} {vs:>8}"
+        )
+
+
+@app.command()
+def bench_etl(
+    ctx: typer.Context,
+    movies: int = 1_000,
+    users: int = 10_000,
+    ratings: int = 1_000_000,
+    seed: int = 0,
+    workers: int = 1,
+    trace_memory: bool = typer.Option(False, help="Profile allocations per stage."),
+    baseline: Path | None = typer.Option(None, help="A results file to compare with."),
+    tolerance: float = typer.Option(0.10, help="Allowed slowdown vs the baseline."),
+) -> None:
+    """Benchmark each ETL stage on a synthetic dataset, saving results to out/bench/."""
+    params = dict(
+        movies=movies,
+        users=users,
+        ratings=ratings,
+        seed=seed,
+        workers=workers,
+        trace_memory=trace_memory,
+    )
+    with TemporaryDirectory() as tmp:
+        results = run_benchmark(
+            Path(tmp), movies, users, ratings, seed, workers, trace_memory
+        )
+
+    old: list[dict[str, Any]] = []
+    if baseline:
+        with open(baseline) as fin:
+            base = json.load(fin)
+        if base["params"] != params:
+            log.warning(f"{baseline} was run with different params: {base['params']}")
+        old = base["stages"]
+    _print_table(results, old)
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    out_file = BENCH_DIR / f"etl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_file, "w") as fout:
+        json.dump({"params": params, "stages": [asdict(r) for r in results]}, fout)
+    print(f"Results saved to {out_file}")
+
+    if regressions := compare(old, results, tolerance):
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        raise typer.Exit(code=1)
@@ -0,0 +1,113 @@
+"""
+Maps sparse raw Netflix IDs to dense matrix indexes, and back.
+
+Raw user IDs go up to 2,649,429, yet only ~480k users have ratings, so a
+matrix indexed by raw ID would give a model millions of phantom users, each
+with its own embedding and bias. Matrices are instead indexed densely, with
+row i holding the user whose raw ID is users.raw_ids[i], and similarly for
+movie columns. The ETL persists the maps, as sorted .npy arrays of raw IDs.
+"""
+
+import logging
+import sqlite3
+from collections.abc import Sequence
+from contextlib import closing
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from mediabridge.definitions import DB_FILE, OUTPUT_DIR
+
+log = logging.getLogger(__name__)
+
+ID_MAP_DIR = OUTPUT_DIR / "id_map"
+
+
+@dataclass
+class IdMap:
+    """A bidirectional map between sorted raw IDs and dense 0 .. n-1 indexes."""
+
+    raw_ids: NDArray[np.uint32]
+
+    def __len__(self) -> int:
+        return len(self.raw_ids)
+
+    @cached_property
+    def _lookup(self) -> NDArray[np.int32]:
+        """Indexed by raw ID, this gives the dense index, or -1 if unknown."""
+        lookup = np.full(int(self.raw_ids.max(initial=0)) + 1, -1, dtype=np.int32)
+        lookup[self.raw_ids] = np.arange(len(self.raw_ids), dtype=np.int32)
+        return lookup
+
+    def to_dense(self, raw_ids: ArrayLike) -> NDArray[np.int32]:
+        """Maps raw IDs to dense indexes, in O(1) each. Unknown IDs map to -1."""
+        raw = np.asarray(raw_ids, dtype=np.int64)
+        dense = np.full(raw.shape, -1, dtype=np.int32)
+        known = (0 <= raw) & (raw < len(self._lookup))
+        dense[known] = self._lookup[raw[known]]
+        return dense
+
+    def to_raw(self, dense: ArrayLike) -> NDArray[np.uint32]:
+        raw: NDArray[np.uint32] = self.raw_ids[np.asarray(dense, dtype=np.intp)]
+        return raw
+
+    def upto(self, max_raw_id: int) -> "IdMap":
+        """The map restricted to raw IDs <= max_raw_id, and always including it.
+
+        Its dense indexes agree with this map's, except possibly for max_raw_id.
+        """
+        prefix = self.raw_ids[: np.searchsorted(self.raw_ids, max_raw_id, "right")]
+        return IdMap(np.union1d(prefix, [max_raw_id]).astype(np.uint32))
+
+    @classmethod
+    def from_ids(cls, ids: ArrayLike) -> "IdMap":
+        return cls(np.unique(np.asarray(ids, dtype=np.uint32)))
+
+
+@dataclass
+class IdMaps:
+    users: IdMap
+    movies: IdMap
+
+    def save(self, out_dir: Path = ID_MAP_DIR) -> None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir / "user_ids.npy", self.users.raw_ids)
+        np.save(out_dir / "movie_ids.npy", self.movies.raw_ids)
+
+    @classmethod
+    def load(cls, in_dir: Path = ID_MAP_DIR) -> "IdMaps":
+        return cls(
+            users=IdMap(np.load(in_dir / "user_ids.npy")),
+            movies=IdMap(np.load(in_dir / "movie_ids.npy")),
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """The (users, movies) shape of a matrix indexed by these maps."""
+        return len(self.users), len(self.movies)
+
+
+def _select_ids(conn: sqlite3.Connection, query: str) -> Sequence[int]:
+    return [i for (i,) in conn.execute(query)]
+
+
+def build_id_maps(db_file: Path = DB_FILE) -> IdMaps:
+    """Every user with a rating, and every movie with a title."""
+    with closing(sqlite3.connect(db_file)) as conn:
+        users = _select_ids(conn, "SELECT user_id  FROM user_stats")
+        movies = _select_ids(conn, "SELECT id  FROM movie_title")
+    id_maps = IdMaps(IdMap.from_ids(users), IdMap.from_ids(movies))
+    log.info(f"{len(id_maps.users):_} users and {len(id_maps.movies):_} movies mapped")
+    return id_maps
+
+
+def load_id_maps(db_file: Path = DB_FILE, in_dir: Path = ID_MAP_DIR) -> IdMaps:
+    """Loads the maps that the ETL persisted, building them if need be."""
+    if (in_dir / "user_ids.npy").exists():
+        return IdMaps.load(in_dir)
+    id_maps = build_id_maps(db_file)
+    id_maps.save(in_dir)
+    return id_maps
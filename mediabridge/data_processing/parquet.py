@@ -0,0 +1,195 @@
+"""
+Parquet export of the rating and movie_title tables, and the matching read path.
+
+The exported out/parquet/ dataset lets analytics and training runs skip the
+multi-gigabyte sqlite file. Ratings are hive-partitioned by movie_id, and all
+columns use compact dtypes. Readers name just the columns they need, and
+filters are pushed down to the partition and row-group level, so a
+training run only decodes the columns and rows it asked for.
+"""
+
+import logging
+import operator
+import sqlite3
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import closing
+from enum import Enum
+from pathlib import Path
+from time import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import typer
+
+from mediabridge.data_processing.etl import Filters, iter_rating_table
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.definitions import DB_FILE, OUTPUT_DIR
+
+log = logging.getLogger(__name__)
+
+PARQUET_DIR = OUTPUT_DIR / "parquet"
+ROWS_PER_BATCH = 1_000_000
+
+RATING_SCHEMA = pa.schema(
+    [
+        ("user_id", pa.uint32()),
+        ("movie_id", pa.uint16()),
+        ("rating", pa.uint8()),
+        ("day", pa.uint16()),
+    ]
+)
+RATING_PARTITIONING = ds.partitioning(
+    pa.schema([("movie_id", pa.uint16())]),
+    flavor="hive",
+)
+
+app = typer.Typer()
+
+
+class RatingSource(str, Enum):
+    """Where consumers of the ratings data should read it from."""
+
+    sqlite = "sqlite"
+    parquet = "parquet"
+
+
+class ExportFormat(str, Enum):
+    parquet = "parquet"
+
+
+def _record_batches(ratings: RatingBatch) -> Iterator[pa.RecordBatch]:
+    for i in range(0, len(ratings), ROWS_PER_BATCH):
+        chunk = ratings[i : i + ROWS_PER_BATCH]
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(getattr(chunk, name)) for name in RATING_SCHEMA.names],
+            schema=RATING_SCHEMA,
+        )
+
+
+def export_ratings(
+    db_file: Path = DB_FILE,
+    out_dir: Path = PARQUET_DIR / "rating",
+) -> int:
+    """Writes the rating table as a movie_id partitioned Parquet dataset.
+
+    Rows are sorted movie-major first, so each partition is written exactly
+    once, as a single file. Returns the number of rows written.
+    """
+    ratings = RatingBatch.concat(list(iter_rating_table(db_file)))
+    ratings = ratings[np.lexsort((ratings.user_id, ratings.movie_id))]
+    ds.write_dataset(
+        _record_batches(ratings),
+        out_dir,
+        schema=RATING_SCHEMA,
+        format="parquet",
+        partitioning=RATING_PARTITIONING,
+        existing_data_behavior="delete_matching",
+        max_partitions=len(np.unique(ratings.movie_id)) + 1,
+    )
+    return len(ratings)
+
+
+def export_movie_titles(
+    db_file: Path = DB_FILE,
+    out_file: Path = PARQUET_DIR / "movie_title.parquet",
+) -> int:
+    """Writes the movie_title table as a single Parquet file."""
+    query = "SELECT id, year, title  FROM movie_title"
+    with closing(sqlite3.connect(db_file)) as conn:
+        df = pd.read_sql_query(query, conn)
+    df["id"] = df.id.astype(np.uint16)
+    df["year"] = df.year.astype("UInt16")
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(out_file, index=False)
+    return len(df)
+
+
+_OPERATORS: dict[str, Callable[[ds.Expression, Any], ds.Expression]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda field, values: field.isin(values),
+}
+
+
+def _to_expression(filters: Filters) -> ds.Expression | None:
+    expr = None
+    for column, op, value in filters:
+        term = _OPERATORS[op](ds.field(column), value)
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def read_ratings(
+    columns: Sequence[str] = RATING_SCHEMA.names,
+    filters: Filters = (),
+    in_dir: Path = PARQUET_DIR / "rating",
+) -> pd.DataFrame:
+    """Reads only the requested columns of only the matching ratings."""
+    dataset = ds.dataset(in_dir, format="parquet", partitioning=RATING_PARTITIONING)
+    table = dataset.to_table(columns=list(columns), filter=_to_expression(filters))
+    df: pd.DataFrame = table.to_pandas()
+    return df
+
+
+def read_movie_titles(
+    columns: Sequence[str] = ("id", "year", "title"),
+    filters: Filters = (),
+    in_file: Path = PARQUET_DIR / "movie_title.parquet",
+) -> pd.DataFrame:
+    table = ds.dataset(in_file, format="parquet").to_table(
+        columns=list(columns), filter=_to_expression(filters)
+    )
+    df: pd.DataFrame = table.to_pandas()
+    return df
+
+
+def iter_rating_parquet(
+    in_dir: Path = PARQUET_DIR / "rating",
+    filters: Filters = (),
+) -> Iterator[RatingBatch]:
+    """Reads the Parquet ratings in large chunks, as typed NumPy columns."""
+    dataset = ds.dataset(in_dir, format="parquet", partitioning=RATING_PARTITIONING)
+    batches = dataset.to_batches(
+        columns=RATING_SCHEMA.names, filter=_to_expression(filters)
+    )
+    for batch in batches:
+        yield RatingBatch(
+            **{
+                name: batch.column(name).to_numpy(zero_copy_only=False)
+                for name in RATING_SCHEMA.names
+            }
+        )
+
+
+def iter_ratings(
+    source: RatingSource = RatingSource.sqlite,
+    filters: Filters = (),
+    db_file: Path = DB_FILE,
+) -> Iterator[RatingBatch]:
+    """Reads the matching ratings in large chunks, from the chosen source."""
+    if source == RatingSource.parquet:
+        return iter_rating_parquet(filters=filters)
+    batches: Iterator[RatingBatch] = iter_rating_table(db_file, filters=filters)
+    return batches
+
+
+@app.command()
+def export(
+    ctx: typer.Context,
+    fmt: ExportFormat = typer.Option(ExportFormat.parquet, "--format"),
+) -> None:
+    """Export the rating and movie_title tables, e.g. to out/parquet/."""
+    t0 = time()
+    num_titles = export_movie_titles()
+    num_ratings = export_ratings()
+    print(
+        f"Exported {num_titles:_} movie titles and {num_ratings:_} ratings"
+        f" to {PARQUET_DIR} in {time() - t0:.3f} s"
+    )
@@ -0,0 +1,170 @@
+"""
+Parses the Netflix prize training_set files into typed columnar arrays.
+
+Each mv_00*.txt file holds a "movie_id:" header line followed by
+"user_id,rating,date" lines. Rather than yielding a dict per line, we let the
+pandas C parser fill NumPy arrays directly, one file at a time. The 17,770
+files are spread over a process pool, and iter_rating_batches() yields a
+RatingBatch per file, in input order, for the ETL to bulk insert into sqlite.
+Parsing runs at most a bounded window ahead of that consumer.
+"""
+
+import logging
+import re
+from collections import deque
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+from mediabridge.definitions import NETFLIX_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+TRAINING_DIR = NETFLIX_DATA_DIR / "training_set/training_set"
+
+GLOB = "mv_00*.txt"
+PATH_RE = re.compile(r"mv_(\d{7})\.txt$")
+
+# Bounds how far parsing may run ahead of a slower consumer, such as sqlite.
+PREFETCH_PER_WORKER = 8
+
+# Rating dates are kept as days since the Unix epoch, which fits a uint16
+# until 2149. The Netflix prize data spans 1999-11-11 .. 2005-12-31.
+EPOCH = np.datetime64("1970-01-01", "D")
+# Stands in for the NULL day of ratings migrated from before dates were kept.
+UNKNOWN_DAY = 0
+
+
+@dataclass
+class RatingBatch:
+    """A run of ratings held as parallel, compactly typed, columns."""
+
+    user_id: NDArray[np.uint32]
+    movie_id: NDArray[np.uint16]
+    rating: NDArray[np.uint8]
+    day: NDArray[np.uint16]
+
+    def __len__(self) -> int:
+        return len(self.user_id)
+
+    def __getitem__(self, idx: slice | NDArray[np.intp]) -> "RatingBatch":
+        return RatingBatch(
+            user_id=self.user_id[idx],
+            movie_id=self.movie_id[idx],
+            rating=self.rating[idx],
+            day=self.day[idx],
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["RatingBatch"]) -> "RatingBatch":
+        return cls(
+            user_id=np.concatenate([b.user_id for b in batches]),
+            movie_id=np.concatenate([b.movie_id for b in batches]),
+            rating=np.concatenate([b.rating for b in batches]),
+            day=np.concatenate([b.day for b in batches]),
+        )
+
+
+@dataclass(frozen=True)
+class RatingFile:
+    """Identifies one version of a ratings file, for the ETL checkpoint manifest."""
+
+    movie_id: int
+    path: Path
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def stat(cls, mv_ratings_file: Path) -> "RatingFile":
+        st = mv_ratings_file.stat()
+        return cls(
+            get_movie_id(mv_ratings_file), mv_ratings_file, st.st_size, st.st_mtime_ns
+        )
+
+
+def to_day(d: date | str) -> int:
+    """Converts a date, or an ISO "YYYY-MM-DD" string, to days since the epoch."""
+    return int((np.datetime64(d, "D") - EPOCH).astype(int))
+
+
+def from_day(day: int) -> date:
+    d: date = (EPOCH + np.timedelta64(day, "D")).astype(date)
+    return d
+
+
+def find_rating_files(training_dir: Path = TRAINING_DIR) -> list[Path]:
+    """Returns the per-movie ratings files, sorted by movie ID."""
+    in_files = sorted(training_dir.glob(GLOB))  # e.g. mv_0017770.txt
+    assert in_files, training_dir
+    return in_files
+
+
+def get_movie_id(mv_ratings_file: Path) -> int:
+    m = PATH_RE.search(mv_ratings_file.name)
+    assert m, mv_ratings_file
+    return int(m.group(1))
+
+
+def parse_ratings_file(mv_ratings_file: Path) -> RatingBatch:
+    """Parses a single mv_00*.txt file, without a per-line python loop."""
+    movie_id = get_movie_id(mv_ratings_file)
+    with open(mv_ratings_file, "r") as fin:
+        line = fin.readline()
+        assert line == f"{movie_id}:\n", mv_ratings_file
+        df = pd.read_csv(
+            fin,
+            header=None,
+            names=["user_id", "rating", "date"],
+            dtype={"user_id": "uint32", "rating": "uint8", "date": "category"},
+        )
+    assert not df.empty, mv_ratings_file
+    # A file holds a few thousand distinct dates at most, so convert only those.
+    dates = df.date.cat.categories.to_numpy().astype("datetime64[D]")
+    days = (dates - EPOCH).astype(np.uint16)
+    user_id = df.user_id.to_numpy()
+    return RatingBatch(
+        user_id=user_id,
+        movie_id=np.full(len(user_id), movie_id, dtype=np.uint16),
+        rating=df.rating.to_numpy(),
+        day=days[df.date.cat.codes.to_numpy()],
+    )
+
+
+BatchFilter = Callable[[RatingBatch], RatingBatch]
+
+
+def _parse_filtered(
+    mv_ratings_file: Path, batch_filter: BatchFilter | None
+) -> RatingBatch:
+    batch = parse_ratings_file(mv_ratings_file)
+    return batch_filter(batch) if batch_filter else batch
+
+
+def iter_rating_batches(
+    in_files: Sequence[Path],
+    workers: int = 1,
+    batch_filter: BatchFilter | None = None,
+) -> Iterator[RatingBatch]:
+    """Yields one batch per input file, in input order, parsing in parallel.
+
+    A (picklable) batch_filter, e.g. Sample.filter_batch, runs in the worker,
+    so rows it drops are never sent back to this process.
+    """
+    if workers <= 1:
+        for mv_ratings_file in in_files:
+            yield _parse_filtered(mv_ratings_file, batch_filter)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: deque[Future[RatingBatch]] = deque()
+        for mv_ratings_file in in_files:
+            window.append(pool.submit(_parse_filtered, mv_ratings_file, batch_filter))
+            if len(window) >= workers * PREFETCH_PER_WORKER:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
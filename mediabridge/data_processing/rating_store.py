@@ -0,0 +1,207 @@
+"""
+A read-only, memory-mapped, columnar copy of the rating table.
+
+The out/ratings/ directory holds the packed user_id (uint32), movie_id (uint16),
+rating (uint8) and day (uint16) columns three times over, sorted movie-major,
+user-major, and by day, each accompanied by a CSR-style offsets array indexed
+by raw ID (or day number). All ratings for a given movie, for a given user, or
+within a window of days are then a zero-copy slice of page-cache backed
+arrays, and a full sparse matrix can be assembled without a python loop over
+the rows.
+"""
+
+import json
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from time import time
+from typing import Any
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.parquet import RatingSource, iter_ratings
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.definitions import OUTPUT_DIR
+
+log = logging.getLogger(__name__)
+
+RATING_STORE_DIR = OUTPUT_DIR / "ratings"
+COLUMNS = ("user_id", "movie_id", "rating", "day")
+
+app = typer.Typer()
+
+
+def _offsets(sorted_ids: NDArray[Any], max_id: int) -> NDArray[np.int64]:
+    """Rows for ID i live at [offsets[i], offsets[i + 1]) of the sorted columns."""
+    offsets = np.zeros(max_id + 2, dtype=np.int64)
+    np.cumsum(np.bincount(sorted_ids, minlength=max_id + 1), out=offsets[1:])
+    return offsets
+
+
+def _save_sorted(out_dir: Path, batch: RatingBatch, offsets: NDArray[np.int64]) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for col in COLUMNS:
+        np.save(out_dir / f"{col}.npy", getattr(batch, col))
+    np.save(out_dir / "offsets.npy", offsets)
+
+
+def build_rating_store(
+    batches: Iterable[RatingBatch],
+    store_dir: Path = RATING_STORE_DIR,
+) -> None:
+    """Writes the movie-major, user-major and day sorted copies of the ratings."""
+    t0 = time()
+    ratings = RatingBatch.concat(list(batches))
+    max_user_id = int(ratings.user_id.max(initial=0))
+    max_movie_id = int(ratings.movie_id.max(initial=0))
+    max_day = int(ratings.day.max(initial=0))
+
+    by_movie = ratings[np.lexsort((ratings.user_id, ratings.movie_id))]
+    _save_sorted(
+        store_dir / "by_movie", by_movie, _offsets(by_movie.movie_id, max_movie_id)
+    )
+    del by_movie
+    by_user = ratings[np.lexsort((ratings.movie_id, ratings.user_id))]
+    _save_sorted(store_dir / "by_user", by_user, _offsets(by_user.user_id, max_user_id))
+    del by_user
+    by_day = ratings[np.lexsort((ratings.movie_id, ratings.user_id, ratings.day))]
+    _save_sorted(store_dir / "by_day", by_day, _offsets(by_day.day, max_day))
+
+    meta = {
+        "num_ratings": len(ratings),
+        "max_user_id": max_user_id,
+        "max_movie_id": max_movie_id,
+        "max_day": max_day,
+    }
+    with open(store_dir / "meta.json", "w") as fout:
+        json.dump(meta, fout, indent=2)
+    log.info(f"Wrote {len(ratings):_} ratings to {store_dir} in {time() - t0:.3f} s")
+
+
+def _open_sorted(in_dir: Path) -> tuple[RatingBatch, NDArray[np.int64]]:
+    cols = {col: np.load(in_dir / f"{col}.npy", mmap_mode="r") for col in COLUMNS}
+    return RatingBatch(**cols), np.load(in_dir / "offsets.npy", mmap_mode="r")
+
+
+@dataclass
+class RatingStore:
+    """Memory-mapped ratings, sliceable by movie or by user in O(1)."""
+
+    by_movie: RatingBatch
+    movie_offsets: NDArray[np.int64]
+    by_user: RatingBatch
+    user_offsets: NDArray[np.int64]
+    by_day: RatingBatch
+    day_offsets: NDArray[np.int64]
+    max_user_id: int
+    max_movie_id: int
+    max_day: int
+
+    @classmethod
+    def open(cls, store_dir: Path = RATING_STORE_DIR) -> "RatingStore":
+        with open(store_dir / "meta.json") as fin:
+            meta = json.load(fin)
+        by_movie, movie_offsets = _open_sorted(store_dir / "by_movie")
+        by_user, user_offsets = _open_sorted(store_dir / "by_user")
+        by_day, day_offsets = _open_sorted(store_dir / "by_day")
+        return cls(
+            by_movie=by_movie,
+            movie_offsets=movie_offsets,
+            by_user=by_user,
+            user_offsets=user_offsets,
+            by_day=by_day,
+            day_offsets=day_offsets,
+            max_user_id=meta["max_user_id"],
+            max_movie_id=meta["max_movie_id"],
+            max_day=meta["max_day"],
+        )
+
+    def __len__(self) -> int:
+        return len(self.by_user)
+
+    def for_movie(self, movie_id: int) -> RatingBatch:
+        """Returns all ratings of a movie, sorted by user_id. Empty if unknown."""
+        if not 0 <= movie_id <= self.max_movie_id:
+            return self.by_movie[0:0]
+        lo, hi = self.movie_offsets[movie_id : movie_id + 2]
+        return self.by_movie[lo:hi]
+
+    def for_user(self, user_id: int) -> RatingBatch:
+        """Returns all ratings by a user, sorted by movie_id. Empty if unknown."""
+        if not 0 <= user_id <= self.max_user_id:
+            return self.by_user[0:0]
+        lo, hi = self.user_offsets[user_id : user_id + 2]
+        return self.by_user[lo:hi]
+
+    def between(self, first_day: int, end_day: int) -> RatingBatch:
+        """Returns the ratings made in the [first_day, end_day) window, by day."""
+        lo, hi = (
+            self.day_offsets[int(np.clip(day, 0, self.max_day + 1))]
+            for day in (first_day, end_day)
+        )
+        return self.by_day[lo : max(lo, hi)]
+
+    def to_csr(self, id_maps: IdMaps | None = None) -> csr_matrix:
+        """Returns a (user, movie) matrix of star ratings.
+
+        It is indexed by raw IDs, or densely, given id maps that cover every
+        user and movie in the store.
+        """
+        if id_maps is None:
+            return csr_matrix(
+                (self.by_user.rating, self.by_user.movie_id, self.user_offsets),
+                shape=(self.max_user_id + 1, self.max_movie_id + 1),
+            )
+        # When every rating user is mapped, the dense rows are contiguous runs
+        # of by_user, so indptr is just a subset of the offsets.
+        last = self.max_user_id + 1
+        user_ids = np.minimum(id_maps.users.raw_ids.astype(np.int64), last)
+        starts = self.user_offsets[user_ids]
+        ends = self.user_offsets[np.minimum(user_ids + 1, last)]
+        indptr = np.append(starts, len(self.by_user))
+        assert (ends - starts).sum() == len(self), "a user is missing from the id map"
+        movies = id_maps.movies.to_dense(self.by_user.movie_id)
+        assert (movies >= 0).all(), "a movie is missing from the id map"
+        return csr_matrix(
+            (self.by_user.rating, movies, indptr),
+            shape=id_maps.shape,
+        )
+
+    def user_rows(self, user_ids: NDArray[Any], movies: IdMap) -> csr_matrix:
+        """Returns a matrix of star ratings, a row per given raw user ID.
+
+        Its columns are the dense indexes of movies; other movies are left out.
+        """
+        last = self.max_user_id + 1
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        starts = self.user_offsets[np.minimum(user_ids, last)]
+        lengths = self.user_offsets[np.minimum(user_ids + 1, last)] - starts
+        ends = np.cumsum(lengths)
+        # The positions of each user's run of ratings in by_user, concatenated.
+        rows = np.arange(ends[-1] if len(ends) else 0) - np.repeat(
+            ends - lengths - starts, lengths
+        )
+        cols = movies.to_dense(self.by_user.movie_id[rows])
+        known = cols >= 0
+        return csr_matrix(
+            (
+                self.by_user.rating[rows][known],
+                (np.repeat(np.arange(len(user_ids)), lengths)[known], cols[known]),
+            ),
+            shape=(len(user_ids), len(movies)),
+        )
+
+
+@app.command()
+def build_store(
+    ctx: typer.Context,
+    source: RatingSource = RatingSource.sqlite,
+) -> None:
+    """Build the memory-mapped out/ratings/ store from the rating table."""
+    build_rating_store(iter_ratings(source))
+    print(f"Rating store saved to {RATING_STORE_DIR}")
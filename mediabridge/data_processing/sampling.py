@@ -0,0 +1,66 @@
+"""
+Deterministic pseudo-random subsets of users or movies, for a small dataset.
+
+Taking the first N rows of the ratings is biased towards low movie IDs, as the
+training_set is in movie order. Instead, each ID is kept or dropped according
+to a seeded hash of the ID alone. So the decision needs no global state, it
+can be applied to each file as it is parsed, and a given user keeps either all
+of their ratings or none, so per-user statistics stay meaningful.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from mediabridge.data_processing.rating_parser import RatingBatch, RatingFile
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = 2**64 - 1
+
+
+class SampleBy(str, Enum):
+    user = "user"
+    movie = "movie"
+
+
+def hash32(ids: NDArray[Any], seed: int) -> NDArray[np.uint64]:
+    """The splitmix64 finalizer, whose top 32 bits are uniformly distributed."""
+    x = ids.astype(np.uint64) + np.uint64(seed * _GOLDEN & _MASK64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    h: NDArray[np.uint64] = (x ^ (x >> np.uint64(31))) >> np.uint64(32)
+    return h
+
+
+@dataclass(frozen=True)
+class Sample:
+    """Keeps roughly `fraction` of all users, or of all movies, with their ratings."""
+
+    by: SampleBy
+    fraction: float
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        if not 0 < self.fraction <= 1:
+            raise ValueError(
+                f"A sample fraction must be in (0, 1], not {self.fraction}"
+            )
+
+    def keep(self, ids: NDArray[Any]) -> NDArray[np.bool_]:
+        mask: NDArray[np.bool_] = hash32(ids, self.seed) < int(self.fraction * 2**32)
+        return mask
+
+    def filter_files(self, files: Sequence[RatingFile]) -> list[RatingFile]:
+        """Drops the files of unsampled movies, so they need not even be parsed."""
+        if self.by != SampleBy.movie:
+            return list(files)
+        keep = self.keep(np.array([f.movie_id for f in files], dtype=np.uint16))
+        return [f for f, k in zip(files, keep.tolist()) if k]
+
+    def filter_batch(self, batch: RatingBatch) -> RatingBatch:
+        ids = batch.user_id if self.by == SampleBy.user else batch.movie_id
+        return batch[np.flatnonzero(self.keep(ids))]
@@ -0,0 +1,125 @@
+"""
+Writes a synthetic dataset in the exact layout and format of the Netflix prize.
+
+The real dataset is a 500 MB download, and a full load takes minutes, so ETL
+changes can instead be developed, tested, and benchmarked offline against a
+generated dataset of any size. As in the real data, movie and user popularity
+are heavily skewed, user IDs are sparse within 1 .. MAX_USER_ID, and some
+titles hold commas or lack a year. A given seed always produces identical files.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import typer
+from numpy.typing import NDArray
+
+from mediabridge.data_processing.rating_parser import EPOCH, GLOB, to_day
+from mediabridge.definitions import DATA_DIR
+
+log = logging.getLogger(__name__)
+
+SYNTHETIC_DIR = DATA_DIR / "synthetic"
+
+MAX_USER_ID = 2_649_429
+FIRST_DAY = to_day("1999-11-11")
+LAST_DAY = to_day("2005-12-31")
+# Approximately the star distribution of the real training_set.
+STAR_P = [0.046, 0.101, 0.287, 0.336, 0.230]
+# Exponent of the Zipf-like popularity of movies and of users.
+ZIPF_A = 0.8
+
+app = typer.Typer()
+
+
+def _popularity(n: int, rng: np.random.Generator) -> NDArray[np.float64]:
+    """Returns shuffled Zipf-like sampling weights, summing to one."""
+    weights = 1.0 / np.arange(1, n + 1) ** ZIPF_A
+    rng.shuffle(weights)
+    p: NDArray[np.float64] = weights / weights.sum()
+    return p
+
+
+def _write_movie_titles(
+    titles_txt: Path, num_movies: int, rng: np.random.Generator
+) -> None:
+    years = rng.integers(1915, 2006, num_movies)
+    with open(titles_txt, "w", encoding="ISO-8859-1") as fout:
+        for movie_id, year in enumerate(years.tolist(), start=1):
+            year_str = "NULL" if movie_id % 97 == 0 else str(year)
+            title = f"Synthetic Movie {movie_id}"
+            if movie_id % 7 == 0:
+                title += ", Part II"
+            fout.write(f"{movie_id},{year_str},{title}\n")
+
+
+def _write_ratings_file(
+    mv_ratings_file: Path,
+    movie_id: int,
+    user_id: NDArray[np.uint32],
+    rng: np.random.Generator,
+) -> None:
+    days = rng.integers(FIRST_DAY, LAST_DAY + 1, len(user_id))
+    df = pd.DataFrame(
+        {
+            "user_id": user_id,
+            "rating": rng.choice(5, len(user_id), p=STAR_P) + 1,
+            "date": np.datetime_as_string(EPOCH + days, unit="D"),
+        }
+    )
+    with open(mv_ratings_file, "w") as fout:
+        fout.write(f"{movie_id}:\n")
+        df.to_csv(fout, header=False, index=False)
+
+
+def generate_dataset(
+    out_dir: Path = SYNTHETIC_DIR,
+    num_movies: int = 1_000,
+    num_users: int = 10_000,
+    num_ratings: int = 1_000_000,
+    seed: int = 0,
+) -> int:
+    """Writes training_set/training_set/mv_00*.txt and movie_titles.txt to out_dir.
+
+    Returns the number of ratings written. That falls a little short of
+    num_ratings, as a user rates a given movie at most once.
+    """
+    assert 0 < num_movies <= np.iinfo(np.uint16).max, num_movies
+    assert 0 < num_users <= MAX_USER_ID, num_users
+    rng = np.random.default_rng(seed)
+    training_dir = out_dir / "training_set/training_set"
+    training_dir.mkdir(parents=True, exist_ok=True)
+    for stale in training_dir.glob(GLOB):
+        stale.unlink()
+    _write_movie_titles(out_dir / "movie_titles.txt", num_movies, rng)
+
+    user_ids = np.sort(rng.choice(MAX_USER_ID, num_users, replace=False) + 1)
+    user_cdf = np.cumsum(_popularity(num_users, rng))
+    counts = rng.multinomial(num_ratings, _popularity(num_movies, rng))
+    num_written = 0
+    for movie_id, count in enumerate(counts.tolist(), start=1):
+        # Sampling with replacement, then dropping repeats, is O(count) per movie.
+        picks = np.searchsorted(user_cdf, rng.random(max(1, count)) * user_cdf[-1])
+        user_id = user_ids[rng.permutation(np.unique(picks))].astype(np.uint32)
+        _write_ratings_file(
+            training_dir / f"mv_{movie_id:07d}.txt", movie_id, user_id, rng
+        )
+        num_written += len(user_id)
+    log.info(f"Wrote {num_written:_} synthetic ratings of {num_movies:_} movies")
+    return num_written
+
+
+@app.command()
+def gen_synthetic(
+    ctx: typer.Context,
+    out_dir: Path = SYNTHETIC_DIR,
+    movies: int = 1_000,
+    users: int = 10_000,
+    ratings: int = 1_000_000,
+    seed: int = 0,
+) -> None:
+    """Write a synthetic dataset in the Netflix prize format, e.g. for benchmarks."""
+    num_ratings = generate_dataset(out_dir, movies, users, ratings, seed)
+    print(f"Wrote {num_ratings:_} ratings of {movies:_} movies to {out_dir}")
@@ -1,4 +1,18 @@
+"""
+The process-wide MongoDB client.
+
+A MongoClient holds a connection pool, and creating one costs a TCP (and TLS)
+handshake plus server discovery. So each process lazily creates a single
+client, on first use, and every caller shares it. A forked child, e.g. a
+pre-fork web server's worker, must not use its parent's sockets, so it
+forgets the inherited client and creates its own.
+
+The pool size and timeouts may be set in the environment, alongside
+MONGODB_URI, e.g. MONGODB_MAX_POOL_SIZE=50.
+"""
+
 import os
+import threading
 from typing import Any
 
 from dotenv import load_dotenv
@@ -7,12 +21,69 @@ from pymongo.database import Database
 
 load_dotenv()
 
+MONGO_DB = "mediabridge"
+
+# MongoClient options, and their defaults, by environment variable.
+_POOL_OPTIONS = {
+    "MONGODB_MAX_POOL_SIZE": ("maxPoolSize", 100),
+    "MONGODB_MIN_POOL_SIZE": ("minPoolSize", 0),
+    "MONGODB_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", 60_000),
+    "MONGODB_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", 5_000),
+    "MONGODB_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", 10_000),
+    "MONGODB_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", 30_000),
+}
+
+_client: MongoClient[Any] | None = None
+_lock = threading.Lock()
+
+
+def client_options() -> dict[str, Any]:
+    return {
+        option: int(os.environ.get(var, default))
+        for var, (option, default) in _POOL_OPTIONS.items()
+    }
+
+
+def get_mongo_client() -> MongoClient[Any]:
+    """The process's pooled client, created on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            # This will raise an exception if MONGODB_URI is not defined in the environment.
+            # If that isn't enough information to help developers populate their environment,
+            # we should use `get` and throw a custom message if the value is missing.
+            mongo_uri = os.environ["MONGODB_URI"]
+            _client = MongoClient(mongo_uri, connect=False, **client_options())
+        return _client
+
+
+def set_mongo_client(client: MongoClient[Any] | None) -> None:
+    """Replaces the process's client, e.g. with a mock one in tests.
+
+    Unlike close_mongo_client(), the old client is left open.
+    """
+    global _client
+    with _lock:
+        _client = client
+
+
+def close_mongo_client() -> None:
+    """Closes the pool. A later call creates a new client, as a closed one is dead."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _forget_client_after_fork() -> None:
+    global _client, _lock
+    _client = None
+    _lock = threading.Lock()  # in case another thread held it during the fork
+
+
+os.register_at_fork(after_in_child=_forget_client_after_fork)
+
 
 def connect_to_mongo() -> Database[Any]:
-    # This will raise an exception if MONGODB_URI is not defined in the environment.
-    # If that isn't enough information to help developers populate their environment,
-    # we should use `get` and throw a custom message if the value is missing.
-    mongo_uri = os.environ["MONGODB_URI"]
-    client: MongoClient[Any] = MongoClient(mongo_uri)
-    db = client["mediabridge"]
-    return db
+    return get_mongo_client()[MONGO_DB]
@@ -0,0 +1,204 @@
+"""
+Upgrades an existing movies.sqlite, in place, to the current schema.
+
+Schema version 1 stored movie IDs as VARCHARs, so hot queries needed
+CAST(movie_id AS INTEGER), and the rating table was a rowid table plus a
+separate primary key index. Version 2 uses integer IDs throughout and
+clusters rating on (user_id, movie_id) as a WITHOUT ROWID table, with a
+covering (movie_id, user_id, rating) index for movie-major access.
+Version 3 adds the rating day, and an index on it. Older databases never kept
+rating dates, so migrated ratings have a NULL day, until a fresh `mb load
+--regen` or `mb load --movie ...` reloads them.
+
+Databases from before the ETL kept an ingested_file manifest and rating
+aggregates get both rebuilt here, so that the next `mb load` is incremental,
+and the reports are not empty. A training_set file only enters the manifest
+if the database holds all of its ratings.
+"""
+
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from time import time
+
+import typer
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from mediabridge.data_processing.rating_parser import GLOB, TRAINING_DIR, RatingFile
+from mediabridge.db.tables import (
+    DB_FILE,
+    MOVIE_STATS_V_DDL,
+    RATING_V_DDL,
+    SCHEMA_VERSION,
+    Base,
+    rating_day_idx,
+    sqlite_ddl,
+)
+
+log = logging.getLogger(__name__)
+
+app = typer.Typer()
+
+# Per table, the INSERT that converts old rows to the new column types.
+# Rows go into the clustered rating table already in primary key order.
+V1_TO_V2 = {
+    "movie_title": """
+        INSERT INTO movie_title (id, year, title)
+        SELECT CAST(id AS INTEGER), year, title  FROM movie_title_v1
+    """,
+    "popular_movie": """
+        INSERT INTO popular_movie (id, count, year, title)
+        SELECT CAST(id AS INTEGER), count, year, title  FROM popular_movie_v1
+    """,
+    "rating": """
+        INSERT INTO rating (user_id, movie_id, rating)
+        SELECT user_id, CAST(movie_id AS INTEGER) AS m, rating
+        FROM rating_v1
+        ORDER BY user_id, m
+    """,
+}
+# ETL bookkeeping tables, which databases loaded by older code may lack.
+ETL_TABLES = ["ingested_file", "etl_sample", "movie_stats", "user_stats"]
+REBUILD_STATS = [
+    """
+    INSERT INTO movie_stats (movie_id, count, n1, n2, n3, n4, n5)
+    SELECT
+        movie_id, COUNT(*), SUM(rating = 1), SUM(rating = 2), SUM(rating = 3),
+        SUM(rating = 4), SUM(rating = 5)
+    FROM rating
+    GROUP BY movie_id
+    """,
+    """
+    INSERT INTO user_stats (user_id, count, sum)
+    SELECT user_id, COUNT(*), SUM(rating)  FROM rating  GROUP BY user_id
+    """,
+]
+VIEWS = {
+    "rating_v": RATING_V_DDL,
+    "movie_stats_v": MOVIE_STATS_V_DDL,
+}
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    return int(version)
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    query = "SELECT 1  FROM sqlite_master  WHERE type = 'table'  AND name = ?"
+    return conn.execute(query, (name,)).fetchone() is not None
+
+
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    """Rebuilds the v1 tables with the current schema."""
+    tables = [t for t in V1_TO_V2 if _table_exists(conn, t)]
+    for table in tables:
+        # Named indexes would collide with those of the replacement table.
+        query = (
+            "SELECT name  FROM sqlite_master  WHERE type = 'index'  AND tbl_name = ?"
+        )
+        for (index,) in conn.execute(query, (table,)).fetchall():
+            if not index.startswith("sqlite_autoindex"):
+                conn.execute(f"DROP INDEX {index}")
+        conn.execute(f"ALTER TABLE {table}  RENAME TO {table}_v1")
+
+    for table in tables:
+        t0 = time()
+        new_table = Base.metadata.tables[table]
+        conn.execute(sqlite_ddl(CreateTable(new_table)))
+        conn.execute(V1_TO_V2[table])
+        conn.execute(f"DROP TABLE {table}_v1")
+        for index in new_table.indexes:
+            conn.execute(sqlite_ddl(CreateIndex(index)))
+        log.info(f"Migrated {table} in {time() - t0:.3f} s")
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE rating  ADD COLUMN day INTEGER")
+    conn.execute(sqlite_ddl(CreateIndex(rating_day_idx)))
+
+
+def _is_empty(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(f"SELECT 1  FROM {table}  LIMIT 1").fetchone() is None
+
+
+def _count_ratings(mv_ratings_file: Path) -> int:
+    # One "<movie_id>:" header line, then a line per rating.
+    return len(mv_ratings_file.read_bytes().splitlines()) - 1
+
+
+def _rebuild_etl_tables(conn: sqlite3.Connection, training_dir: Path) -> None:
+    """Fills in missing rating aggregates and ingested_file manifest rows."""
+    for table in ETL_TABLES:
+        conn.execute(
+            sqlite_ddl(CreateTable(Base.metadata.tables[table], if_not_exists=True))
+        )
+    if _is_empty(conn, "movie_stats"):
+        for query in REBUILD_STATS:
+            conn.execute(query)
+    if not _is_empty(conn, "ingested_file"):
+        return
+    counts = dict(conn.execute("SELECT movie_id, count  FROM movie_stats"))
+    ins = """
+    INSERT INTO ingested_file (movie_id, file_name, size, mtime_ns, num_rows)
+    VALUES (?, ?, ?, ?, ?)
+    """
+    for path in sorted(training_dir.glob(GLOB)):
+        f = RatingFile.stat(path)
+        if f.movie_id in counts and counts[f.movie_id] == _count_ratings(path):
+            conn.execute(
+                ins, (f.movie_id, path.name, f.size, f.mtime_ns, counts[f.movie_id])
+            )
+
+
+def migrate(
+    db_file: Path = DB_FILE,
+    *,
+    vacuum: bool = True,
+    training_dir: Path = TRAINING_DIR,
+) -> bool:
+    """Upgrades db_file to SCHEMA_VERSION. Returns False if it was already current.
+
+    The conversion runs in a single transaction, so an interrupted migration
+    leaves the old schema intact. VACUUM then returns the freed pages.
+    """
+    with closing(sqlite3.connect(db_file, isolation_level=None)) as conn:
+        version = get_schema_version(conn)
+        if version >= SCHEMA_VERSION or not _table_exists(conn, "rating"):
+            return False
+        # Keep other tables' foreign keys pointing at the original table names.
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute("BEGIN")
+        try:
+            for view in VIEWS:
+                conn.execute(f"DROP VIEW IF EXISTS {view}")
+            if version < 2:
+                _migrate_v1(conn)
+            else:
+                _migrate_v2(conn)
+            for ddl in VIEWS.values():
+                conn.execute(ddl)
+            _rebuild_etl_tables(conn, training_dir)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if vacuum:
+            conn.execute("VACUUM")
+    return True
+
+
+@app.command(name="migrate")
+def migrate_command(
+    ctx: typer.Context,
+    vacuum: bool = typer.Option(True, help="Reclaim the space of the old tables."),
+) -> None:
+    """Upgrade out/movies.sqlite in place to the current schema."""
+    t0 = time()
+    if migrate(vacuum=vacuum):
+        print(f"Migrated {DB_FILE} to schema v{SCHEMA_VERSION} in {time() - t0:.3f} s")
+        print("Migrated ratings have no dates, until `pipenv run mb load --regen`")
+    else:
+        print(f"{DB_FILE} is already at schema v{SCHEMA_VERSION}")
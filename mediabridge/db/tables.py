@@ -1,11 +1,21 @@
+import logging
 from functools import cache
 
-from sqlalchemy import REAL, ForeignKey, Integer, String, create_engine
+from sqlalchemy import REAL, ForeignKey, Index, Integer, String, create_engine, text
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.schema import ExecutableDDLElement
 
 from mediabridge.definitions import DB_FILE, SQL_CONNECT_STRING
 
+log = logging.getLogger(__name__)
+
+# Stored in PRAGMA user_version. Version 2 has integer movie IDs,
+# and a clustered WITHOUT ROWID rating table. Version 3 keeps rating dates.
+# See db/migrate.py.
+SCHEMA_VERSION = 3
+
 
 class Base(DeclarativeBase):
     """Base class for all tables."""
@@ -13,7 +23,7 @@ class Base(DeclarativeBase):
 
 class MovieTitle(Base):
     __tablename__ = "movie_title"
-    id: Mapped[str] = mapped_column(String, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
     year: Mapped[int] = mapped_column(Integer, nullable=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
 
@@ -21,11 +31,87 @@ class MovieTitle(Base):
 _movie_fk = ForeignKey("movie_title.id")
 
 
+# Secondary indexes of a WITHOUT ROWID table implicitly end with the primary key,
+# so rating_day_idx covers every rating column, and rating_movie_idx all but day.
+rating_movie_idx = Index("rating_movie_idx", "movie_id", "user_id", "rating")
+rating_day_idx = Index("rating_day_idx", "day", "rating")
+RATING_INDEXES = (rating_movie_idx, rating_day_idx)
+
+
 class Rating(Base):
+    """Clustered by (user_id, movie_id), with covering indexes for movie-major
+    access and for time-window queries.
+    """
+
     __tablename__ = "rating"
+    __table_args__ = (*RATING_INDEXES, {"sqlite_with_rowid": False})
     user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    movie_id: Mapped[str] = mapped_column(String, _movie_fk, primary_key=True)
+    movie_id: Mapped[int] = mapped_column(Integer, _movie_fk, primary_key=True)
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Days since 1970-01-01. NULL only for rows migrated from schema v2 or older.
+    day: Mapped[int] = mapped_column(Integer, nullable=True)
+
+
+RATING_V_DDL = """
+CREATE VIEW rating_v AS
+SELECT user_id, rating, date(day * 86400, 'unixepoch') AS rating_date, mt.*
+FROM rating JOIN movie_title mt ON movie_id = mt.id
+"""
+
+
+class IngestedFile(Base):
+    """ETL checkpoint manifest: one row per fully loaded mv_00*.txt ratings file."""
+
+    __tablename__ = "ingested_file"
+    movie_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    file_name: Mapped[str] = mapped_column(String, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    mtime_ns: Mapped[int] = mapped_column(Integer, nullable=False)
+    num_rows: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class EtlSample(Base):
+    """The subset of users or movies whose ratings were loaded. No row means all."""
+
+    __tablename__ = "etl_sample"
+    by: Mapped[str] = mapped_column(String, primary_key=True)
+    fraction: Mapped[float] = mapped_column(REAL, nullable=False)
+    seed: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Running aggregates, maintained incrementally by the ETL as ratings come and go.
+
+
+class MovieStats(Base):
+    """Per-movie star histogram; count, mean and variance all follow from it."""
+
+    __tablename__ = "movie_stats"
+    movie_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    n1: Mapped[int] = mapped_column(Integer, nullable=False)
+    n2: Mapped[int] = mapped_column(Integer, nullable=False)
+    n3: Mapped[int] = mapped_column(Integer, nullable=False)
+    n4: Mapped[int] = mapped_column(Integer, nullable=False)
+    n5: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+    sum: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+MOVIE_STATS_V_DDL = """
+CREATE VIEW movie_stats_v AS
+SELECT
+    movie_id, count, n1, n2, n3, n4, n5, mean,
+    (n1 + 4 * n2 + 9 * n3 + 16 * n4 + 25 * n5) * 1.0 / count - mean * mean AS variance
+FROM (
+    SELECT *, (n1 + 2 * n2 + 3 * n3 + 4 * n4 + 5 * n5) * 1.0 / count AS mean
+    FROM movie_stats
+)
+"""
 
 
 # (derived) reporting tables, denormalized for convenience so no JOIN is needed
@@ -35,22 +121,22 @@ _movie_fk = ForeignKey("movie_title.id")  # new key for a new table
 
 class PopularMovie(Base):
     __tablename__ = "popular_movie"
-    id: Mapped[str] = mapped_column(String, _movie_fk, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, _movie_fk, primary_key=True)
     count: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
     year: Mapped[int] = mapped_column(Integer, nullable=True)  # denorm
     title: Mapped[str] = mapped_column(String, nullable=False)  # denorm
 
 
 # We avoid using a SQL reserved keyword when naming columns, to avoid quoting.
+# Both reporting queries read the small *_stats tables, never the rating table.
 POPULAR_MOVIE_QUERY = """
 SELECT
     movie_id,
-    COUNT(*) AS cnt,
-    MAX(year) AS year,
-    MAX(title) AS title
-FROM rating
+    ms.count AS cnt,
+    year,
+    title
+FROM movie_stats ms
 JOIN movie_title ON movie_id = id
-GROUP BY movie_id
 ORDER BY cnt DESC
 """
 
@@ -66,14 +152,18 @@ class ProlificUser(Base):
 
 PROLIFIC_USER_QUERY = """
 SELECT
-    CAST(user_id AS INTEGER),
-    COUNT(*) AS cnt,
-    ROUND(AVG(rating), 3) AS avg_rating
-FROM rating
-GROUP BY user_id
+    user_id,
+    count AS cnt,
+    ROUND(sum * 1.0 / count, 3) AS avg_rating
+FROM user_stats
 """
 
 
+def sqlite_ddl(element: ExecutableDDLElement) -> str:
+    """Renders e.g. CreateTable(...) as a statement for the plain sqlite3 driver."""
+    return str(element.compile(dialect=sqlite.dialect())).strip()
+
+
 @cache
 def get_engine() -> Engine:
     DB_FILE.parent.mkdir(exist_ok=True)
@@ -81,4 +171,17 @@ def get_engine() -> Engine:
 
 
 def create_tables() -> None:
+    with get_engine().connect() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+        is_new = not conn.execute(
+            text("SELECT 1  FROM sqlite_master  WHERE name = 'rating'")
+        ).first()
+        if is_new:
+            conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+            conn.commit()
+        elif version != SCHEMA_VERSION:
+            raise RuntimeError(
+                f"{DB_FILE} has schema v{version}, not v{SCHEMA_VERSION}."
+                " Please run `pipenv run mb migrate` to upgrade it."
+            )
     Base.metadata.create_all(get_engine())
@@ -0,0 +1,210 @@
+"""
+An approximate nearest neighbour (IVF) index, for top-k movies in sub-linear time.
+
+A user's score for movie i is  e_u . e_i + b_i,  which is the inner product of
+the query [e_u, 1] with the movie vector [e_i, b_i]. The index clusters the
+movie vectors with k-means into `nlist` inverted lists. A search scores the
+centroids, probes only the `nprobe` best lists, and so reads roughly
+nprobe / nlist of the movies.
+
+Movie vectors are stored as float16, halving the memory read per search.
+Optionally the best candidates are rescored exactly, from the model's float32
+embeddings, before the final top k is taken. The index is saved next to the
+model, in a directory of memory-mappable .npy arrays.
+"""
+
+import json
+import logging
+import pickle
+import shutil
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import typer
+from numpy.typing import ArrayLike, NDArray
+
+from mediabridge.definitions import LIGHTFM_MODEL_PKL
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.recommender.import_utils import import_lightfm_silently
+
+log = logging.getLogger(__name__)
+
+DEFAULT_NPROBE = 8
+# With rescoring, this many times k candidates get exact scores.
+RESCORE_FACTOR = 4
+
+app = typer.Typer()
+
+
+def ann_dir(model_file: Path) -> Path:
+    """Where the index of a model file lives."""
+    return model_file.with_suffix(".ann")
+
+
+def top_k(scores: NDArray[np.float32], k: int) -> NDArray[np.intp]:
+    """Indexes of the k largest scores, best first, in O(n + k log k)."""
+    if k < len(scores):
+        part = np.argpartition(-scores, k)[:k]
+    else:
+        part = np.arange(len(scores))
+    top: NDArray[np.intp] = part[np.argsort(-scores[part], kind="stable")]
+    return top
+
+
+def _augment(factors: ItemFactors) -> NDArray[np.float32]:
+    return np.hstack([factors.embeddings, factors.biases[:, None]]).astype(np.float32)
+
+
+def _kmeans(
+    x: NDArray[np.float32], nlist: int, iterations: int, seed: int
+) -> tuple[NDArray[np.float32], NDArray[np.intp]]:
+    """Lloyd's algorithm. Returns the centroids, and each row's nearest one."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    assign = np.zeros(len(x), dtype=np.intp)
+    for _ in range(iterations):
+        # argmin |x - c|^2  is  argmax  x.c - |c|^2 / 2
+        assign = np.argmax(x @ centroids.T - (centroids**2).sum(axis=1) / 2, axis=1)
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids, assign
+
+
+@dataclass
+class IvfIndex:
+    centroids: NDArray[np.float32]
+    # The movies of list j are items[offsets[j] : offsets[j + 1]].
+    offsets: NDArray[np.int64]
+    items: NDArray[np.int32]
+    vectors: NDArray[np.float16]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        factors: ItemFactors,
+        nlist: int | None = None,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IvfIndex":
+        """Clusters the movies into nlist lists, by default about 4 sqrt(n)."""
+        x = _augment(factors)
+        nlist = min(len(x), nlist or max(1, int(4 * np.sqrt(len(x)))))
+        centroids, assign = _kmeans(x, nlist, iterations, seed)
+        items = np.argsort(assign, kind="stable").astype(np.int32)
+        counts = np.bincount(assign, minlength=nlist)
+        return cls(
+            centroids=centroids,
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            items=items,
+            vectors=x[items].astype(np.float16),
+        )
+
+    def search(
+        self,
+        user: NDArray[np.float32],
+        k: int,
+        nprobe: int = DEFAULT_NPROBE,
+        exclude: ArrayLike = (),
+        rescore: ItemFactors | None = None,
+    ) -> NDArray[np.int32]:
+        """Returns up to k movies, best first, for a user embedding.
+
+        Excluded movies, e.g. those already rated, are never returned.
+        Given the model's factors, the candidates are rescored exactly.
+        """
+        query = np.append(user, 1).astype(np.float32)
+        probe = top_k(self.centroids @ query, nprobe)
+        rows = np.concatenate(
+            [np.arange(self.offsets[j], self.offsets[j + 1]) for j in probe]
+        )
+        items = self.items[rows]
+        scores = self.vectors[rows].astype(np.float32) @ query
+        scores[np.isin(items, exclude)] = -np.inf
+        candidates = top_k(scores, k * RESCORE_FACTOR if rescore else k)
+        candidates = candidates[np.isfinite(scores[candidates])]
+        if rescore:
+            exact = rescore.embeddings[items[candidates]] @ user
+            exact += rescore.biases[items[candidates]]
+            candidates = candidates[top_k(exact, k)]
+        found: NDArray[np.int32] = items[candidates]
+        return found
+
+    def save(self, out_dir: Path) -> None:
+        """Writes the arrays to a sibling directory, then renames it into place."""
+        tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        for name in ("centroids", "offsets", "items", "vectors"):
+            np.save(tmp_dir / f"{name}.npy", getattr(self, name))
+        with open(tmp_dir / "meta.json", "w") as fout:
+            json.dump({"nlist": self.nlist, "items": len(self)}, fout, indent=2)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        tmp_dir.rename(out_dir)
+
+    @classmethod
+    def load(cls, in_dir: Path) -> "IvfIndex":
+        arrays = {
+            name: np.load(in_dir / f"{name}.npy", mmap_mode="r")
+            for name in ("centroids", "offsets", "items", "vectors")
+        }
+        return cls(**arrays)
+
+
+def brute_force(
+    factors: ItemFactors, user: NDArray[np.float32], k: int
+) -> NDArray[np.intp]:
+    return top_k(factors.score(user), k)
+
+
+def measure_recall(
+    index: IvfIndex,
+    factors: ItemFactors,
+    users: Sequence[NDArray[np.float32]],
+    k: int = 10,
+    nprobe: int = DEFAULT_NPROBE,
+    rescore: bool = True,
+) -> float:
+    """The mean fraction of the true top k, by brute force, that search finds."""
+    found = 0
+    for user in users:
+        approx = index.search(user, k, nprobe, rescore=factors if rescore else None)
+        found += len(np.intersect1d(approx, brute_force(factors, user, k)))
+    return found / (k * len(users)) if len(users) else 1.0
+
+
+@app.command()
+def build_ann(
+    ctx: typer.Context,
+    model_file: Path = LIGHTFM_MODEL_PKL,
+    nlist: int | None = typer.Option(None, help="Defaults to about 4 sqrt(movies)."),
+    nprobe: int = DEFAULT_NPROBE,
+    k: int = 10,
+    queries: int = typer.Option(1_000, help="Training users to measure recall with."),
+) -> None:
+    """Build the ANN index of a trained model, and report its recall@k."""
+    with open(model_file, "rb") as fin:
+        import_lightfm_silently()
+        model = pickle.load(fin)
+    factors = ItemFactors.from_model(model)
+    index = IvfIndex.build(factors, nlist)
+    index.save(ann_dir(model_file))
+
+    users = np.asarray(model.user_embeddings, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    sample = list(users[rng.choice(len(users), min(queries, len(users)), False)])
+    print(f"Saved a {index.nlist}-list index of {len(index)} movies")
+    for rescore in (False, True):
+        recall = measure_recall(index, factors, sample, k, nprobe, rescore)
+        print(f"recall@{k}, nprobe {nprobe}, rescore {rescore}: {recall:.3f}")
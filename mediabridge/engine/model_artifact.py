@@ -0,0 +1,234 @@
+"""
+The serving artifact of a trained model, shared by every process on a host.
+
+Unpickling the LightFM model gives each web worker a private copy of the
+embeddings. Instead, `mb export-model` writes them as .npy files, which
+serving processes memory-map, so that all of them read one page-cached copy.
+Each export is a new version directory under out/serving/:
+
+    current -> v20261018_120000_000000
+    v20261018_120000_000000/
+        manifest.json
+        user_embeddings.npy  user_biases.npy
+        item_embeddings.npy  item_biases.npy
+        user_ids.npy  movie_ids.npy  ann/
+
+The `current` symlink is swapped atomically once a version is complete, and
+ServingArtifact notices the swap and maps the new version, without a restart.
+Older versions are pruned, keeping the last few, and files still mapped by a
+lagging process remain readable after they are unlinked.
+"""
+
+import json
+import logging
+import os
+import pickle
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from pathlib import Path
+from time import monotonic
+from typing import Any
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+
+from mediabridge.data_processing.id_map import IdMaps
+from mediabridge.definitions import LIGHTFM_MODEL_PKL, OUTPUT_DIR
+from mediabridge.engine.ann import IvfIndex, ann_dir
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import SPLIT_DIR
+
+log = logging.getLogger(__name__)
+
+SERVING_DIR = OUTPUT_DIR / "serving"
+# Bumped whenever the layout of a version directory changes.
+MANIFEST_VERSION = 1
+KEEP_VERSIONS = 3
+REFRESH_SECONDS = 5.0
+
+_ARRAYS = ("user_embeddings", "user_biases", "item_embeddings", "item_biases")
+
+app = typer.Typer()
+
+
+@dataclass
+class ModelArtifact:
+    """A model's embeddings and biases, indexed by the dense ids of id_maps."""
+
+    version: str
+    user_embeddings: NDArray[np.float32]
+    user_biases: NDArray[np.float32]
+    item_embeddings: NDArray[np.float32]
+    item_biases: NDArray[np.float32]
+    id_maps: IdMaps | None = None
+    ann_index: IvfIndex | None = None
+
+    @cached_property
+    def item_factors(self) -> ItemFactors:
+        return ItemFactors(self.item_embeddings, self.item_biases)
+
+    @classmethod
+    def from_model(
+        cls, model: Any, id_maps: IdMaps | None = None, version: str = ""
+    ) -> "ModelArtifact":
+        """Assumes a model trained without features, one row per user and movie."""
+        return cls(
+            version=version,
+            user_embeddings=np.asarray(model.user_embeddings, dtype=np.float32),
+            user_biases=np.asarray(model.user_biases, dtype=np.float32),
+            item_embeddings=np.asarray(model.item_embeddings, dtype=np.float32),
+            item_biases=np.asarray(model.item_biases, dtype=np.float32),
+            id_maps=id_maps,
+        )
+
+    def save(self, out_dir: Path) -> None:
+        """Writes a version directory. The manifest is written last."""
+        out_dir.mkdir(parents=True)
+        for name in _ARRAYS:
+            np.save(out_dir / f"{name}.npy", getattr(self, name))
+        if self.id_maps:
+            self.id_maps.save(out_dir)
+        if self.ann_index is not None:
+            self.ann_index.save(out_dir / "ann")
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "model_version": self.version,
+            "users": len(self.user_biases),
+            "movies": len(self.item_biases),
+            "components": self.item_embeddings.shape[1],
+            "arrays": [f"{name}.npy" for name in _ARRAYS],
+        }
+        with open(out_dir / "manifest.json", "w") as fout:
+            json.dump(manifest, fout, indent=2)
+
+    @classmethod
+    def load(cls, in_dir: Path) -> "ModelArtifact":
+        """Memory-maps a version directory. Its arrays are read-only."""
+        with open(in_dir / "manifest.json") as fin:
+            manifest = json.load(fin)
+        assert manifest["version"] == MANIFEST_VERSION, manifest
+        arrays = {
+            name: np.load(in_dir / f"{name}.npy", mmap_mode="r") for name in _ARRAYS
+        }
+        assert len(arrays["item_biases"]) == manifest["movies"], in_dir
+        has_id_maps = (in_dir / "movie_ids.npy").exists()
+        return cls(
+            version=manifest["model_version"],
+            id_maps=IdMaps.load(in_dir) if has_id_maps else None,
+            ann_index=IvfIndex.load(in_dir / "ann")
+            if (in_dir / "ann").exists()
+            else None,
+            **arrays,
+        )
+
+
+def current_link(serving_dir: Path = SERVING_DIR) -> Path:
+    return serving_dir / "current"
+
+
+def saved_ann_index(model_file: Path, num_movies: int) -> IvfIndex | None:
+    """The index saved next to a model file, unless it is older, or of other movies."""
+    index_dir = ann_dir(model_file)
+    if not index_dir.exists() or index_dir.stat().st_mtime < model_file.stat().st_mtime:
+        return None
+    index = IvfIndex.load(index_dir)
+    return index if len(index) == num_movies else None
+
+
+def export_model(
+    model: Any,
+    id_maps: IdMaps,
+    serving_dir: Path = SERVING_DIR,
+    keep: int = KEEP_VERSIONS,
+    ann_index: IvfIndex | None = None,
+) -> Path:
+    """Saves a new version, with an ANN index, and makes it current.
+
+    The model's index is built, unless one is given.
+    Returns the version directory. Only the newest `keep` versions are kept.
+    """
+    version = datetime.now().strftime("v%Y%m%d_%H%M%S_%f")
+    artifact = ModelArtifact.from_model(model, id_maps, version)
+    assert id_maps.shape == (len(artifact.user_biases), len(artifact.item_biases))
+    if ann_index is None:
+        ann_index = IvfIndex.build(artifact.item_factors)
+    assert len(ann_index) == len(artifact.item_biases), len(ann_index)
+    artifact.ann_index = ann_index
+
+    tmp_dir = serving_dir / f".{version}.tmp"
+    artifact.save(tmp_dir)
+    version_dir = serving_dir / version
+    tmp_dir.rename(version_dir)
+
+    # rename() of a symlink over another is atomic, so readers see either.
+    tmp_link = serving_dir / ".current.tmp"
+    tmp_link.unlink(missing_ok=True)
+    tmp_link.symlink_to(version)
+    tmp_link.replace(current_link(serving_dir))
+    log.info(f"Serving {version_dir}")
+
+    versions = sorted(p for p in serving_dir.glob("v*") if p.is_dir())
+    for old_dir in versions[:-keep]:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return version_dir
+
+
+class ServingArtifact:
+    """The current version of a serving directory, remapped when it changes.
+
+    At most every refresh_seconds, `get()` reads the `current` symlink, which is
+    a single syscall. Callers should get() once per request, so that a request
+    never mixes the arrays of two versions. A version that fails to load is
+    logged, and retried at the next refresh, while the old one keeps serving.
+    """
+
+    def __init__(
+        self, serving_dir: Path = SERVING_DIR, refresh_seconds: float = REFRESH_SECONDS
+    ) -> None:
+        self.serving_dir = serving_dir
+        self.refresh_seconds = refresh_seconds
+        self._target = os.readlink(current_link(serving_dir))
+        self._artifact = ModelArtifact.load(serving_dir / self._target)
+        self._checked_at = monotonic()
+
+    def get(self) -> ModelArtifact:
+        if monotonic() - self._checked_at >= self.refresh_seconds:
+            self._checked_at = monotonic()
+            try:
+                self._swap_if_changed()
+            except Exception:
+                log.exception(f"Still serving model {self._artifact.version}")
+        return self._artifact
+
+    def _swap_if_changed(self) -> None:
+        target = os.readlink(current_link(self.serving_dir))
+        if target != self._target:
+            # Assigned last, so concurrent readers see the old or the new.
+            artifact = ModelArtifact.load(self.serving_dir / target)
+            self._target, self._artifact = target, artifact
+            log.info(f"Swapped in model {artifact.version}")
+
+
+@app.command("export-model")
+def export_model_command(
+    ctx: typer.Context,
+    model_file: Path = LIGHTFM_MODEL_PKL,
+    id_map_dir: Path = typer.Option(
+        SPLIT_DIR / "train", help="The id maps the model was trained with."
+    ),
+    serving_dir: Path = SERVING_DIR,
+    keep: int = typer.Option(KEEP_VERSIONS, help="Older versions are deleted."),
+) -> None:
+    """Export a trained model for serving, swapping it in for running servers."""
+    with open(model_file, "rb") as fin:
+        import_lightfm_silently()
+        model = pickle.load(fin)
+    index = saved_ann_index(model_file, len(model.item_biases))
+    version_dir = export_model(
+        model, IdMaps.load(id_map_dir), serving_dir, keep, ann_index=index
+    )
+    print(f"Exported {model_file} to {version_dir}")
@@ -1,63 +1,267 @@
+import logging
 import pickle
+from collections.abc import Sequence
+from functools import cached_property
 from pathlib import Path
+from typing import Any
 
 import numpy as np
 from beartype import beartype
 from numpy.typing import NDArray
+from pymongo.database import Database
 from scipy.sparse import coo_matrix
 
+from mediabridge.data_processing.id_map import IdMap, IdMaps, load_id_maps
 from mediabridge.db.connect import connect_to_mongo
+from mediabridge.engine.ann import IvfIndex, ann_dir, top_k
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.engine.model_artifact import (
+    ModelArtifact,
+    ServingArtifact,
+    saved_ann_index,
+)
+from mediabridge.engine.result_cache import ResultCache, cache_key, set_digest
+from mediabridge.engine.title_index import TitleIndex
 from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.recommend_batch import top_k_rows
+
+log = logging.getLogger(__name__)
 
 
 @beartype
 class RecommendationEngine:
-    def __init__(self, movie_ids: list[str], model_file: Path) -> None:
+    """Recommends from a pickled model, or from a serving directory.
+
+    A serving directory, see model_artifact.py, is memory-mapped and shared by
+    all processes, and a newly exported model version is swapped in live.
+    """
+
+    def __init__(
+        self,
+        movie_ids: list[str],
+        model_file: Path,
+        id_maps: IdMaps | None = None,
+        cache: ResultCache | None = None,
+    ) -> None:
         self.movie_ids = movie_ids
-        self.db = connect_to_mongo()
-        with open(model_file, "rb") as f:
-            import_lightfm_silently()
-            self.model = pickle.load(f)
+        self.cache = cache
+        # Computed once, as it is part of every cache key.
+        self._candidates_digest: str = set_digest(movie_ids)
+        self._id_maps = id_maps
+        self.model_file = model_file
+        self._serving: ServingArtifact | None = None
+        if model_file.is_dir():
+            self._serving = ServingArtifact(model_file)
+        else:
+            with open(model_file, "rb") as f:
+                import_lightfm_silently()
+                model = pickle.load(f)
+            version = f"{model_file.name}@{model_file.stat().st_mtime_ns}"
+            self._artifact = ModelArtifact.from_model(model, id_maps, version)
+            # The index that `mb build-ann` saved next to the model, if current.
+            index = saved_ann_index(model_file, len(self._artifact.item_factors))
+            if index is None and ann_dir(model_file).exists():
+                log.warning(f"Ignoring {ann_dir(model_file)}, it is stale")
+            self._artifact.ann_index = index
+
+    @property
+    def artifact(self) -> ModelArtifact:
+        """The model being served. Fetch it once per request, as it may change."""
+        return self._serving.get() if self._serving else self._artifact
+
+    @cached_property
+    def _loaded_id_maps(self) -> IdMaps:
+        return load_id_maps()
+
+    def _movie_map(self, artifact: ModelArtifact) -> IdMap:
+        return (artifact.id_maps or self._loaded_id_maps).movies
+
+    @property
+    def movie_map(self) -> IdMap:
+        """Maps netflix IDs to the model's dense movie indexes."""
+        return self._movie_map(self.artifact)
+
+    @property
+    def item_factors(self) -> ItemFactors:
+        return self.artifact.item_factors
+
+    @property
+    def ann_index(self) -> IvfIndex | None:
+        return self.artifact.ann_index
+
+    def _candidates(self, movie_map: IdMap) -> NDArray[np.int32]:
+        """Dense indexes of the movies we may recommend; all of them by default."""
+        if not self.movie_ids:
+            return np.arange(len(movie_map), dtype=np.int32)
+        cols = movie_map.to_dense(list(map(int, self.movie_ids)))
+        candidates: NDArray[np.int32] = cols[cols >= 0]
+        return candidates
+
+    @cached_property
+    def db(self) -> Database[Any]:
+        """Connected on first use, so that scoring alone needs no MONGODB_URI."""
+        db: Database[Any] = connect_to_mongo()
+        return db
+
+    @cached_property
+    def title_index(self) -> TitleIndex:
+        """Loaded on first use, with a single query of the movies collection."""
+        return TitleIndex(self.db["movies"])
 
     def get_movie_id(self, title: str) -> str:
-        movies = self.db["movies"]
-        movie = movies.find_one({"title": title})
-        assert movie, title
-        return f"{movie.get('netflix_id')}"
+        netflix_ids: list[str | None] = self.title_index.ids([title])
+        netflix_id = netflix_ids[0]
+        if netflix_id is None:
+            raise KeyError(title)
+        return netflix_id
 
     def get_movie_title(self, netflix_id: str) -> str:
-        movies = self.db["movies"]
-        movie = movies.find_one({"netflix_id": f"{netflix_id}"})
-        if movie:
-            return f"{movie.get('title')}"
-        else:
-            return f"no title for {netflix_id=}"
+        titles: list[str | None] = self.title_index.titles([netflix_id])
+        return titles[0] or f"no title for {netflix_id=}"
 
     def titles_to_ids(self, titles: list[str]) -> list[str]:
-        netflix_ids = []
-        for title in titles:
-            netflix_id = self.get_movie_id(title)
-            netflix_ids.append(netflix_id)
-        return netflix_ids
+        """Maps titles to netflix IDs, skipping any unknown title."""
+        netflix_ids = self.title_index.ids(titles)
+        for title, netflix_id in zip(titles, netflix_ids):
+            if netflix_id is None:
+                log.warning(f"No movie is titled {title!r}")
+        return [i for i in netflix_ids if i is not None]
 
     def ids_to_titles(self, netflix_ids: list[str]) -> list[str]:
-        titles = []
-        for netflix_id in netflix_ids:
-            title = self.get_movie_title(netflix_id)
-            titles.append(title)
-        return titles
+        titles = self.title_index.titles(netflix_ids)
+        return [
+            t or f"no title for netflix_id={i!r}" for i, t in zip(netflix_ids, titles)
+        ]
 
     def get_recommendations(
         self,
         user_id: int,
         user_interactions: coo_matrix,
     ) -> NDArray[np.int_]:
-        scores = self.model.predict(
-            user_ids=user_id,
-            item_ids=self.movie_ids,
-            user_features=user_interactions,
+        """Ranks self.movie_ids for a trained user, their rated movies last."""
+        artifact = self.artifact
+        cols = self._movie_map(artifact).to_dense(list(map(int, self.movie_ids)))
+        scores = artifact.item_factors.score(artifact.user_embeddings[user_id])
+        scores[user_interactions.col] = -np.inf
+        ranked = np.where(cols >= 0, scores[cols], -np.inf)
+        return np.argsort(-ranked, kind="stable")
+
+    def recommend_new_user(
+        self,
+        liked_movies_ids: list[int],
+        limit: int = 10,
+        disliked_movies_ids: Sequence[int] = (),
+        exact: bool = False,
+    ) -> list[int]:
+        """Returns netflix IDs, best first, for a user unknown to the model.
+
+        The user is folded in from the movies they rated, with no refit.
+        Rated movies are never recommended. Unless exact, candidates come
+        from the ANN index, when there is one and every movie is a candidate.
+        Results are cached, if the engine has a cache, per model version.
+        """
+        artifact = self.artifact
+        if self.cache is None:
+            return self._recommend_new_user(
+                artifact, liked_movies_ids, limit, disliked_movies_ids, exact
+            )
+        key = self._cache_key(liked_movies_ids, disliked_movies_ids, limit, exact)
+        recommended: list[int] | None = self.cache.get(artifact.version, key)
+        if recommended is None:
+            recommended = self._recommend_new_user(
+                artifact, liked_movies_ids, limit, disliked_movies_ids, exact
+            )
+            self.cache.put(artifact.version, key, recommended)
+        return recommended
+
+    def _cache_key(
+        self, liked: Sequence[int], disliked: Sequence[int], limit: int, exact: bool
+    ) -> str:
+        key: str = cache_key(
+            liked, disliked, limit, exact=exact, candidates=self._candidates_digest
         )
-        return np.argsort(-scores)
+        return key
+
+    def recommend_new_users(
+        self,
+        liked_movies_ids: Sequence[Sequence[int]],
+        limit: int = 10,
+        disliked_movies_ids: Sequence[Sequence[int]] | None = None,
+    ) -> list[list[int]]:
+        """Like recommend_new_user(exact=True), for many users at once.
+
+        The users are folded in by one batched solve, and scored by one matrix
+        multiply, which is far cheaper than scoring them one at a time.
+        """
+        artifact = self.artifact
+        disliked_movies_ids = disliked_movies_ids or [()] * len(liked_movies_ids)
+        seeds = list(zip(liked_movies_ids, disliked_movies_ids))
+        found: list[list[int] | None] = [None] * len(seeds)
+        keys: list[str] = []
+        if self.cache is not None:
+            keys = [self._cache_key(up, down, limit, True) for up, down in seeds]
+            found = [self.cache.get(artifact.version, key) for key in keys]
+        todo = [i for i, f in enumerate(found) if f is None]
+        if todo:
+            scored = self._score_new_users(artifact, [seeds[i] for i in todo], limit)
+            for i, recommended in zip(todo, scored):
+                found[i] = recommended
+                if self.cache is not None:
+                    self.cache.put(artifact.version, keys[i], recommended)
+        return [f or [] for f in found]
+
+    def _score_new_users(
+        self,
+        artifact: ModelArtifact,
+        seeds: list[tuple[Sequence[int], Sequence[int]]],
+        limit: int,
+    ) -> list[list[int]]:
+        movie_map = self._movie_map(artifact)
+        factors = artifact.item_factors
+        rated = []
+        for up, down in seeds:
+            liked, disliked = movie_map.to_dense(up), movie_map.to_dense(down)
+            rated.append((liked[liked >= 0], disliked[disliked >= 0]))
+        users = factors.fold_in_many(*zip(*rated))
+        scores = users @ factors.embeddings.T + factors.biases
+        for row, (liked, disliked) in enumerate(rated):
+            scores[row, liked] = scores[row, disliked] = -np.inf
+        if self.movie_ids:
+            excluded = np.ones(len(movie_map), dtype=bool)
+            excluded[self._candidates(movie_map)] = False
+            scores[:, excluded] = -np.inf
+        top, top_scores = top_k_rows(scores, limit)
+        return [
+            list(map(int, movie_map.to_raw(t[np.isfinite(s)])))
+            for t, s in zip(top, top_scores)
+        ]
+
+    def _recommend_new_user(
+        self,
+        artifact: ModelArtifact,
+        liked_movies_ids: Sequence[int],
+        limit: int,
+        disliked_movies_ids: Sequence[int],
+        exact: bool,
+    ) -> list[int]:
+        movie_map = self._movie_map(artifact)
+        factors = artifact.item_factors
+        liked = movie_map.to_dense(liked_movies_ids)
+        disliked = movie_map.to_dense(disliked_movies_ids)
+        liked, disliked = liked[liked >= 0], disliked[disliked >= 0]
+        user = factors.fold_in(liked, disliked)
+        rated = np.concatenate([liked, disliked])
+        if not exact and not self.movie_ids and artifact.ann_index is not None:
+            ranked = artifact.ann_index.search(
+                user, limit, exclude=rated, rescore=factors
+            )
+        else:
+            scores = factors.score(user)
+            scores[rated] = -np.inf
+            candidates = self._candidates(movie_map)
+            ranked = candidates[top_k(scores[candidates], limit)]
+            ranked = ranked[np.isfinite(scores[ranked])]
+        return list(map(int, movie_map.to_raw(ranked)))
 
     def get_data(self) -> list[str]:
         print("Enter liked movies: ")
@@ -70,17 +274,13 @@ class RecommendationEngine:
             print(title)
 
     def create_user_matrix(self, liked_movies_ids: list[int]) -> coo_matrix:
-        rows = [0] * len(liked_movies_ids)
-        cols = liked_movies_ids
-        data = [1] * len(liked_movies_ids)
-        return coo_matrix((data, (rows, cols)))
+        cols = self.movie_map.to_dense(liked_movies_ids)
+        cols = cols[cols >= 0]
+        rows = np.zeros(len(cols), dtype=np.int32)
+        data = np.ones(len(cols), dtype=np.int8)
+        return coo_matrix((data, (rows, cols)), shape=(1, len(self.movie_map)))
 
-    def recommend(self, user_id: int, limit: int = 10) -> set[int]:
+    def recommend(self, limit: int = 10) -> set[int]:
         liked_movies = self.get_data()
         liked_movies_ids = list(map(int, self.titles_to_ids(liked_movies)))
-        user_interactions = self.create_user_matrix(liked_movies_ids)
-        print(f"{user_interactions=}")
-        print(f"{user_interactions.shape=}")
-
-        recommendations = self.get_recommendations(user_id, user_interactions)[:limit]
-        return set(map(int, recommendations))
+        return set(self.recommend_new_user(liked_movies_ids, limit))
@@ -0,0 +1,176 @@
+"""
+Caches recommendations, as popular seed sets are requested over and over.
+
+Entries are keyed by the canonical seed set, i.e. the sorted, distinct liked
+and disliked netflix IDs, along with the limit and any other options, and they
+are stored under the version of the model that computed them. Once a new model
+version is deployed, entries of older versions are never returned, and are
+purged as soon as the new version is first seen.
+
+The first tier is an in-process LRU dict. An optional second tier, in a
+SQLite file, is shared by the processes on a host and survives restarts. Its
+entries expire after ttl_seconds, and it is trimmed to max_rows, oldest first.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+from time import time
+
+from mediabridge.definitions import OUTPUT_DIR
+
+log = logging.getLogger(__name__)
+
+CACHE_DB_FILE = OUTPUT_DIR / "recommendation_cache.sqlite"
+MAX_ENTRIES = 10_000
+TTL_SECONDS = 24 * 60 * 60.0
+MAX_ROWS = 1_000_000
+# The persistent tier is trimmed after every this many puts.
+EVICT_EVERY = 1_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendation (
+    key TEXT PRIMARY KEY,
+    model_version TEXT NOT NULL,
+    movie_ids TEXT NOT NULL,
+    created REAL NOT NULL
+)
+"""
+
+
+def cache_key(
+    liked: Sequence[int],
+    disliked: Sequence[int] = (),
+    limit: int = 10,
+    **options: object,
+) -> str:
+    """A digest of the canonical seed set, the limit and any options."""
+    canonical = {
+        "liked": sorted(set(map(int, liked))),
+        "disliked": sorted(set(map(int, disliked))),
+        "limit": limit,
+        **options,
+    }
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def set_digest(ids: Iterable[int | str]) -> str:
+    """A digest of a set of IDs, e.g. to stand for it in cache_key() options."""
+    text = ",".join(sorted(set(map(str, ids))))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """Ranked netflix IDs, by cache_key() and model version. Thread safe."""
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        db_file: Path | None = None,
+        ttl_seconds: float = TTL_SECONDS,
+        max_rows: int = MAX_ROWS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.hits = self.misses = 0
+        self._lru: OrderedDict[str, list[int]] = OrderedDict()
+        self._version = ""
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        if db_file:
+            db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(db_file, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute(_SCHEMA)
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def _use_version(self, version: str) -> None:
+        """Drops the entries of other model versions. Caller holds the lock."""
+        if self._version:
+            log.info(f"Model {version} deployed, dropping cached results")
+        self._lru.clear()
+        self._version = version
+        if self._conn:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM recommendation WHERE model_version != ?", (version,)
+                )
+
+    def get(self, version: str, key: str) -> list[int] | None:
+        with self._lock:
+            if version != self._version:
+                self._use_version(version)
+            elif key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return list(self._lru[key])
+            if self._conn:
+                row = self._conn.execute(
+                    "SELECT movie_ids FROM recommendation"
+                    " WHERE key = ? AND model_version = ? AND created > ?",
+                    (key, version, time() - self.ttl_seconds),
+                ).fetchone()
+                if row:
+                    self.hits += 1
+                    movie_ids: list[int] = json.loads(row[0])
+                    self._remember(key, movie_ids)
+                    return list(movie_ids)
+            self.misses += 1
+            return None
+
+    def _remember(self, key: str, movie_ids: list[int]) -> None:
+        self._lru[key] = movie_ids
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def put(self, version: str, key: str, movie_ids: list[int]) -> None:
+        with self._lock:
+            if version != self._version:
+                self._use_version(version)
+            self._remember(key, list(movie_ids))
+            if self._conn:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO recommendation VALUES (?, ?, ?, ?)",
+                        (key, version, json.dumps(movie_ids), time()),
+                    )
+                self._puts += 1
+                if self._puts % EVICT_EVERY == 0:
+                    self._evict()
+
+    def evict(self) -> None:
+        """Deletes expired rows, then the oldest ones beyond max_rows."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        if not self._conn:
+            return
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM recommendation WHERE created <= ?",
+                (time() - self.ttl_seconds,),
+            )
+            self._conn.execute(
+                "DELETE FROM recommendation WHERE key IN"
+                " (SELECT key FROM recommendation ORDER BY created DESC"
+                "  LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,107 @@
+"""
+An in-memory netflix_id <-> title index of the Mongo movies collection.
+
+The collection holds 17,770 movies, so the whole mapping is read in one query
+and then served from dicts, in microseconds, instead of a find_one() round
+trip per movie. IDs or titles missing from the index are looked up with a
+single $in query per batch, and remembered if not found there either.
+
+At most every REFRESH_SECONDS, the document count is checked, and the index
+is reloaded if it changed. That catches added and deleted movies quickly, but
+not a title edited in place, so the index is also reloaded once it is
+MAX_AGE_SECONDS old. The remembered misses are forgotten at every check, and
+also whenever there are more than MAX_UNKNOWN of them, e.g. from requests for
+made-up IDs.
+"""
+
+import logging
+from collections.abc import Iterable, Sequence
+from time import monotonic
+from typing import Any
+
+from pymongo.collection import Collection
+
+log = logging.getLogger(__name__)
+
+REFRESH_SECONDS = 60.0
+MAX_AGE_SECONDS = 600.0
+MAX_UNKNOWN = 10_000
+
+_PROJECTION = {"_id": 0, "netflix_id": 1, "title": 1}
+
+
+class TitleIndex:
+    def __init__(
+        self,
+        movies: Collection[Any],
+        refresh_seconds: float = REFRESH_SECONDS,
+        max_age_seconds: float = MAX_AGE_SECONDS,
+    ) -> None:
+        self.movies = movies
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self._title_of: dict[str, str] = {}
+        self._id_of: dict[str, str] = {}
+        self._unknown_ids: set[str] = set()
+        self._unknown_titles: set[str] = set()
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._title_of)
+
+    def _add(self, docs: Iterable[dict[str, Any]]) -> None:
+        for doc in docs:
+            netflix_id, title = str(doc["netflix_id"]), str(doc["title"])
+            self._title_of[netflix_id] = title
+            # Titles can repeat, e.g. remakes. As with find_one(), the first wins.
+            self._id_of.setdefault(title, netflix_id)
+
+    def reload(self) -> None:
+        self._title_of.clear()
+        self._id_of.clear()
+        self._unknown_ids.clear()
+        self._unknown_titles.clear()
+        self._count = self.movies.estimated_document_count()
+        self._add(self.movies.find({}, _PROJECTION))
+        self._loaded_at = self._checked_at = monotonic()
+        log.info(f"Indexed {len(self):_} movie titles")
+
+    def _refresh_if_changed(self) -> None:
+        now = monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = now
+        if (
+            now - self._loaded_at >= self.max_age_seconds
+            or self.movies.estimated_document_count() != self._count
+        ):
+            self.reload()
+        else:
+            self._unknown_ids.clear()
+            self._unknown_titles.clear()
+
+    @staticmethod
+    def _remember(unknown: set[str], missing: set[str]) -> None:
+        if len(unknown) + len(missing) > MAX_UNKNOWN:
+            unknown.clear()
+        unknown |= missing
+
+    def titles(self, netflix_ids: Sequence[str]) -> list[str | None]:
+        """Maps netflix IDs to titles, or to None if unknown."""
+        self._refresh_if_changed()
+        missing = set(netflix_ids) - self._title_of.keys() - self._unknown_ids
+        if missing:
+            query = {"netflix_id": {"$in": sorted(missing)}}
+            self._add(self.movies.find(query, _PROJECTION))
+            self._remember(self._unknown_ids, missing - self._title_of.keys())
+        return [self._title_of.get(i) for i in netflix_ids]
+
+    def ids(self, titles: Sequence[str]) -> list[str | None]:
+        """Maps exact titles to netflix IDs, or to None if unknown."""
+        self._refresh_if_changed()
+        missing = set(titles) - self._id_of.keys() - self._unknown_titles
+        if missing:
+            query = {"title": {"$in": sorted(missing)}}
+            self._add(self.movies.find(query, _PROJECTION))
+            self._remember(self._unknown_titles, missing - self._id_of.keys())
+        return [self._id_of.get(t) for t in titles]
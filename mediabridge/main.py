@@ -1,4 +1,5 @@
 import logging
+import os
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -8,8 +9,18 @@ import typer as typer
 
 from mediabridge.api import app as api_main
 from mediabridge.data_download import clean_all, download_file, download_netflix_dataset
-from mediabridge.data_processing import etl, interaction_matrix, wiki_to_netflix
+from mediabridge.data_processing import (
+    etl,
+    etl_bench,
+    interaction_matrix,
+    parquet,
+    rating_store,
+    synthetic,
+    wiki_to_netflix,
+)
 from mediabridge.data_processing.etl import etl_movie_title
+from mediabridge.data_processing.sampling import Sample, SampleBy
+from mediabridge.db import migrate
 from mediabridge.db.load import load_from_sql
 from mediabridge.db.tables import create_tables
 from mediabridge.definitions import (
@@ -19,8 +30,16 @@ from mediabridge.definitions import (
     OUTPUT_DIR,
     PROJECT_DIR,
 )
+from mediabridge.engine import ann, model_artifact
 from mediabridge.integrations.ollama_api import generate_prompt_response
-from mediabridge.recommender import make_recommendation
+from mediabridge.recommender import (
+    evaluate,
+    make_recommendation,
+    recommend_batch,
+    split,
+    sweep,
+    train_model,
+)
 from mediabridge.recommender.tf_idf import (
     create_dataframe,
     recommend_multiple_items,
@@ -32,6 +51,18 @@ app.add_typer(wiki_to_netflix.app)
 app.add_typer(make_recommendation.app)
 app.add_typer(api_main.typer_app)
 app.add_typer(interaction_matrix.app)
+app.add_typer(rating_store.app)
+app.add_typer(parquet.app)
+app.add_typer(migrate.app)
+app.add_typer(synthetic.app)
+app.add_typer(etl_bench.app)
+app.add_typer(split.app)
+app.add_typer(train_model.app)
+app.add_typer(sweep.app)
+app.add_typer(ann.app)
+app.add_typer(model_artifact.app)
+app.add_typer(recommend_batch.app)
+app.add_typer(evaluate.app)
 
 
 @dataclass
@@ -97,14 +128,47 @@ def init(
 
 
 @app.command()
-def load(max_reviews: int = 101_000_000, regen: bool = False) -> None:
-    """Load all dataset data into the databases for processing"""
-    if regen:
+def load(
+    max_reviews: int = 101_000_000,
+    regen: bool = False,
+    movie: list[int] = typer.Option(
+        [], help="Reload this movie's ratings, instead of regenerating ALL. Repeatable."
+    ),
+    workers: int = typer.Option(
+        os.cpu_count() or 1, help="Number of processes parsing the training_set files."
+    ),
+    sample_users: float | None = typer.Option(
+        None,
+        help="Load only this fraction of users, e.g. 0.01, with all their ratings.",
+    ),
+    sample_movies: float | None = typer.Option(
+        None, help="Load only this fraction of movies, with all their ratings."
+    ),
+    sample_seed: int = typer.Option(0, help="Picks which users or movies to sample."),
+) -> None:
+    """Load new or changed dataset data into the databases for processing"""
+    if sample_users is not None and sample_movies is not None:
+        raise typer.BadParameter("Sample either users or movies, not both.")
+    sample = None
+    try:
+        if sample_users is not None:
+            sample = Sample(SampleBy.user, sample_users, sample_seed)
+        elif sample_movies is not None:
+            sample = Sample(SampleBy.movie, sample_movies, sample_seed)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    if regen and not movie:
         prompt = "\n! Are you sure you want to delete ALL existing sqlite data? y/n !\n"
         if input(prompt) != "y":
             print("\nAborting process.")
             return
-    etl.etl(max_reviews=max_reviews, regen=regen)
+    etl.etl(
+        max_reviews=max_reviews,
+        regen=regen and not movie,
+        workers=workers,
+        movie_ids=movie,
+        sample=sample,
+    )
 
 
 @app.command()
@@ -0,0 +1,8 @@
+"""Resource usage figures, for benchmark and evaluation reports."""
+
+import resource
+
+
+def max_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """The peak resident set size, in MiB, of this process or its children."""
+    return resource.getrusage(who).ru_maxrss / 1024  # ru_maxrss is in KiB
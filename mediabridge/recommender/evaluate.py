@@ -0,0 +1,193 @@
+"""
+Evaluates a trained model offline, against the held out ratings of `mb split`.
+
+For each test user with at least one liked held out movie, the model ranks
+every movie the user did not train on, and we score:
+
+  precision@k  the fraction of the top k that the user liked.
+  recall@k     the fraction of the user's liked movies found in the top k.
+  AUC          the chance a liked movie outranks a random other movie.
+  coverage     the fraction of all movies in anyone's top k.
+
+Test users are evaluated in chunks across processes, optionally just a sample
+of them. Each run writes a JSON report, with its wall-clock time and memory,
+to out/eval/, so runs can be compared.
+"""
+
+import json
+import logging
+import os
+import pickle
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+
+from mediabridge.data_processing.id_map import IdMaps
+from mediabridge.data_processing.interaction_matrix import load_csr
+from mediabridge.data_processing.sampling import Sample, SampleBy, hash32
+from mediabridge.definitions import LIGHTFM_MODEL_PKL, OUTPUT_DIR
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.profiling import max_rss_mb
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.recommend_batch import score_unrated, top_k_rows
+from mediabridge.recommender.split import SPLIT_DIR
+
+log = logging.getLogger(__name__)
+
+EVAL_DIR = OUTPUT_DIR / "eval"
+CHUNK_USERS = 1_024
+# Rehashes user IDs before sampling. The split chose its test users by the
+# same hash, so sampling the raw IDs would pick a nested subset of them.
+SAMPLE_SALT = 0x65766131
+
+app = typer.Typer()
+
+
+@dataclass
+class Metrics:
+    users: int
+    precision: float
+    recall: float
+    auc: float
+    coverage: float
+
+
+@dataclass
+class _Sums:
+    """A chunk's per-user metrics, summed, and the movies it recommended."""
+
+    users: int
+    precision: float
+    recall: float
+    auc: float
+    recommended: NDArray[np.intp]
+
+
+def _auc(scores: NDArray[np.float32], liked: NDArray[np.bool_]) -> float:
+    """Of each (liked, other) pair of unrated movies, how often liked scores higher."""
+    unrated = np.isfinite(scores)
+    others = np.sort(scores[unrated & ~liked])
+    if not len(others):
+        return 1.0
+    below = np.searchsorted(others, scores[liked & unrated], side="left")
+    return float(below.mean() / len(others))
+
+
+# Each worker process loads the model and maps the matrices once.
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(model_file: Path, split_dir: Path) -> None:
+    with open(model_file, "rb") as fin:
+        import_lightfm_silently()
+        model = pickle.load(fin)
+    _worker["users"] = np.asarray(model.user_embeddings, dtype=np.float32)
+    _worker["factors"] = ItemFactors.from_model(model)
+    _worker["train"] = load_csr(split_dir / "train")
+    _worker["test"] = load_csr(split_dir / "test")
+
+
+def _evaluate_chunk(rows: NDArray[np.intp], k: int) -> _Sums:
+    scores = score_unrated(
+        _worker["users"][rows], _worker["factors"], _worker["train"][rows]
+    )
+    liked = _worker["test"][rows].toarray() > 0
+    top, _ = top_k_rows(scores, k)
+    hits = np.take_along_axis(liked, top, axis=1).sum(axis=1)
+    return _Sums(
+        users=len(rows),
+        precision=float((hits / k).sum()),
+        recall=float((hits / liked.sum(axis=1)).sum()),
+        auc=sum(_auc(s, m) for s, m in zip(scores, liked)),
+        recommended=np.unique(top),
+    )
+
+
+def evaluate(
+    model_file: Path = LIGHTFM_MODEL_PKL,
+    split_dir: Path = SPLIT_DIR,
+    k: int = 10,
+    sample: Sample | None = None,
+    workers: int = 1,
+    chunk_users: int = CHUNK_USERS,
+) -> Metrics:
+    """Averages each metric over the (sampled) test users with a liked movie."""
+    test = load_csr(split_dir / "test")
+    rows = np.flatnonzero((test > 0).getnnz(axis=1))
+    if sample:
+        user_ids = IdMaps.load(split_dir / "test").users.to_raw(rows)
+        rows = rows[sample.keep(hash32(user_ids, SAMPLE_SALT))]
+    chunks = [rows[i : i + chunk_users] for i in range(0, len(rows), chunk_users)]
+    log.info(f"Evaluating {len(rows):_} users, in {len(chunks)} chunks")
+
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(model_file, split_dir)
+    ) as pool:
+        sums = list(pool.map(_evaluate_chunk, chunks, [k] * len(chunks)))
+    num_users = sum(s.users for s in sums)
+    recommended = np.unique(
+        np.concatenate([s.recommended for s in sums] or [np.empty(0, np.intp)])
+    )
+    return Metrics(
+        users=num_users,
+        precision=sum(s.precision for s in sums) / max(1, num_users),
+        recall=sum(s.recall for s in sums) / max(1, num_users),
+        auc=sum(s.auc for s in sums) / max(1, num_users),
+        coverage=len(recommended) / test.shape[1],
+    )
+
+
+@app.command("evaluate")
+def evaluate_command(
+    ctx: typer.Context,
+    model_file: Path = LIGHTFM_MODEL_PKL,
+    split_dir: Path = typer.Option(SPLIT_DIR, help="Where `mb split` saved to."),
+    k: int = 10,
+    sample_users: float | None = typer.Option(
+        None, help="Evaluate just this fraction of the test users."
+    ),
+    seed: int = 0,
+    workers: int = typer.Option(os.cpu_count() or 1, help="Parallel processes."),
+) -> None:
+    """Score a trained model on held out ratings, saving a report to out/eval/."""
+    try:
+        sample = (
+            Sample(SampleBy.user, sample_users, seed)
+            if sample_users is not None
+            else None
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    t0 = perf_counter()
+    metrics = evaluate(model_file, split_dir, k, sample, workers)
+    report = {
+        "model_file": str(model_file),
+        "split_dir": str(split_dir),
+        "k": k,
+        "sample_users": sample_users,
+        "seed": seed,
+        "workers": workers,
+        "metrics": asdict(metrics),
+        "seconds": perf_counter() - t0,
+        "max_rss_mb": max_rss_mb(resource.RUSAGE_SELF),
+        "child_max_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    print(
+        f"{metrics.users:_} users: precision@{k} {metrics.precision:.5f},"
+        f" recall@{k} {metrics.recall:.5f}, AUC {metrics.auc:.5f},"
+        f" coverage {metrics.coverage:.4f}, in {report['seconds']:.1f} s"
+    )
+
+    EVAL_DIR.mkdir(parents=True, exist_ok=True)
+    out_file = EVAL_DIR / f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_file, "w") as fout:
+        json.dump(report, fout, indent=2)
+    print(f"Report saved to {out_file}")
@@ -16,6 +16,8 @@ Several design decisions should definitely be revisited:
      being sorted by genre is not a solid assumption. Similarly for popularity or year.
      So we need a better way of identifying the hidden movies that the model
      should be blinded to during initial training.
+     PARTIAL: split.py holds out ratings of many test users, by random
+     fraction, by date, or by movie set. Here it still serves a single user.
 (2.) DONE: represent one-star ratings as -1.
 (3.) We are not yet taking advantage of optional parameters that would let us tell
      the model about user demographics or movie genre information.
@@ -32,13 +34,21 @@ $ pipenv run python -m unittest tests/*/*_test.py
 """
 
 import numpy as np
-from scipy.sparse import coo_matrix, dok_matrix
+from scipy.sparse import coo_matrix
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from typer import Typer
 
+from mediabridge.data_processing.id_map import IdMaps, load_id_maps
+from mediabridge.data_processing.interaction_matrix import LIKED_FILTERS
+from mediabridge.data_processing.parquet import (
+    RatingSource,
+    iter_ratings,
+    read_movie_titles,
+)
 from mediabridge.db.tables import MovieTitle, get_engine
 from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import HoldOut, Split, split_ratings
 
 app = Typer()
 
@@ -47,6 +57,7 @@ app = Typer()
 def recommend(
     max_training_user_id: int = 798,
     large_movie_id: int = 9_770,
+    source: RatingSource = RatingSource.sqlite,
 ) -> set[int]:
     """Recommends a set of movies, by netflix_id, for a given user.
 
@@ -58,16 +69,21 @@ def recommend(
     Movie IDs below large_movie_id are revealed to the model during training,
     while larger IDs are hidden and are fair game to possibly recommend to the user.
     Clearly there is room to improve on this crude method of splitting into subsets.
+
+    Ratings are read from sqlite, or from the `mb export` Parquet dataset.
+    The model sees dense user and movie indexes, rather than raw netflix IDs.
     """
     LightFM = import_lightfm_silently()
 
+    id_maps = _get_id_maps(max_training_user_id)
     model = LightFM(no_components=30)
-    train = _get_ratings(max_training_user_id, large_movie_id)
+    train = _get_ratings(max_training_user_id, large_movie_id, source, id_maps)
     model.fit(train, epochs=10, num_threads=4)
 
-    test_movie_ids = _get_test_movie_ids(large_movie_id)
+    test_movie_ids = _get_test_movie_ids(large_movie_id, source)
 
-    predictions = model.predict(max_training_user_id, test_movie_ids)
+    (user,) = id_maps.users.to_dense([max_training_user_id])
+    predictions = model.predict(int(user), id_maps.movies.to_dense(test_movie_ids))
     assert isinstance(predictions, np.ndarray)
     assert predictions.shape == (len(test_movie_ids),)  # (8000, )
     mx = round(predictions.max(), 5)
@@ -77,67 +93,46 @@ def recommend(
     return {test_movie_ids[i] for i, p in enumerate(predictions) if p > thresh}
 
 
-def normalize_rating(rating: int) -> float:
-    """Maps a star rating to the interval [-1, 1], for a logistic loss model."""
-    # The inputs skew toward positive ratings, so the overall mean will be positive.
-    # We may need to defer normalization until the sample mean is known.
-    assert 1 <= rating <= 5
-    return (rating - 3) / 2
+def _get_id_maps(max_user_id: int) -> IdMaps:
+    """Just the training users, and the subject user, who may have no ratings."""
+    id_maps = load_id_maps()
+    return IdMaps(id_maps.users.upto(max_user_id), id_maps.movies)
 
 
 def _get_ratings(
     max_user_id: int,
     large_movie_id: int,
+    source: RatingSource = RatingSource.sqlite,
+    id_maps: IdMaps | None = None,
 ) -> coo_matrix:
     """Produces a sparse training matrix of thumbs {up, down} user ratings.
 
     We ignore "neutral" three-star ratings.
     """
-    query = """
-    SELECT
-        user_id,
-        CAST(movie_id AS INTEGER),
-        rating
-    FROM rating
-    WHERE
-        user_id <= :max_user_id
-        AND rating != 3
-    ORDER BY user_id, movie_id
-    """
-    params = {
-        "max_user_id": max_user_id,
-    }
-    matrix = dok_matrix(
-        (max_user_id + 1, _get_max_movie_id() + 1),
-        dtype=np.int8,
+    id_maps = id_maps or _get_id_maps(max_user_id)
+    movie_ids = id_maps.movies.raw_ids
+    # Blinds the model to the movies we want to predict.
+    split = Split(
+        test_users=np.array([max_user_id], dtype=np.uint32),
+        hold_out=HoldOut.movies,
+        movie_ids=movie_ids[movie_ids >= large_movie_id].astype(np.uint16),
     )
-    with get_engine().connect() as conn:
-        for u, m, r in conn.execute(text(query), params):
-            matrix[u, m] = normalize_rating(r)
-
-            # Blind the model to the movies we want to predict.
-            if u == max_user_id and m >= large_movie_id:
-                matrix[u, m] = 0
-
-    return coo_matrix(matrix)
-
-
-def _get_max_movie_id() -> int:
-    # Movie IDs are VARCHARs in the database, which complicates matters.
-    # Sorting by length and then lexically lets us return 17_770 instead of 9_999.
-    query = "SELECT id  FROM movie_title  ORDER BY LENGTH(id) DESC, id DESC  LIMIT 1"
-    with get_engine().connect() as conn:
-        val = conn.execute(text(query)).scalar()
-        return int(val or 0)
+    filters = [("user_id", "<=", max_user_id), *LIKED_FILTERS]
+    return split_ratings(iter_ratings(source, filters), id_maps, split).train.tocoo()
 
 
 def _get_test_movie_ids(
     large_movie_id: int,
+    source: RatingSource = RatingSource.sqlite,
 ) -> list[int]:
+    if source == RatingSource.parquet:
+        df = read_movie_titles(columns=["id"], filters=[("id", ">", large_movie_id)])
+        return sorted(df.id.tolist())
+
     query = """
     SELECT id
     FROM movie_title
-    WHERE CAST(id AS INTEGER) > :max_training_user_id
+    WHERE id > :max_training_user_id
     """
     params = {"max_training_user_id": large_movie_id}
     with get_engine().connect() as conn:
@@ -0,0 +1,266 @@
+"""
+Precomputes the top-k recommendations of every user, e.g. as a nightly job.
+
+Users are scored a block at a time, by one matrix multiply of the block's user
+embeddings with all of the item embeddings. Movies a user already rated, with
+any number of stars, per the rating store, are masked out, and the top k are
+picked by a partial sort. Blocks run in parallel processes, and each one is
+written to its own part file as soon as it is done, as NDJSON or Parquet.
+
+A _manifest.json in the output directory records the job's model, inputs, and
+settings. A rerun of the same job skips the blocks whose part files already
+exist, so an interrupted job resumes where it left off, while a changed job,
+e.g. after a retrain, discards the earlier run's blocks.
+"""
+
+import json
+import logging
+import os
+import pickle
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from time import time
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typer
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+
+from mediabridge.data_processing.id_map import IdMaps
+from mediabridge.data_processing.rating_store import RATING_STORE_DIR, RatingStore
+from mediabridge.definitions import LIGHTFM_MODEL_PKL, OUTPUT_DIR
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import SPLIT_DIR
+
+log = logging.getLogger(__name__)
+
+RECOMMENDATIONS_DIR = OUTPUT_DIR / "recommendations"
+BLOCK_USERS = 4_096
+
+app = typer.Typer()
+
+
+class OutputFormat(str, Enum):
+    ndjson = "ndjson"
+    parquet = "parquet"
+
+
+def score_unrated(
+    user_embeddings: NDArray[np.float32],
+    factors: ItemFactors,
+    rated: csr_matrix,
+) -> NDArray[np.float32]:
+    """Scores every movie for a block of users, and rated movies as -inf.
+
+    The rows of rated are those of the users.
+    """
+    scores: NDArray[np.float32] = user_embeddings @ factors.embeddings.T
+    scores += factors.biases
+    rows = np.repeat(np.arange(rated.shape[0]), np.diff(rated.indptr))
+    scores[rows, rated.indices] = -np.inf
+    return scores
+
+
+def top_k_rows(
+    scores: NDArray[np.float32], k: int
+) -> tuple[NDArray[np.intp], NDArray[np.float32]]:
+    """Returns each row's k best columns, best first, and their scores."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(part, order, axis=1),
+        np.take_along_axis(part_scores, order, axis=1),
+    )
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """Everything a worker needs, picklable."""
+
+    model_file: Path
+    matrix_dir: Path  # the id maps of the model's users and movies
+    store_dir: Path
+    out_dir: Path
+    fmt: OutputFormat
+    k: int
+    block_users: int
+
+    def part_file(self, block: int) -> Path:
+        return self.out_dir / f"part-{block:05d}.{self.fmt.value}"
+
+    def manifest(self) -> dict[str, Any]:
+        """Identifies the job's output, by its settings and input file versions."""
+        inputs = [
+            self.model_file,
+            self.matrix_dir / "user_ids.npy",
+            self.matrix_dir / "movie_ids.npy",
+            self.store_dir / "meta.json",
+        ]
+        return {
+            "inputs": {
+                str(f): [f.stat().st_size, f.stat().st_mtime_ns] for f in inputs
+            },
+            "fmt": self.fmt.value,
+            "k": self.k,
+            "block_users": self.block_users,
+        }
+
+
+# Each worker process loads the model and maps the rating store once.
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(job: BatchJob) -> None:
+    with open(job.model_file, "rb") as fin:
+        import_lightfm_silently()
+        model = pickle.load(fin)
+    _worker["users"] = np.asarray(model.user_embeddings, dtype=np.float32)
+    _worker["factors"] = ItemFactors.from_model(model)
+    _worker["store"] = RatingStore.open(job.store_dir)
+    _worker["id_maps"] = IdMaps.load(job.matrix_dir)
+
+
+def _write_part(
+    job: BatchJob,
+    block: int,
+    user_ids: NDArray[np.uint32],
+    movie_ids: list[NDArray[np.uint32]],
+    scores: list[NDArray[np.float32]],
+) -> None:
+    out_file = job.part_file(block)
+    tmp_file = out_file.with_name(out_file.name + ".tmp")
+    if job.fmt == OutputFormat.parquet:
+        table = pa.table(
+            {
+                "user_id": pa.array(user_ids, pa.uint32()),
+                "movie_ids": pa.array(movie_ids, pa.list_(pa.uint16())),
+                "scores": pa.array(scores, pa.list_(pa.float32())),
+            }
+        )
+        pq.write_table(table, tmp_file)
+    else:
+        with open(tmp_file, "w") as fout:
+            for user, movies, score in zip(user_ids.tolist(), movie_ids, scores):
+                row = {
+                    "user_id": user,
+                    "movie_ids": movies.tolist(),
+                    "scores": score.round(5).tolist(),
+                }
+                fout.write(json.dumps(row) + "\n")
+    tmp_file.replace(out_file)
+
+
+def _run_block(job: BatchJob, block: int) -> int:
+    users: NDArray[np.float32] = _worker["users"]
+    id_maps: IdMaps = _worker["id_maps"]
+    store: RatingStore = _worker["store"]
+    start = block * job.block_users
+    end = min(start + job.block_users, len(users))
+    user_ids = id_maps.users.to_raw(np.arange(start, end))
+    rated = store.user_rows(user_ids, id_maps.movies)
+    scores = score_unrated(users[start:end], _worker["factors"], rated)
+    top, scores = top_k_rows(scores, job.k)
+    # A user with fewer than k unrated movies gets -inf fillers; drop them.
+    finite = np.isfinite(scores)
+    movie_ids = id_maps.movies.to_raw(top)
+    _write_part(
+        job,
+        block,
+        user_ids,
+        [m[f] for m, f in zip(movie_ids, finite)],
+        [s[f] for s, f in zip(scores, finite)],
+    )
+    return end - start
+
+
+def _start_or_resume(job: BatchJob) -> None:
+    """Discards the output of any earlier run with a different manifest."""
+    # A leading underscore keeps it out of a Parquet dataset of the parts.
+    manifest_file = job.out_dir / "_manifest.json"
+    manifest = job.manifest()
+    if manifest_file.exists():
+        with open(manifest_file) as fin:
+            if json.load(fin) == manifest:
+                return
+    parts = list(job.out_dir.glob("part-*"))
+    if parts:
+        log.warning(
+            f"Discarding {len(parts)} blocks of a different job in {job.out_dir}"
+        )
+    for part in parts:
+        part.unlink()
+    job.out_dir.mkdir(parents=True, exist_ok=True)
+    with open(manifest_file, "w") as fout:
+        json.dump(manifest, fout, indent=2)
+
+
+def run_batch(job: BatchJob, workers: int = 1) -> int:
+    """Recommends for every user, skipping finished blocks. Returns users scored.
+
+    Raises ValueError if the id maps in job.matrix_dir are not the model's.
+    """
+    with open(job.model_file, "rb") as fin:
+        import_lightfm_silently()
+        model = pickle.load(fin)
+    shape = len(model.user_embeddings), len(model.item_embeddings)
+    if IdMaps.load(job.matrix_dir).shape != shape:
+        raise ValueError(
+            f"The id maps in {job.matrix_dir} are not those of {job.model_file},"
+            f" of {shape[0]:_} users and {shape[1]:_} movies"
+        )
+    num_users = shape[0]
+    num_blocks = -(-num_users // job.block_users)
+    _start_or_resume(job)
+    todo = [b for b in range(num_blocks) if not job.part_file(b).exists()]
+    log.info(f"{num_blocks - len(todo)} of {num_blocks} blocks already done")
+
+    t0 = time()
+    num_scored = 0
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(job,)
+    ) as pool:
+        for n in pool.map(_run_block, [job] * len(todo), todo):
+            num_scored += n
+    elapsed = time() - t0
+    log.info(
+        f"Scored {num_scored:_} users in {elapsed:.1f} s,"
+        f" {num_scored / max(elapsed, 1e-9):_.0f} users/s"
+    )
+    return num_scored
+
+
+@app.command()
+def recommend_batch(
+    ctx: typer.Context,
+    model_file: Path = LIGHTFM_MODEL_PKL,
+    matrix_dir: Path = typer.Option(
+        SPLIT_DIR / "train", help="The id maps the model was trained with."
+    ),
+    store_dir: Path = typer.Option(
+        RATING_STORE_DIR, help="The rating store, whose rated movies are excluded."
+    ),
+    out_dir: Path = RECOMMENDATIONS_DIR,
+    fmt: OutputFormat = typer.Option(OutputFormat.ndjson, "--format"),
+    k: int = 10,
+    block_users: int = BLOCK_USERS,
+    workers: int = typer.Option(os.cpu_count() or 1, help="Parallel processes."),
+    restart: bool = typer.Option(False, help="Discard the blocks of an earlier run."),
+) -> None:
+    """Precompute every user's top-k movies, resuming any unfinished run."""
+    if restart:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    job = BatchJob(model_file, matrix_dir, store_dir, out_dir, fmt, k, block_users)
+    try:
+        num_scored = run_batch(job, workers)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    print(f"Scored {num_scored:_} users, results are in {out_dir}")
@@ -0,0 +1,203 @@
+"""
+Splits ratings into train and test matrices, for evaluating a model.
+
+Each test user has some of their ratings held out. The model trains on every
+other user, plus the test users' remaining ratings, and is then scored on how
+well it predicts the held out ones. Which ratings get held out depends on
+the strategy:
+
+  random  a seeded, per-rating coin flip, holding out `fraction` of each test
+          user's ratings.
+  last    each test user's `last_n` most recent ratings, so the model must
+          predict the future from the past.
+  movies  every test user's ratings of a given set of movies.
+
+Ratings of other users stream straight into the train matrix, in a single
+vectorized pass. Only the test users' ratings are held until the end, when
+the strategy picks from them all at once.
+"""
+
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from time import time
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+
+from mediabridge.data_processing.id_map import IdMaps, load_id_maps
+from mediabridge.data_processing.interaction_matrix import (
+    LIKED_FILTERS,
+    assemble_csr,
+    normalize_ratings,
+    save_csr,
+)
+from mediabridge.data_processing.parquet import RatingSource, iter_ratings
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.data_processing.sampling import Sample, SampleBy, hash32
+from mediabridge.definitions import OUTPUT_DIR
+
+log = logging.getLogger(__name__)
+
+SPLIT_DIR = OUTPUT_DIR / "split"
+
+app = typer.Typer()
+
+
+class HoldOut(str, Enum):
+    random = "random"
+    last = "last"
+    movies = "movies"
+
+
+@dataclass
+class Split:
+    """Which users are tested, and which of their ratings are held out."""
+
+    test_users: Sample | NDArray[np.uint32]
+    hold_out: HoldOut = HoldOut.random
+    fraction: float = 0.2
+    last_n: int = 1
+    movie_ids: NDArray[np.uint16] = field(
+        default_factory=lambda: np.empty(0, np.uint16)
+    )
+    seed: int = 0
+
+    def is_test_user(self, user_id: NDArray[np.uint32]) -> NDArray[np.bool_]:
+        mask: NDArray[np.bool_]
+        if isinstance(self.test_users, Sample):
+            mask = self.test_users.keep(user_id)
+        else:
+            mask = np.isin(user_id, self.test_users)
+        return mask
+
+    def held_out(self, ratings: RatingBatch) -> NDArray[np.bool_]:
+        """Of the test users' ratings, those the model must not see."""
+        if self.hold_out == HoldOut.random:
+            # Keyed on the rating, so the outcome is independent of chunking.
+            key = ratings.user_id.astype(np.uint64) << np.uint64(16) | ratings.movie_id
+            mask: NDArray[np.bool_] = hash32(key, self.seed) < int(
+                self.fraction * 2**32
+            )
+            return mask
+        if self.hold_out == HoldOut.movies:
+            movies: NDArray[np.bool_] = np.isin(ratings.movie_id, self.movie_ids)
+            return movies
+
+        # Sort each user's ratings oldest first, ties broken by movie,
+        # then hold out the tail end of each user's run.
+        order = np.lexsort((ratings.movie_id, ratings.day, ratings.user_id))
+        user = ratings.user_id[order]
+        run_end = np.searchsorted(user, user, side="right")
+        from_end = run_end - np.arange(len(user)) - 1
+        held = np.zeros(len(ratings), dtype=np.bool_)
+        held[order] = from_end < self.last_n
+        return held
+
+
+@dataclass
+class TrainTest:
+    train: csr_matrix
+    test: csr_matrix
+
+    @property
+    def test_rows(self) -> NDArray[np.intp]:
+        """The dense indexes of users with at least one held out rating."""
+        rows: NDArray[np.intp] = np.flatnonzero(np.diff(self.test.indptr))
+        return rows
+
+
+def split_ratings(
+    batches: Iterable[RatingBatch],
+    id_maps: IdMaps,
+    split: Split,
+) -> TrainTest:
+    """Builds train and test matrices of normalized ratings, in one pass.
+
+    As in build_matrix(), only nonzero ratings of mapped users and movies
+    are kept. The two matrices have the same shape and never overlap.
+    """
+    t0 = time()
+    users, movies, values = [], [], []
+    pool = []
+    num_read = 0
+    for batch in batches:
+        value = normalize_ratings(batch.rating)
+        user = id_maps.users.to_dense(batch.user_id)
+        movie = id_maps.movies.to_dense(batch.movie_id)
+        keep = (value != 0) & (user >= 0) & (movie >= 0)
+        tested = split.is_test_user(batch.user_id)
+        train = keep & ~tested
+        users.append(user[train])
+        movies.append(movie[train])
+        values.append(value[train])
+        pool.append(batch[np.flatnonzero(keep & tested)])
+        num_read += len(batch)
+
+    test_users, test_movies, test_values = [], [], []
+    if pool:
+        ratings = RatingBatch.concat(pool)
+        held = split.held_out(ratings)
+        user = id_maps.users.to_dense(ratings.user_id)
+        movie = id_maps.movies.to_dense(ratings.movie_id)
+        value = normalize_ratings(ratings.rating)
+        users.append(user[~held])
+        movies.append(movie[~held])
+        values.append(value[~held])
+        test_users.append(user[held])
+        test_movies.append(movie[held])
+        test_values.append(value[held])
+
+    result = TrainTest(
+        train=assemble_csr(users, movies, values, id_maps.shape),
+        test=assemble_csr(test_users, test_movies, test_values, id_maps.shape),
+    )
+    log.info(
+        f"Split {num_read:_} ratings into {result.train.nnz:_} train and"
+        f" {result.test.nnz:_} test entries, for {len(result.test_rows):_} test"
+        f" users, in {time() - t0:.3f} s"
+    )
+    return result
+
+
+@app.command()
+def split(
+    ctx: typer.Context,
+    test_users: float = typer.Option(0.01, help="Fraction of users to test."),
+    hold_out: HoldOut = HoldOut.random,
+    fraction: float = typer.Option(0.2, help="Per test user, for --hold-out random."),
+    last_n: int = typer.Option(1, help="Per test user, for --hold-out last."),
+    movie: list[int] = typer.Option(
+        [], help="A movie to hold out, for --hold-out movies. Repeatable."
+    ),
+    seed: int = 0,
+    source: RatingSource = RatingSource.sqlite,
+    out_dir: Path = SPLIT_DIR,
+) -> None:
+    """Split the ratings into train and test matrices, saved to out/split/."""
+    if hold_out == HoldOut.movies and not movie:
+        raise typer.BadParameter("--hold-out movies needs at least one --movie.")
+    try:
+        test_sample = Sample(SampleBy.user, test_users, seed)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    spec = Split(
+        test_users=test_sample,
+        hold_out=hold_out,
+        fraction=fraction,
+        last_n=last_n,
+        movie_ids=np.array(movie, dtype=np.uint16),
+        seed=seed,
+    )
+    id_maps = load_id_maps()
+    result = split_ratings(iter_ratings(source, LIKED_FILTERS), id_maps, spec)
+    save_csr(result.train, id_maps, out_dir / "train")
+    save_csr(result.test, id_maps, out_dir / "test")
+    print(
+        f"Saved {result.train.nnz:_} train and {result.test.nnz:_} test ratings,"
+        f" of {len(result.test_rows):_} test users, to {out_dir}"
+    )
@@ -0,0 +1,283 @@
+"""
+Sweeps a grid of LightFM hyperparameters, fitting in parallel processes.
+
+The train and test matrices of `mb split` are copied once into shared memory
+blocks, which every worker maps rather than loading or pickling its own copy.
+So are the train matrix's COO row, col and float32 data arrays, in the form
+LightFM fits, so that no worker converts its own copy of the interactions.
+Cores are divided between the workers and LightFM's own num_threads.
+
+Each worker task fits one (no_components, loss, learning_rate) combination,
+scoring it at each epoch count of the grid along a single training run, so
+sweeping over epochs costs no more than fitting for the largest of them.
+"""
+
+import json
+import logging
+import os
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from itertools import product
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+from scipy.sparse import coo_matrix, csr_matrix
+
+from mediabridge.data_processing.interaction_matrix import load_csr
+from mediabridge.definitions import OUTPUT_DIR
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import SPLIT_DIR
+from mediabridge.recommender.train_model import validation_score
+
+log = logging.getLogger(__name__)
+
+SWEEP_DIR = OUTPUT_DIR / "sweep"
+
+app = typer.Typer()
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+@dataclass(frozen=True)
+class SharedCsr:
+    """Locates a CSR matrix whose arrays are in shared memory. Picklable."""
+
+    data: SharedArray
+    indices: SharedArray
+    indptr: SharedArray
+    shape: tuple[int, int]
+
+
+def _share(array: NDArray[np.generic], blocks: list[SharedMemory]) -> SharedArray:
+    shm = SharedMemory(create=True, size=max(1, array.nbytes))
+    blocks.append(shm)
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[:] = array
+    return SharedArray(shm.name, array.shape, array.dtype.str)
+
+
+def _attach(spec: SharedArray, blocks: list[SharedMemory]) -> NDArray[np.generic]:
+    shm = SharedMemory(spec.name)
+    blocks.append(shm)
+    return np.ndarray(spec.shape, np.dtype(spec.dtype), buffer=shm.buf)
+
+
+@dataclass(frozen=True)
+class SharedCoo:
+    """Locates a COO matrix whose arrays are in shared memory. Picklable."""
+
+    data: SharedArray
+    row: SharedArray
+    col: SharedArray
+    shape: tuple[int, int]
+
+
+@contextmanager
+def shared_csr(matrix: csr_matrix) -> Iterator[SharedCsr]:
+    """Copies the matrix into shared memory, freed on exit."""
+    blocks: list[SharedMemory] = []
+    try:
+        yield SharedCsr(
+            data=_share(matrix.data, blocks),
+            indices=_share(matrix.indices, blocks),
+            indptr=_share(matrix.indptr, blocks),
+            shape=matrix.shape,
+        )
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def attach_csr(spec: SharedCsr, blocks: list[SharedMemory]) -> csr_matrix:
+    """Maps a matrix that shared_csr() placed in shared memory, without copying.
+
+    The blocks must stay open for as long as the matrix is in use.
+    """
+    data, indices, indptr = (
+        _attach(array, blocks) for array in (spec.data, spec.indices, spec.indptr)
+    )
+    matrix = csr_matrix((data, indices, indptr), shape=spec.shape, copy=False)
+    matrix.has_sorted_indices = True
+    return matrix
+
+
+@contextmanager
+def shared_interactions(matrix: csr_matrix) -> Iterator[SharedCoo]:
+    """Copies the matrix into shared memory as LightFM's COO input, freed on exit."""
+    coo = matrix.tocoo()
+    blocks: list[SharedMemory] = []
+    try:
+        yield SharedCoo(
+            data=_share(coo.data.astype(np.float32), blocks),
+            row=_share(coo.row.astype(np.int32, copy=False), blocks),
+            col=_share(coo.col.astype(np.int32, copy=False), blocks),
+            shape=matrix.shape,
+        )
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def attach_coo(spec: SharedCoo, blocks: list[SharedMemory]) -> coo_matrix:
+    """Maps a matrix that shared_interactions() placed in shared memory, sans copy."""
+    data, row, col = (
+        _attach(array, blocks) for array in (spec.data, spec.row, spec.col)
+    )
+    return coo_matrix((data, (row, col)), shape=spec.shape, copy=False)
+
+
+@dataclass(frozen=True)
+class SweepParams:
+    no_components: int
+    loss: str
+    learning_rate: float
+
+
+@dataclass
+class SweepResult:
+    no_components: int
+    loss: str
+    learning_rate: float
+    epochs: int
+    score: float
+    seconds: float
+
+
+# Each worker process maps the matrices once, in _init_worker().
+_worker_matrices: dict[str, csr_matrix] = {}
+_worker_interactions: dict[str, coo_matrix] = {}
+_worker_blocks: list[SharedMemory] = []
+
+
+def _init_worker(train: SharedCsr, test: SharedCsr, interactions: SharedCoo) -> None:
+    _worker_matrices["train"] = attach_csr(train, _worker_blocks)
+    _worker_matrices["test"] = attach_csr(test, _worker_blocks)
+    _worker_interactions["train"] = attach_coo(interactions, _worker_blocks)
+
+
+def _fit(
+    params: SweepParams,
+    epochs: Sequence[int],
+    k: int,
+    num_threads: int,
+    seed: int,
+) -> list[SweepResult]:
+    train, test = _worker_matrices["train"], _worker_matrices["test"]
+    LightFM = import_lightfm_silently()
+    model = LightFM(
+        no_components=params.no_components,
+        loss=params.loss,
+        learning_rate=params.learning_rate,
+        random_state=seed,
+    )
+    interactions = _worker_interactions["train"]
+    results = []
+    done = 0
+    seconds = 0.0
+    for n in sorted(epochs):
+        t0 = perf_counter()
+        model.fit_partial(interactions, epochs=n - done, num_threads=num_threads)
+        seconds += perf_counter() - t0
+        done = n
+        score = validation_score(model, train, test, k, num_threads)
+        results.append(
+            SweepResult(**asdict(params), epochs=n, score=score, seconds=seconds)
+        )
+        log.info(f"{results[-1]}")
+    return results
+
+
+def run_sweep(
+    train: csr_matrix,
+    test: csr_matrix,
+    grid: Sequence[SweepParams],
+    epochs: Sequence[int],
+    k: int = 10,
+    workers: int | None = None,
+    num_threads: int | None = None,
+    seed: int = 0,
+) -> list[SweepResult]:
+    """Fits each point of the grid, returning results best first, by score then time.
+
+    By default, the cores are shared out between the workers and their threads.
+    """
+    cpus = os.cpu_count() or 1
+    workers = workers or max(1, min(len(grid), cpus))
+    num_threads = num_threads or max(1, cpus // workers)
+    log.info(
+        f"Sweeping {len(grid)} fits, {workers} at a time, {num_threads} threads each"
+    )
+    with shared_csr(train) as train_spec, shared_csr(test) as test_spec:
+        with (
+            shared_interactions(train) as interactions,
+            ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(train_spec, test_spec, interactions),
+            ) as pool,
+        ):
+            futures = [
+                pool.submit(_fit, params, epochs, k, num_threads, seed)
+                for params in grid
+            ]
+            results = [result for future in futures for result in future.result()]
+    return sorted(results, key=lambda r: (-r.score, r.seconds))
+
+
+def _print_table(results: list[SweepResult], k: int) -> None:
+    print(
+        f"{'rank':>4} {'components':>10} {'loss':<9} {'rate':>7} {'epochs':>6}"
+        f" {f'p@{k}':>8} {'seconds':>8}"
+    )
+    for rank, r in enumerate(results, start=1):
+        print(
+            f"{rank:>4} {r.no_components:>10} {r.loss:<9} {r.learning_rate:>7.4f}"
+            f" {r.epochs:>6} {r.score:>8.5f} {r.seconds:>8.2f}"
+        )
+
+
+@app.command()
+def sweep(
+    ctx: typer.Context,
+    split_dir: Path = typer.Option(SPLIT_DIR, help="Where `mb split` saved to."),
+    components: list[int] = typer.Option([16, 32, 64], help="Repeatable."),
+    loss: list[str] = typer.Option(["logistic", "warp"], help="Repeatable."),
+    learning_rate: list[float] = typer.Option([0.05], help="Repeatable."),
+    epochs: list[int] = typer.Option([5, 10, 20], help="Repeatable."),
+    k: int = typer.Option(10, help="Score by precision at k."),
+    workers: int | None = typer.Option(None, help="Defaults to one per fit or core."),
+    threads: int | None = typer.Option(None, help="Per worker; defaults to a share."),
+    seed: int = 0,
+) -> None:
+    """Fit LightFM over a grid of hyperparameters, ranking them by precision@k."""
+    grid = [SweepParams(*p) for p in product(components, loss, learning_rate)]
+    results = run_sweep(
+        load_csr(split_dir / "train"),
+        load_csr(split_dir / "test"),
+        grid,
+        epochs,
+        k,
+        workers,
+        threads,
+        seed,
+    )
+    _print_table(results, k)
+
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+    out_file = SWEEP_DIR / f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_file, "w") as fout:
+        json.dump([asdict(r) for r in results], fout, indent=2)
+    print(f"Results saved to {out_file}")
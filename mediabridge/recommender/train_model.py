@@ -1 +1,238 @@
-# Script to train the LightFM model
+"""
+Trains the LightFM model, one epoch at a time, with early stopping.
+
+Training reads the train and test matrices that `mb split` saved. After each
+epoch the model is scored by precision@k on the held out test ratings, and a
+checkpoint is written. Training stops once the score has not improved for
+`patience` epochs, and the best model seen is saved to LIGHTFM_MODEL_PKL,
+along with a fresh ANN index, and is exported to the serving processes.
+
+An interrupted run resumes from its last checkpoint, provided the
+hyperparameters and the split are unchanged.
+"""
+
+import hashlib
+import logging
+import pickle
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import Any
+
+import numpy as np
+import typer
+from scipy.sparse import coo_matrix, csr_matrix
+
+from mediabridge.data_processing.id_map import IdMaps
+from mediabridge.data_processing.interaction_matrix import load_csr
+from mediabridge.definitions import LIGHTFM_MODEL_PKL, OUTPUT_DIR
+from mediabridge.engine.ann import IvfIndex, ann_dir
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.engine.model_artifact import export_model
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import SPLIT_DIR
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = OUTPUT_DIR / "checkpoint"
+
+app = typer.Typer()
+
+
+@dataclass(frozen=True)
+class TrainConfig:
+    """Hyperparameters. A checkpoint is only resumed under identical ones."""
+
+    no_components: int = 30
+    loss: str = "logistic"
+    learning_rate: float = 0.05
+    k: int = 10
+    seed: int = 0
+
+
+@dataclass
+class Checkpoint:
+    """A model, and the validation scores of each epoch it was trained for.
+
+    The train matrix's shape and a split_fingerprint() identify the data.
+    """
+
+    model: Any
+    config: TrainConfig
+    scores: list[float] = field(default_factory=list)
+    shape: tuple[int, int] = (0, 0)
+    fingerprint: str = ""
+
+    @property
+    def epoch(self) -> int:
+        return len(self.scores)
+
+    @property
+    def best_epoch(self) -> int:
+        return int(np.argmax(self.scores)) + 1 if self.scores else 0
+
+    def stale_epochs(self, min_delta: float = 0.0) -> int:
+        """Counts the epochs since the score last improved by more than min_delta."""
+        best = -np.inf
+        stale = 0
+        for score in self.scores:
+            if score > best + min_delta:
+                best, stale = score, 0
+            else:
+                stale += 1
+        return stale
+
+
+def _dump(obj: object, out_file: Path) -> None:
+    """Pickles obj, replacing out_file only once the write is complete."""
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = out_file.with_name(out_file.name + ".tmp")
+    with open(tmp_file, "wb") as fout:
+        pickle.dump(obj, fout, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_file.replace(out_file)
+
+
+def split_fingerprint(train: csr_matrix, test: csr_matrix) -> str:
+    """A digest of the train and test matrices' contents."""
+    digest = hashlib.sha256()
+    for matrix in (train, test):
+        digest.update(repr((matrix.shape, matrix.nnz)).encode())
+        for array in (matrix.indptr, matrix.indices, matrix.data):
+            digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+def _load_checkpoint(
+    checkpoint_dir: Path, config: TrainConfig, shape: tuple[int, int], fingerprint: str
+) -> Checkpoint | None:
+    last = checkpoint_dir / "last.pkl"
+    if not last.exists():
+        return None
+    with open(last, "rb") as fin:
+        import_lightfm_silently()
+        checkpoint = pickle.load(fin)
+    assert isinstance(checkpoint, Checkpoint), last
+    if checkpoint.config != config:
+        log.warning(f"Not resuming {last}, it was trained with {checkpoint.config}")
+        return None
+    if checkpoint.shape != shape or checkpoint.fingerprint != fingerprint:
+        log.warning(f"Not resuming {last}, it was trained on a different split")
+        return None
+    log.info(f"Resuming after epoch {checkpoint.epoch}, from {last}")
+    return checkpoint
+
+
+def validation_score(
+    model: Any, train: csr_matrix, test: csr_matrix, k: int, num_threads: int = 1
+) -> float:
+    """Mean precision@k over the test users, counting only liked test movies."""
+    from lightfm.evaluation import precision_at_k
+
+    liked = test.multiply(test > 0).tocsr()
+    precision = precision_at_k(
+        model, liked, train_interactions=train, k=k, num_threads=num_threads
+    )
+    return float(precision.mean()) if len(precision) else 0.0
+
+
+def fit_with_early_stopping(
+    train: csr_matrix,
+    test: csr_matrix,
+    config: TrainConfig = TrainConfig(),
+    checkpoint_dir: Path = CHECKPOINT_DIR,
+    max_epochs: int = 100,
+    patience: int = 3,
+    min_delta: float = 1e-4,
+    num_threads: int = 4,
+    resume: bool = True,
+) -> Checkpoint:
+    """Drives fit_partial() an epoch at a time, checkpointing after each.
+
+    Writes last.pkl, the complete training state, after every epoch, and
+    best.pkl, just the model, whenever the validation score improves.
+    Returns the final state; its best model is in best.pkl.
+    """
+    shape = (int(train.shape[0]), int(train.shape[1]))
+    fingerprint = split_fingerprint(train, test)
+    checkpoint = None
+    if resume:
+        checkpoint = _load_checkpoint(checkpoint_dir, config, shape, fingerprint)
+    if checkpoint is None:
+        LightFM = import_lightfm_silently()
+        model = LightFM(
+            no_components=config.no_components,
+            loss=config.loss,
+            learning_rate=config.learning_rate,
+            random_state=config.seed,
+        )
+        checkpoint = Checkpoint(model, config, shape=shape, fingerprint=fingerprint)
+    # load_csr() maps the arrays read-only, and fit_partial() needs them writable.
+    interactions = coo_matrix(train, copy=True)
+
+    while (
+        checkpoint.epoch < max_epochs and checkpoint.stale_epochs(min_delta) < patience
+    ):
+        t0 = time()
+        checkpoint.model.fit_partial(interactions, epochs=1, num_threads=num_threads)
+        score = validation_score(checkpoint.model, train, test, config.k, num_threads)
+        checkpoint.scores.append(score)
+        if checkpoint.best_epoch == checkpoint.epoch:
+            _dump(checkpoint.model, checkpoint_dir / "best.pkl")
+        _dump(checkpoint, checkpoint_dir / "last.pkl")
+        log.info(
+            f"Epoch {checkpoint.epoch}: precision@{config.k} {score:.5f}"
+            f" in {time() - t0:.1f} s"
+        )
+
+    if checkpoint.epoch < max_epochs:
+        log.info(f"Stopped early, no improvement for {patience} epochs")
+    return checkpoint
+
+
+@app.command()
+def train(
+    ctx: typer.Context,
+    split_dir: Path = typer.Option(SPLIT_DIR, help="Where `mb split` saved to."),
+    out_file: Path = LIGHTFM_MODEL_PKL,
+    checkpoint_dir: Path = CHECKPOINT_DIR,
+    max_epochs: int = typer.Option(100, min=1),
+    patience: int = typer.Option(3, help="Stop after this many epochs sans progress."),
+    components: int = 30,
+    loss: str = "logistic",
+    learning_rate: float = 0.05,
+    k: int = typer.Option(10, help="Validate by precision at k."),
+    seed: int = 0,
+    threads: int = 4,
+    resume: bool = typer.Option(True, help="Continue from the last checkpoint."),
+    export: bool = typer.Option(True, help="Export the model to serving processes."),
+) -> None:
+    """Train the LightFM model on `mb split` output, saving the best epoch."""
+    config = TrainConfig(components, loss, learning_rate, k, seed)
+    checkpoint = fit_with_early_stopping(
+        load_csr(split_dir / "train"),
+        load_csr(split_dir / "test"),
+        config,
+        checkpoint_dir,
+        max_epochs=max_epochs,
+        patience=patience,
+        num_threads=threads,
+        resume=resume,
+    )
+    best_pkl = checkpoint_dir / "best.pkl"
+    if not checkpoint.best_epoch or not best_pkl.exists():
+        typer.echo(f"No best model in {checkpoint_dir}, rerun with --no-resume.")
+        raise typer.Exit(code=1)
+    shutil.copyfile(best_pkl, out_file)
+    with open(out_file, "rb") as fin:
+        model = pickle.load(fin)
+    # An index of the previous model's embeddings would now be stale.
+    index = IvfIndex.build(ItemFactors.from_model(model))
+    index.save(ann_dir(out_file))
+    if export:
+        export_model(model, IdMaps.load(split_dir / "train"), ann_index=index)
+    best = checkpoint.best_epoch
+    print(
+        f"Saved the epoch {best} model, precision@{k}"
+        f" {checkpoint.scores[best - 1]:.5f}, to {out_file}"
+    )
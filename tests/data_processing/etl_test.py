@@ -1,63 +1,146 @@
+import os
+import sqlite3
 import unittest
+from contextlib import closing
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
-import pandas as pd
-from sqlalchemy.ext.automap import automap_base
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
 
-from mediabridge.data_processing.etl import run_sqlite_child
-from mediabridge.db.tables import create_tables, get_engine
+from mediabridge.data_processing.etl import bulk_load_ratings, find_stale_files
+from mediabridge.data_processing.rating_parser import (
+    find_rating_files,
+    iter_rating_batches,
+    to_day,
+)
+from mediabridge.db.tables import Base
+from tests.util.training_set_util import write_training_set
 
 
 class EtlTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.db_file = self.dir / "movies.sqlite"
+        Base.metadata.create_all(create_engine(f"sqlite:///{self.db_file}"))
+        write_training_set(self.dir)
+        self.in_files = find_rating_files(self.dir)
 
-    def test_sqlite_dot_import(self) -> None:
-        df = pd.DataFrame([{"num": 123, "alpha": "abc"}])
-        csv = Path("/tmp/foo.csv")
-        df.to_csv(csv, index=False)
-        create_tables()
-        run_sqlite_child(
-            [
-                "DROP TABLE  IF EXISTS  foo;",
-                ".mode csv",
-                f".import {csv} foo",
-            ]
-        )
-        Base = automap_base()
-        Base.prepare(autoload_with=get_engine())
-        Foo = Base.metadata.tables["foo"]
-
-        with Session(get_engine()) as sess:
-            self.assertListEqual(
-                [
-                    ("123", "abc"),
-                ],
-                list(sess.query(Foo).all()),
-            )
-            run_sqlite_child(
-                [
-                    "DELETE FROM foo;",  # NB: no DROP, this time
-                    ".mode csv",
-                    f".import {csv} foo",
-                ]
-            )
-            self.assertListEqual(  # Now the .import behavior is to INSERT header as data                [
-                [
-                    ("num", "alpha"),
-                    ("123", "abc"),
-                ],
-                list(sess.query(Foo).all()),
-            )
-        csv.unlink()
-
-        # https://sqlite.org/cli.html
-        # 7.5. Importing files as CSV or other formats
-        # When .import is run, its treatment of the first input row depends upon
-        # whether the target table already exists. If it does not exist, the table
-        # is automatically created and the content of the first input row is used
-        # to set the name of all the columns in the table. In this case, the table
-        # data content is taken from the second and subsequent input rows. If the
-        # target table already exists, every row of the input, including the
-        # first, is taken to be actual data content. If the input file contains an
-        # initial row of column labels, you can make the .import command skip that
-        # initial row using the "--skip 1" option.
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _load(self, movie_ids: list[int] = [], max_rows: int = 100) -> int:
+        stale = find_stale_files(self.in_files, self.db_file, movie_ids)
+        batches = iter_rating_batches([f.path for f in stale])
+        num_rows: int = bulk_load_ratings(
+            stale, batches, self.db_file, max_rows, batch_rows=2
+        )
+        return num_rows
+
+    def _select(self, query: str) -> list[tuple[int, ...]]:
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            return list(conn.execute(query))
+
+    def _select_ratings(self) -> list[tuple[int, ...]]:
+        return self._select(
+            "SELECT user_id, movie_id, rating  FROM rating  ORDER BY user_id, movie_id"
+        )
+
+    def _select_dates(self, where: str) -> list[tuple[int, ...]]:
+        return self._select(
+            "SELECT user_id, movie_id, date(day * 86400, 'unixepoch')"
+            f"  FROM rating  WHERE {where}  ORDER BY day"
+        )
+
+    def _assert_stats_match_ratings(self) -> None:
+        self.assertEqual(
+            self._select(
+                "SELECT movie_id AS m, COUNT(*),"
+                " SUM(rating = 1), SUM(rating = 2), SUM(rating = 3),"
+                " SUM(rating = 4), SUM(rating = 5)"
+                "  FROM rating  GROUP BY m  ORDER BY m"
+            ),
+            self._select("SELECT *  FROM movie_stats  ORDER BY movie_id"),
+        )
+        self.assertEqual(
+            self._select(
+                "SELECT user_id, COUNT(*), SUM(rating)"
+                "  FROM rating  GROUP BY user_id  ORDER BY user_id"
+            ),
+            self._select("SELECT *  FROM user_stats  ORDER BY user_id"),
+        )
+
+    def test_bulk_load_ratings(self) -> None:
+        self.assertEqual(6, self._load())
+        self.assertEqual(
+            [(6, 1, 5), (6, 3, 4), (7, 2, 1), (8, 3, 2), (9, 3, 5), (30, 1, 3)],
+            self._select_ratings(),
+        )
+        self.assertEqual(
+            [(1, 2), (2, 1), (3, 3)],
+            self._select("SELECT movie_id, num_rows  FROM ingested_file"),
+        )
+        self.assertEqual(
+            [("rating_day_idx",), ("rating_movie_idx",)],
+            self._select(
+                "SELECT name  FROM sqlite_master"
+                "  WHERE type = 'index'  AND tbl_name = 'rating'  ORDER BY name"
+            ),
+        )
+        self.assertEqual(
+            [(8, 3, "2004-07-21"), (6, 1, "2005-05-13"), (30, 1, "2005-09-06")],
+            self._select_dates(
+                f"day >= {to_day('2004-07-21')}  AND day < {to_day('2005-12-30')}"
+            ),
+        )
+        self._assert_stats_match_ratings()
+        self.assertEqual(
+            [(6, 2, 4.5), (30, 1, 3.0)],
+            self._select(
+                "SELECT user_id, count, 1.0 * sum / count  FROM user_stats"
+                "  WHERE user_id IN (6, 30)"
+            ),
+        )
+
+    def test_rerun_skips_ingested_files(self) -> None:
+        self._load()
+        self.assertEqual([], find_stale_files(self.in_files, self.db_file))
+        self.assertEqual(0, self._load())
+        self.assertEqual(6, len(self._select_ratings()))
+
+    def test_reload_single_movie(self) -> None:
+        self._load()
+        self.assertEqual(1, self._load(movie_ids=[2]))
+        self.assertEqual(6, len(self._select_ratings()))
+
+    def test_changed_file_is_reloaded(self) -> None:
+        self._load()
+        mv_file = self.in_files[0]
+        mv_file.write_text("1:\n6,5,2005-05-13\n")
+        os.utime(mv_file, ns=(1, 1))
+        stale = find_stale_files(self.in_files, self.db_file)
+        self.assertEqual([1], [f.movie_id for f in stale])
+        self.assertEqual(1, self._load())
+        self._assert_stats_match_ratings()
+        self.assertEqual(
+            [(1, 6, 5), (2, 7, 1), (3, 6, 4), (3, 8, 2), (3, 9, 5)],
+            self._select(
+                "SELECT movie_id AS m, user_id, rating"
+                "  FROM rating  ORDER BY m, user_id"
+            ),
+        )
+
+    def test_max_rows_caps_the_table(self) -> None:
+        self.assertEqual(4, self._load(max_rows=4))
+        # Movie 3 was only partially loaded, so it is not yet in the manifest.
+        self.assertEqual(
+            [1, 2], [m for (m,) in self._select("SELECT movie_id FROM ingested_file")]
+        )
+        # The same max_rows again reloads just the truncated file, to 4 rows.
+        self.assertEqual(1, self._load(max_rows=4))
+        self.assertEqual(4, len(self._select_ratings()))
+        self._assert_stats_match_ratings()
+
+        self.assertEqual(3, self._load())
+        self.assertEqual(6, len(self._select_ratings()))
+        self._assert_stats_match_ratings()
@@ -0,0 +1,37 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+
+
+class IdMapTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.users = IdMap.from_ids([2_649_429, 6, 30, 6, 7])
+
+    def test_round_trip(self) -> None:
+        self.assertEqual(4, len(self.users))
+        self.assertEqual(
+            [0, 3, 1, -1, -1],
+            self.users.to_dense([6, 2_649_429, 7, 8, 9_999_999]).tolist(),
+        )
+        self.assertEqual([30, 6], self.users.to_raw([2, 0]).tolist())
+        raw = self.users.raw_ids
+        self.assertEqual(
+            raw.tolist(), self.users.to_raw(self.users.to_dense(raw)).tolist()
+        )
+
+    def test_upto(self) -> None:
+        self.assertEqual([6, 7, 8], self.users.upto(8).raw_ids.tolist())
+        self.assertEqual([6, 7, 30], self.users.upto(30).raw_ids.tolist())
+
+    def test_save_and_load(self) -> None:
+        id_maps = IdMaps(self.users, IdMap.from_ids(np.arange(1, 11)))
+        with TemporaryDirectory() as tmp:
+            id_maps.save(Path(tmp))
+            loaded = IdMaps.load(Path(tmp))
+        self.assertEqual((4, 10), loaded.shape)
+        self.assertEqual(np.uint32, loaded.users.raw_ids.dtype)
+        self.assertEqual([9], loaded.movies.to_dense([10]).tolist())
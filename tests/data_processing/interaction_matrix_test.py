@@ -0,0 +1,123 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from scipy.sparse import dok_matrix
+from sqlalchemy import create_engine
+
+from mediabridge.data_processing.etl import (
+    bulk_load_ratings,
+    find_stale_files,
+    iter_rating_table,
+)
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.interaction_matrix import (
+    LIKED_FILTERS,
+    build_matrix,
+    load_csr,
+    normalize_rating,
+    normalize_ratings,
+    save_csr,
+)
+from mediabridge.data_processing.rating_parser import (
+    RatingBatch,
+    find_rating_files,
+    iter_rating_batches,
+)
+from mediabridge.data_processing.synthetic import generate_dataset
+from mediabridge.db.tables import Base
+
+
+class InteractionMatrixTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        tmp_dir = Path(self.tmp.name)
+        self.dir = tmp_dir
+        self.db_file = tmp_dir / "movies.sqlite"
+        Base.metadata.create_all(create_engine(f"sqlite:///{self.db_file}"))
+        generate_dataset(tmp_dir, num_movies=40, num_users=500, num_ratings=5_000)
+        in_files = find_rating_files(tmp_dir / "training_set/training_set")
+        stale = find_stale_files(in_files, self.db_file)
+        batches = iter_rating_batches([f.path for f in stale])
+        bulk_load_ratings(stale, batches, self.db_file)
+        self.ratings = RatingBatch.concat(list(iter_rating_table(self.db_file)))
+        self.id_maps = IdMaps(
+            IdMap.from_ids(self.ratings.user_id), IdMap.from_ids(np.arange(1, 41))
+        )
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_normalize_ratings(self) -> None:
+        stars = np.arange(1, 6, dtype=np.uint8)
+        expected = [np.int8(normalize_rating(r)) for r in stars.tolist()]
+        self.assertEqual(expected, normalize_ratings(stars).tolist())
+
+    def test_matches_dok_loop(self) -> None:
+        """The historic per-row build, which the vectorized one replaces."""
+        blind_user = int(self.ratings.user_id[0])
+        expected = dok_matrix(self.id_maps.shape, dtype=np.int8)
+        for u, m, r in zip(
+            self.ratings.user_id.tolist(),
+            self.ratings.movie_id.tolist(),
+            self.ratings.rating.tolist(),
+        ):
+            if r != 3 and not (u == blind_user and m >= 20):
+                row = int(self.id_maps.users.to_dense([u])[0])
+                expected[row, m - 1] = normalize_rating(r)
+
+        matrix = build_matrix(
+            iter_rating_table(self.db_file, chunk_rows=1_000, filters=LIKED_FILTERS),
+            self.id_maps,
+            blind=lambda b: (b.user_id == blind_user) & (b.movie_id >= 20),
+        )
+        self.assertEqual(np.int8, matrix.dtype)
+        self.assertTrue(matrix.has_sorted_indices)
+        self.assertEqual(expected.nnz, matrix.nnz)
+        self.assertEqual(0, abs(matrix - expected.tocsr()).sum())
+
+    def test_unmapped_ratings_are_skipped(self) -> None:
+        few_movies = IdMaps(self.id_maps.users, IdMap.from_ids([3, 30]))
+        matrix = build_matrix(iter_rating_table(self.db_file), few_movies)
+        liked = np.isin(self.ratings.rating, [1, 5]) & np.isin(
+            self.ratings.movie_id, [3, 30]
+        )
+        self.assertEqual((len(self.id_maps.users), 2), matrix.shape)
+        self.assertEqual(int(liked.sum()), matrix.nnz)
+
+    def test_iter_rating_table_filters(self) -> None:
+        filters = [("rating", "in", [1, 5]), ("movie_id", "<", 10)]
+        ratings = RatingBatch.concat(list(iter_rating_table(self.db_file, 7, filters)))
+        expected = np.isin(self.ratings.rating, [1, 5]) & (self.ratings.movie_id < 10)
+        self.assertEqual(int(expected.sum()), len(ratings))
+        self.assertEqual({1, 5}, set(ratings.rating.tolist()))
+
+    def test_save_and_load_csr(self) -> None:
+        matrix = build_matrix(iter_rating_table(self.db_file), self.id_maps)
+        out_dir = self.dir / "interaction_matrix"
+        tiny = IdMaps(IdMap.from_ids([1, 2]), IdMap.from_ids([1, 2]))
+        save_csr(build_matrix([], tiny), tiny, out_dir)
+        save_csr(matrix, self.id_maps, out_dir)  # replaces the old artifact
+        self.assertEqual(
+            [
+                "data.npy",
+                "indices.npy",
+                "indptr.npy",
+                "meta.json",
+                "movie_ids.npy",
+                "user_ids.npy",
+            ],
+            sorted(p.name for p in out_dir.iterdir()),
+        )
+
+        loaded = load_csr(out_dir)
+        for array in (loaded.data, loaded.indices, loaded.indptr):
+            self.assertFalse(array.flags.owndata or array.flags.writeable)  # mmap "r"
+        self.assertEqual(matrix.shape, loaded.shape)
+        self.assertEqual(0, abs(matrix - loaded).sum())
+        self.assertEqual(matrix[5].toarray().tolist(), loaded[5].toarray().tolist())
+        loaded_maps = IdMaps.load(out_dir)
+        self.assertEqual(
+            self.id_maps.users.raw_ids.tolist(), loaded_maps.users.raw_ids.tolist()
+        )
@@ -0,0 +1,80 @@
+import sqlite3
+import unittest
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import create_engine
+
+from mediabridge.data_processing.etl import bulk_load_ratings, find_stale_files
+from mediabridge.data_processing.parquet import (
+    export_movie_titles,
+    export_ratings,
+    iter_rating_parquet,
+    read_movie_titles,
+    read_ratings,
+)
+from mediabridge.data_processing.rating_parser import (
+    RatingBatch,
+    find_rating_files,
+    iter_rating_batches,
+    to_day,
+)
+from mediabridge.db.tables import Base
+from tests.util.training_set_util import write_training_set
+
+
+class ParquetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        db_file = self.dir / "movies.sqlite"
+        Base.metadata.create_all(create_engine(f"sqlite:///{db_file}"))
+        write_training_set(self.dir)
+        stale = find_stale_files(find_rating_files(self.dir), db_file)
+        bulk_load_ratings(stale, iter_rating_batches([f.path for f in stale]), db_file)
+        with closing(sqlite3.connect(db_file)) as conn, conn:
+            conn.execute(
+                "INSERT INTO movie_title (id, year, title)  VALUES"
+                " ('1', 2003, 'Dinosaur Planet'), ('2', NULL, 'Isle of Man TT 2004'),"
+                " ('3', 1997, 'Character')"
+            )
+        self.rating_dir = self.dir / "parquet/rating"
+        self.titles_file = self.dir / "parquet/movie_title.parquet"
+        self.assertEqual(6, export_ratings(db_file, self.rating_dir))
+        self.assertEqual(3, export_movie_titles(db_file, self.titles_file))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_partitioned_by_movie(self) -> None:
+        partitions = sorted(p.name for p in self.rating_dir.iterdir())
+        self.assertEqual(["movie_id=1", "movie_id=2", "movie_id=3"], partitions)
+
+    def test_read_ratings_prunes_and_filters(self) -> None:
+        df = read_ratings(
+            columns=["user_id", "movie_id"],
+            filters=[
+                ("rating", "!=", 3),
+                ("movie_id", ">=", 2),
+                ("day", "<", to_day("2005-12-30")),
+            ],
+            in_dir=self.rating_dir,
+        )
+        self.assertEqual(["user_id", "movie_id"], list(df.columns))
+        self.assertEqual("uint16", df.movie_id.dtype)
+        self.assertEqual(
+            [(6, 3), (7, 2), (8, 3)],
+            sorted(df.itertuples(index=False, name=None)),
+        )
+
+    def test_iter_rating_parquet(self) -> None:
+        ratings = RatingBatch.concat(list(iter_rating_parquet(self.rating_dir)))
+        self.assertEqual(6, len(ratings))
+        self.assertEqual("uint32", ratings.user_id.dtype)
+        self.assertEqual(20, int(ratings.rating.sum()))
+
+    def test_read_movie_titles(self) -> None:
+        df = read_movie_titles(filters=[("id", ">", 1)], in_file=self.titles_file)
+        self.assertEqual([2, 3], df.id.tolist())
+        self.assertTrue(df.year.isna()[0])
@@ -0,0 +1,50 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from mediabridge.data_processing.rating_parser import (
+    find_rating_files,
+    from_day,
+    iter_rating_batches,
+    parse_ratings_file,
+    to_day,
+)
+from tests.util.training_set_util import write_training_set
+
+
+class RatingParserTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        write_training_set(self.dir)
+        self.in_files = find_rating_files(self.dir)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_parse_ratings_file(self) -> None:
+        batch = parse_ratings_file(self.in_files[2])
+        self.assertEqual(np.uint32, batch.user_id.dtype)
+        self.assertEqual(np.uint16, batch.movie_id.dtype)
+        self.assertEqual(np.uint8, batch.rating.dtype)
+        self.assertEqual([6, 8, 9], batch.user_id.tolist())
+        self.assertEqual([3, 3, 3], batch.movie_id.tolist())
+        self.assertEqual([4, 2, 5], batch.rating.tolist())
+        self.assertEqual(np.uint16, batch.day.dtype)
+        self.assertEqual(
+            ["2003-01-05", "2004-07-21", "2005-12-30"],
+            [from_day(d).isoformat() for d in batch.day.tolist()],
+        )
+
+    def test_to_day(self) -> None:
+        self.assertEqual(0, to_day("1970-01-01"))
+        self.assertEqual(13_148, to_day("2005-12-31"))
+
+    def test_iter_rating_batches_preserves_order(self) -> None:
+        serial = list(iter_rating_batches(self.in_files))
+        parallel = list(iter_rating_batches(self.in_files, workers=2))
+        self.assertEqual([1, 2, 3], [int(b.movie_id[0]) for b in parallel])
+        for a, b in zip(serial, parallel):
+            self.assertEqual(a.user_id.tolist(), b.user_id.tolist())
@@ -0,0 +1,83 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.rating_parser import (
+    find_rating_files,
+    iter_rating_batches,
+    to_day,
+)
+from mediabridge.data_processing.rating_store import RatingStore, build_rating_store
+from tests.util.training_set_util import write_training_set
+
+
+class RatingStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        tmp_dir = Path(self.tmp.name)
+        write_training_set(tmp_dir)
+        store_dir = tmp_dir / "ratings"
+        build_rating_store(iter_rating_batches(find_rating_files(tmp_dir)), store_dir)
+        self.store = RatingStore.open(store_dir)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_open_is_memory_mapped(self) -> None:
+        self.assertEqual(6, len(self.store))
+        self.assertIsInstance(self.store.by_user.user_id, np.memmap)
+        self.assertEqual(np.uint16, self.store.by_user.movie_id.dtype)
+
+    def test_for_movie(self) -> None:
+        ratings = self.store.for_movie(3)
+        self.assertEqual([6, 8, 9], ratings.user_id.tolist())
+        self.assertEqual([4, 2, 5], ratings.rating.tolist())
+        self.assertEqual(0, len(self.store.for_movie(99)))
+
+    def test_for_user(self) -> None:
+        ratings = self.store.for_user(6)
+        self.assertEqual([1, 3], ratings.movie_id.tolist())
+        self.assertEqual([5, 4], ratings.rating.tolist())
+        self.assertEqual(0, len(self.store.for_user(10)))
+
+    def test_between(self) -> None:
+        ratings = self.store.between(to_day("2004-07-21"), to_day("2005-12-30"))
+        self.assertEqual([8, 6, 30], ratings.user_id.tolist())
+        self.assertEqual([3, 1, 1], ratings.movie_id.tolist())
+        self.assertEqual(6, len(self.store.between(0, 99_999)))
+        self.assertEqual(0, len(self.store.between(99_999, 0)))
+
+    def test_to_csr(self) -> None:
+        matrix = self.store.to_csr()
+        self.assertEqual((31, 4), matrix.shape)
+        self.assertEqual(6, matrix.nnz)
+        self.assertEqual(1, matrix[7, 2])
+        self.assertEqual(3, matrix[30, 1])
+
+    def test_to_csr_dense(self) -> None:
+        raw = self.store.to_csr()
+        # A mapped user without ratings gets an empty row.
+        id_maps = IdMaps(
+            IdMap.from_ids([6, 7, 8, 9, 30, 99]), IdMap.from_ids([1, 2, 3])
+        )
+        matrix = self.store.to_csr(id_maps)
+        self.assertEqual((6, 3), matrix.shape)
+        self.assertEqual(6, matrix.nnz)
+        self.assertEqual(0, matrix[5].nnz)
+        users = id_maps.users.raw_ids[:5]
+        expected = raw[users][:, id_maps.movies.raw_ids]
+        self.assertEqual(0, abs(matrix[:5] - expected).sum())
+
+    def test_user_rows(self) -> None:
+        raw = self.store.to_csr()
+        # Movie 2 is unmapped, and user 99 has no ratings.
+        movies = IdMap.from_ids([1, 3])
+        matrix = self.store.user_rows(np.array([30, 6, 99, 8]), movies)
+        self.assertEqual((4, 2), matrix.shape)
+        expected = raw[[30, 6, 8]][:, [1, 3]]
+        self.assertEqual(0, abs(matrix[[0, 1, 3]] - expected).sum())
+        self.assertEqual(0, matrix[2].nnz)
+        self.assertEqual((0, 2), self.store.user_rows(np.array([]), movies).shape)
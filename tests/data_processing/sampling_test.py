@@ -0,0 +1,81 @@
+import sqlite3
+import unittest
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from sqlalchemy import create_engine
+from typer.testing import CliRunner
+
+from mediabridge import main
+from mediabridge.data_processing.etl import bulk_load_ratings, find_stale_files
+from mediabridge.data_processing.rating_parser import (
+    RatingBatch,
+    find_rating_files,
+    iter_rating_batches,
+)
+from mediabridge.data_processing.sampling import Sample, SampleBy
+from mediabridge.data_processing.synthetic import generate_dataset
+from mediabridge.db.tables import Base
+
+
+class SamplingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.db_file = self.dir / "movies.sqlite"
+        Base.metadata.create_all(create_engine(f"sqlite:///{self.db_file}"))
+        generate_dataset(self.dir, num_movies=50, num_users=1_000, num_ratings=20_000)
+        self.in_files = find_rating_files(self.dir / "training_set/training_set")
+        self.all = RatingBatch.concat(list(iter_rating_batches(self.in_files)))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _load(self, sample: Sample | None) -> int:
+        stale = find_stale_files(self.in_files, self.db_file, sample=sample)
+        batch_filter = sample.filter_batch if sample else None
+        batches = iter_rating_batches([f.path for f in stale], 2, batch_filter)
+        num_rows: int = bulk_load_ratings(stale, batches, self.db_file, sample=sample)
+        return num_rows
+
+    def _select_users(self) -> set[int]:
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            return {u for (u,) in conn.execute("SELECT user_id  FROM user_stats")}
+
+    def test_keep_is_deterministic(self) -> None:
+        ids = np.arange(100_000, dtype=np.uint32)
+        tenth = Sample(SampleBy.user, 0.1, seed=1)
+        self.assertAlmostEqual(0.1, tenth.keep(ids).mean(), delta=0.01)
+        self.assertEqual(tenth.keep(ids).tolist(), tenth.keep(ids).tolist())
+        other = Sample(SampleBy.user, 0.1, seed=2)
+        self.assertNotEqual(tenth.keep(ids).tolist(), other.keep(ids).tolist())
+
+    def test_fraction_must_be_positive(self) -> None:
+        for fraction in [0, -0.1, 1.5]:
+            with self.assertRaises(ValueError):
+                Sample(SampleBy.user, fraction)
+        result = CliRunner().invoke(main.app, ["load", "--sample-users", "0"])
+        self.assertEqual(2, result.exit_code)  # a usage error, not a full load
+
+    def test_sample_users_keeps_all_their_ratings(self) -> None:
+        sample = Sample(SampleBy.user, 0.2)
+        num_rows = self._load(sample)
+        users = self._select_users()
+        expected = np.isin(self.all.user_id, list(users))
+        self.assertEqual(int(expected.sum()), num_rows)
+        self.assertLess(num_rows, len(self.all) // 2)
+        self.assertEqual(0, self._load(sample))  # up to date
+
+        # A full load replaces the sample.
+        self.assertEqual(len(self.all), self._load(None))
+        self.assertEqual(set(self.all.user_id.tolist()), self._select_users())
+
+    def test_sample_movies_skips_files(self) -> None:
+        sample = Sample(SampleBy.movie, 0.2)
+        stale = find_stale_files(self.in_files, self.db_file, sample=sample)
+        self.assertLess(len(stale), 25)
+        movie_ids = [f.movie_id for f in stale]
+        num_rows = self._load(sample)
+        self.assertEqual(int(np.isin(self.all.movie_id, movie_ids).sum()), num_rows)
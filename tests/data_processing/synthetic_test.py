@@ -0,0 +1,55 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from mediabridge.data_processing.etl_bench import StageResult, compare, run_benchmark
+from mediabridge.data_processing.rating_parser import (
+    RatingBatch,
+    find_rating_files,
+    iter_rating_batches,
+)
+from mediabridge.data_processing.synthetic import generate_dataset
+from mediabridge.data_processing.wiki_to_netflix import read_netflix_txt
+
+
+class SyntheticTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_generate_dataset(self) -> None:
+        num_ratings = generate_dataset(self.dir, num_movies=30, num_users=100)
+        in_files = find_rating_files(self.dir / "training_set/training_set")
+        self.assertEqual(30, len(in_files))
+        ratings = RatingBatch.concat(list(iter_rating_batches(in_files)))
+        self.assertEqual(num_ratings, len(ratings))
+        self.assertLessEqual(num_ratings, 30 * 100)
+        self.assertEqual({1, 2, 3, 4, 5}, set(ratings.rating.tolist()))
+
+        titles = list(read_netflix_txt(self.dir / "movie_titles.txt"))
+        self.assertEqual(30, len(titles))
+        self.assertEqual("Synthetic Movie 7, Part II", titles[6][2])
+
+        # The same seed reproduces the same files.
+        text = in_files[0].read_text()
+        generate_dataset(self.dir, num_movies=30, num_users=100)
+        self.assertEqual(text, in_files[0].read_text())
+
+    def test_run_benchmark(self) -> None:
+        results = run_benchmark(self.dir, 20, 200, 2_000)
+        self.assertEqual(
+            ["parse", "import", "index", "export", "reporting", "matrix"],
+            [r.stage for r in results],
+        )
+        num_rows = results[0].rows
+        self.assertEqual([num_rows] * 4, [r.rows for r in results[:4]])
+
+        baseline = [{"stage": "parse", "seconds": 1.0}]
+        slower = [StageResult("parse", 1.5, num_rows, 0.0, 0.0)]
+        self.assertEqual(
+            ["parse: 1.000 s -> 1.500 s (+50%)"], compare(baseline, slower)
+        )
+        self.assertEqual([], compare(baseline, slower, tolerance=0.6))
@@ -0,0 +1,52 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mediabridge.db import connect
+from mediabridge.db.connect import (
+    close_mongo_client,
+    connect_to_mongo,
+    get_mongo_client,
+    set_mongo_client,
+)
+from mediabridge.db.queries import bulk_insert, insert_into_mongo
+
+# Nothing listens here; clients connect lazily, so no test touches the network.
+_ENV = {"MONGODB_URI": "mongodb://localhost:1", "MONGODB_MAX_POOL_SIZE": "7"}
+
+
+@patch.dict(os.environ, _ENV)
+class ConnectTest(unittest.TestCase):
+    def setUp(self) -> None:
+        close_mongo_client()
+
+    def tearDown(self) -> None:
+        close_mongo_client()
+
+    def test_one_client_per_process(self) -> None:
+        client = get_mongo_client()
+        self.assertIs(client, connect_to_mongo().client)
+        self.assertIs(client, connect_to_mongo().client)
+        self.assertEqual("mediabridge", connect_to_mongo().name)
+        self.assertEqual(7, client.options.pool_options.max_pool_size)
+
+        close_mongo_client()
+        self.assertIsNot(client, get_mongo_client())
+
+    def test_fork(self) -> None:
+        client = get_mongo_client()
+        connect._forget_client_after_fork()  # as run in a forked child
+        child_client = get_mongo_client()
+        self.assertIsNot(client, child_client)
+        client.close()
+
+    def test_queries_share_the_client(self) -> None:
+        mock = MagicMock()
+        set_mongo_client(mock)
+        insert_into_mongo(["1", "Q1", "Dinosaur Planet", 2003, "", ""])
+        insert_into_mongo(["2", "Q2", "Isle of Man TT 2004", 2004, "", ""])
+        bulk_insert([])
+        movies = mock["mediabridge"]["movies"]
+        self.assertEqual(2, movies.update_one.call_count)
+        movies.bulk_write.assert_called_once_with([])
+        set_mongo_client(None)
@@ -0,0 +1,155 @@
+import sqlite3
+import unittest
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from mediabridge.data_processing.etl import iter_rating_table
+from mediabridge.data_processing.rating_parser import UNKNOWN_DAY, RatingBatch
+from mediabridge.db.migrate import get_schema_version, migrate
+from mediabridge.db.tables import SCHEMA_VERSION
+
+V1_DDL = """
+CREATE TABLE movie_title (
+    id VARCHAR NOT NULL, year INTEGER, title VARCHAR NOT NULL, PRIMARY KEY (id));
+CREATE TABLE rating (
+    user_id INTEGER NOT NULL, movie_id VARCHAR NOT NULL, rating INTEGER NOT NULL,
+    PRIMARY KEY (user_id, movie_id), FOREIGN KEY(movie_id) REFERENCES movie_title (id));
+CREATE TABLE popular_movie (
+    id VARCHAR NOT NULL, count INTEGER NOT NULL, year INTEGER, title VARCHAR NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(id) REFERENCES movie_title (id));
+CREATE INDEX ix_popular_movie_count ON popular_movie (count);
+CREATE VIEW rating_v AS
+    SELECT user_id, rating, mt.*
+    FROM rating JOIN movie_title mt ON CAST(movie_id AS INTEGER) = mt.id;
+INSERT INTO movie_title VALUES ('1', 2003, 'Dinosaur Planet'), ('2', 2004, 'Isle of Man');
+INSERT INTO rating VALUES (7, '2', 1), (6, '1', 5), (6, '2', 4);
+INSERT INTO popular_movie VALUES ('2', 2, 2004, 'Isle of Man');
+"""
+
+# Relative to V1_DDL, e.g. as left by `mb migrate` before rating days were kept.
+V2_DDL = """
+DROP VIEW rating_v;
+DROP TABLE rating;
+CREATE TABLE rating (
+    user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL, rating INTEGER NOT NULL,
+    PRIMARY KEY (user_id, movie_id)) WITHOUT ROWID;
+CREATE INDEX rating_movie_idx ON rating (movie_id, user_id, rating);
+CREATE TABLE ingested_file (
+    movie_id INTEGER PRIMARY KEY, file_name VARCHAR NOT NULL, size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL, num_rows INTEGER NOT NULL);
+INSERT INTO rating VALUES (6, 1, 5);
+INSERT INTO ingested_file VALUES (1, 'mv_0000001.txt', 20, 0, 1);
+PRAGMA user_version = 2;
+"""
+
+
+class MigrateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.db_file = Path(self.tmp.name) / "movies.sqlite"
+        # Movie 2's file has a rating that the database lacks, e.g. after a crash.
+        self.training_dir = Path(self.tmp.name) / "training_set"
+        self.training_dir.mkdir()
+        (self.training_dir / "mv_0000001.txt").write_text("1:\n6,5,2005-09-06\n")
+        (self.training_dir / "mv_0000002.txt").write_text(
+            "2:\n7,1,2005-01-01\n6,4,2005-01-02\n8,3,2005-01-03\n"
+        )
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            conn.executescript(V1_DDL)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_migrate_v1(self) -> None:
+        self.assertTrue(migrate(self.db_file, training_dir=self.training_dir))
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            self.assertEqual(SCHEMA_VERSION, get_schema_version(conn))
+            self.assertEqual(
+                [(6, 1, 5, None), (6, 2, 4, None), (7, 2, 1, None)],
+                list(conn.execute("SELECT *  FROM rating  ORDER BY user_id, movie_id")),
+            )
+            self.assertEqual(
+                [("integer",)],
+                list(conn.execute("SELECT DISTINCT typeof(movie_id)  FROM rating")),
+            )
+            self.assertEqual(
+                [(2, 2, "Isle of Man")],
+                list(conn.execute("SELECT id, count, title  FROM popular_movie")),
+            )
+            self.assertEqual(
+                [(6, 5, 1, 2003), (7, 1, 2, 2004)],
+                list(
+                    conn.execute(
+                        "SELECT user_id, rating, id, year  FROM rating_v"
+                        "  WHERE user_id = 7 OR title = 'Dinosaur Planet'"
+                        "  ORDER BY user_id"
+                    )
+                ),
+            )
+            names = {
+                name
+                for (name,) in conn.execute(
+                    "SELECT name  FROM sqlite_master  WHERE type = 'index'"
+                )
+            }
+            self.assertIn("rating_movie_idx", names)
+            self.assertIn("rating_day_idx", names)
+            self.assertIn("ix_popular_movie_count", names)
+
+            # The aggregates and manifest are rebuilt, so `mb load` is incremental.
+            self.assertEqual(
+                [(1, 1, 0, 0, 0, 0, 1), (2, 2, 1, 0, 0, 1, 0)],
+                list(conn.execute("SELECT *  FROM movie_stats  ORDER BY movie_id")),
+            )
+            self.assertEqual(
+                [(6, 2, 9), (7, 1, 1)],
+                list(conn.execute("SELECT *  FROM user_stats  ORDER BY user_id")),
+            )
+            self.assertEqual(
+                [(1, "mv_0000001.txt", 1)],
+                list(
+                    conn.execute(
+                        "SELECT movie_id, file_name, num_rows  FROM ingested_file"
+                    )
+                ),
+            )
+
+        self.assertFalse(migrate(self.db_file))  # already current
+
+    def test_migrate_v2(self) -> None:
+        with closing(sqlite3.connect(self.db_file)) as conn, conn:
+            conn.executescript(V2_DDL)
+        self.assertTrue(
+            migrate(self.db_file, vacuum=False, training_dir=self.training_dir)
+        )
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            self.assertEqual(
+                [(6, 1, 5, None)],
+                list(conn.execute("SELECT *  FROM rating  WHERE user_id = 6")),
+            )
+            # The manifest is kept as is, and the aggregates are rebuilt.
+            self.assertEqual(
+                [(1, 20, 0)],
+                list(
+                    conn.execute("SELECT movie_id, size, mtime_ns  FROM ingested_file")
+                ),
+            )
+            self.assertEqual(
+                [(6, 1, 5)], list(conn.execute("SELECT *  FROM user_stats"))
+            )
+
+    def test_iter_migrated_ratings(self) -> None:
+        migrate(self.db_file, vacuum=False, training_dir=self.training_dir)
+        ratings = RatingBatch.concat(list(iter_rating_table(self.db_file)))
+        self.assertEqual(
+            [(6, 1, 5, UNKNOWN_DAY), (6, 2, 4, UNKNOWN_DAY), (7, 2, 1, UNKNOWN_DAY)],
+            sorted(
+                zip(
+                    ratings.user_id.tolist(),
+                    ratings.movie_id.tolist(),
+                    ratings.rating.tolist(),
+                    ratings.day.tolist(),
+                )
+            ),
+        )
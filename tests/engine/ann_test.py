@@ -0,0 +1,62 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from mediabridge.engine.ann import IvfIndex, brute_force, measure_recall, top_k
+from mediabridge.engine.fold_in import ItemFactors
+
+
+class AnnTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        # Clustered movies, as a trained model's tend to be.
+        centers = rng.normal(size=(20, 16))
+        self.factors = ItemFactors(
+            embeddings=(
+                centers[rng.integers(0, 20, 3_000)] + rng.normal(size=(3_000, 16)) * 0.3
+            ).astype(np.float32),
+            biases=rng.normal(scale=0.1, size=3_000).astype(np.float32),
+        )
+        self.users = list(rng.normal(size=(50, 16)).astype(np.float32))
+        self.index = IvfIndex.build(self.factors)
+
+    def test_top_k(self) -> None:
+        scores = np.array([0.5, 3, -1, 2, 2.5], dtype=np.float32)
+        self.assertEqual([1, 4, 3], top_k(scores, 3).tolist())
+        self.assertEqual([1, 4, 3, 0, 2], top_k(scores, 9).tolist())
+
+    def test_build(self) -> None:
+        self.assertEqual(219, self.index.nlist)  # about 4 sqrt(3_000)
+        self.assertEqual(list(range(3_000)), sorted(self.index.items.tolist()))
+        self.assertEqual(3_000, self.index.offsets[-1])
+
+    def test_recall(self) -> None:
+        everything = measure_recall(self.index, self.factors, self.users, nprobe=219)
+        self.assertEqual(1.0, everything)
+        rescored = measure_recall(self.index, self.factors, self.users, nprobe=32)
+        approx = measure_recall(
+            self.index, self.factors, self.users, nprobe=32, rescore=False
+        )
+        self.assertGreaterEqual(rescored, 0.9)
+        self.assertGreaterEqual(rescored, approx)
+
+    def test_exclude(self) -> None:
+        user = self.users[0]
+        best = brute_force(self.factors, user, 5)
+        found = self.index.search(user, 5, nprobe=219, exclude=best[:2])
+        self.assertEqual(5, len(found))
+        self.assertEqual(best[2:].tolist(), found[:3].tolist())
+
+    def test_save_and_load(self) -> None:
+        with TemporaryDirectory() as tmp:
+            index_dir = Path(tmp) / "model.ann"
+            self.index.save(index_dir)
+            self.index.save(index_dir)  # replaces the old one
+            loaded = IvfIndex.load(index_dir)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            user = self.users[1]
+            self.assertEqual(
+                self.index.search(user, 10).tolist(), loaded.search(user, 10).tolist()
+            )
@@ -0,0 +1,87 @@
+import os
+import pickle
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.db.connect import close_mongo_client
+from mediabridge.engine.ann import IvfIndex, ann_dir
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.engine.recommendation_engine import RecommendationEngine
+from mediabridge.recommender.import_utils import import_lightfm_silently
+
+
+def _two_tastes_model() -> object:
+    """Odd users like odd movies and dislike even ones, and vice versa."""
+    rng = np.random.default_rng(0)
+    pairs = np.unique(rng.integers(0, 200 * 40, 4_000))
+    user, movie = pairs // 40, pairs % 40
+    rating = np.where(user % 2 == movie % 2, 1, -1)
+    LightFM = import_lightfm_silently()
+    model = LightFM(no_components=8, loss="logistic", random_state=0)
+    model.fit(coo_matrix((rating, (user, movie)), shape=(200, 40)), epochs=20)
+    return model
+
+
+class FoldInTest(unittest.TestCase):
+    model: Any
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.model = _two_tastes_model()
+
+    def test_fold_in(self) -> None:
+        factors = ItemFactors.from_model(self.model)
+        self.assertEqual(40, len(factors))
+        t0 = perf_counter()
+        user = factors.fold_in(liked=[1, 3], disliked=[2])
+        scores = factors.score(user)
+        self.assertLess(perf_counter() - t0, 0.05)
+        self.assertEqual((40,), scores.shape)
+        top = np.argsort(-scores)[:10]
+        self.assertGreaterEqual(np.mean(top % 2 == 1), 0.8)
+
+    def test_recommend_new_user(self) -> None:
+        id_maps = IdMaps(
+            IdMap.from_ids(np.arange(200)), IdMap.from_ids(np.arange(40) + 100)
+        )
+        with (
+            TemporaryDirectory() as tmp,
+            patch.dict(os.environ, {"MONGODB_URI": "mongodb://localhost:1"}),
+        ):
+            model_file = Path(tmp) / "model.pkl"
+            with open(model_file, "wb") as fout:
+                pickle.dump(self.model, fout)
+            engine = RecommendationEngine([], model_file, id_maps)
+            self.assertIsNone(engine.ann_index)
+            ids = engine.recommend_new_user([100, 102, 104], limit=5)
+
+            IvfIndex.build(engine.item_factors).save(ann_dir(model_file))
+            ann = RecommendationEngine([], model_file, id_maps)
+            self.assertIsNotNone(ann.ann_index)
+            ann_ids = ann.recommend_new_user([100, 102, 104], limit=5)
+            os.utime(model_file, (2e9, 2e9))  # retrained since
+            with self.assertLogs("mediabridge.engine.recommendation_engine"):
+                self.assertIsNone(
+                    RecommendationEngine([], model_file, id_maps).ann_index
+                )
+            close_mongo_client()
+            exact = [
+                engine.recommend_new_user(liked, 5, disliked, exact=True)
+                for liked, disliked in [([100, 102], [101]), ([101], ()), ([], [])]
+            ]
+            batch = engine.recommend_new_users(
+                [[100, 102], [101], []], limit=5, disliked_movies_ids=[[101], [], []]
+            )
+            self.assertEqual(exact, batch)
+        for found in (ids, ann_ids):
+            self.assertEqual(5, len(found))
+            self.assertFalse({100, 102, 104} & set(found))
+            self.assertGreaterEqual(sum(i % 2 == 0 for i in found), 4)
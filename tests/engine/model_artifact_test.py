@@ -0,0 +1,118 @@
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.db.connect import close_mongo_client
+from mediabridge.engine.ann import IvfIndex, ann_dir
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.engine.model_artifact import (
+    ModelArtifact,
+    ServingArtifact,
+    current_link,
+    export_model,
+    saved_ann_index,
+)
+from mediabridge.engine.recommendation_engine import RecommendationEngine
+from tests.engine.fold_in_test import _two_tastes_model
+
+
+class ModelArtifactTest(unittest.TestCase):
+    model: Any
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.model = _two_tastes_model()
+
+    def setUp(self) -> None:
+        self.id_maps = IdMaps(
+            IdMap.from_ids(np.arange(200)), IdMap.from_ids(np.arange(40) + 100)
+        )
+        self.tmp = TemporaryDirectory()
+        self.serving_dir = Path(self.tmp.name) / "serving"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_export_and_load(self) -> None:
+        version_dir = export_model(self.model, self.id_maps, self.serving_dir)
+        self.assertEqual(version_dir, current_link(self.serving_dir).resolve())
+
+        artifact = ModelArtifact.load(version_dir)
+        self.assertIsInstance(artifact.item_embeddings, np.memmap)
+        self.assertIsNotNone(artifact.ann_index)
+        assert artifact.id_maps
+        np.testing.assert_array_equal(
+            self.id_maps.movies.raw_ids, artifact.id_maps.movies.raw_ids
+        )
+        np.testing.assert_allclose(self.model.user_biases, artifact.user_biases)
+        np.testing.assert_allclose(
+            self.model.item_embeddings, artifact.item_factors.embeddings
+        )
+
+    def test_hot_swap(self) -> None:
+        first = export_model(self.model, self.id_maps, self.serving_dir, keep=1)
+        serving = ServingArtifact(self.serving_dir, refresh_seconds=0)
+        old = serving.get()
+        self.assertEqual(first.name, old.version)
+
+        self.model.item_biases += 1
+        try:
+            second = export_model(self.model, self.id_maps, self.serving_dir, keep=1)
+        finally:
+            self.model.item_biases -= 1
+        self.assertFalse(first.exists())
+        new = serving.get()
+        self.assertEqual(second.name, new.version)
+        # The pruned version stays mapped, for requests still using it.
+        np.testing.assert_allclose(old.item_biases + 1, new.item_biases, rtol=1e-6)
+
+    def test_bad_version_keeps_serving(self) -> None:
+        first = export_model(self.model, self.id_maps, self.serving_dir)
+        serving = ServingArtifact(self.serving_dir, refresh_seconds=0)
+        (self.serving_dir / "v_broken").mkdir()  # e.g. no manifest.json
+        current_link(self.serving_dir).unlink()
+        current_link(self.serving_dir).symlink_to("v_broken")
+        with self.assertLogs("mediabridge.engine.model_artifact", "ERROR"):
+            self.assertEqual(first.name, serving.get().version)
+
+        second = export_model(self.model, self.id_maps, self.serving_dir)
+        self.assertEqual(second.name, serving.get().version)  # retried
+
+    def test_saved_ann_index(self) -> None:
+        model_file = Path(self.tmp.name) / "model.pkl"
+        model_file.touch()
+        self.assertIsNone(saved_ann_index(model_file, 40))
+        index = IvfIndex.build(ItemFactors.from_model(self.model))
+        index.save(ann_dir(model_file))
+        saved = saved_ann_index(model_file, 40)
+        assert saved
+        np.testing.assert_array_equal(index.items, saved.items)
+        self.assertIsNone(saved_ann_index(model_file, 41))
+        os.utime(model_file, (2e9, 2e9))  # retrained since
+        self.assertIsNone(saved_ann_index(model_file, 40))
+
+        with patch.object(IvfIndex, "build") as build:
+            version_dir = export_model(
+                self.model, self.id_maps, self.serving_dir, ann_index=saved
+            )
+            build.assert_not_called()
+        exported = ModelArtifact.load(version_dir).ann_index
+        assert exported
+        np.testing.assert_array_equal(index.items, exported.items)
+
+    def test_engine(self) -> None:
+        export_model(self.model, self.id_maps, self.serving_dir)
+        with patch.dict(os.environ, {"MONGODB_URI": "mongodb://localhost:1"}):
+            engine = RecommendationEngine([], self.serving_dir)
+        self.assertEqual(40, len(engine.movie_map))
+        found = engine.recommend_new_user([100, 102, 104], limit=5)
+        close_mongo_client()
+        self.assertEqual(5, len(found))
+        self.assertFalse({100, 102, 104} & set(found))
+        self.assertGreaterEqual(sum(i % 2 == 0 for i in found), 4)
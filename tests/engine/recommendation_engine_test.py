@@ -7,7 +7,7 @@ from unittest.mock import patch
 
 from scipy.sparse import coo_matrix
 
-from mediabridge.db.connect import connect_to_mongo
+from mediabridge.db.connect import close_mongo_client, connect_to_mongo
 from mediabridge.definitions import LIGHTFM_MODEL_PKL
 from mediabridge.engine.engine_etl import etl_mongo_movie_titles
 from mediabridge.engine.recommendation_engine import RecommendationEngine
@@ -28,7 +28,7 @@ class RecommendationEngineTest(unittest.TestCase):
         if _enabled:
             sys.stdin = sys.__stdin__
             sys.stdout = sys.__stdout__
-            self.engine.db.client.close()
+            close_mongo_client()
 
     def test_connect_to_mongo(self) -> None:
         if _enabled:
@@ -36,7 +36,7 @@ class RecommendationEngineTest(unittest.TestCase):
             num_collections = len(list(db.list_collections()))
             if num_collections == 0:
                 etl_mongo_movie_titles()
-            db.client.close()
+            close_mongo_client()
 
     def test_get_movie_id(self) -> None:
         if _enabled:
@@ -82,13 +82,14 @@ class RecommendationEngineTest(unittest.TestCase):
         if _enabled:
             matrix = self.engine.create_user_matrix(self.liked_movies_ids)
             assert isinstance(matrix, coo_matrix)
-            self.assertEqual((1, 16378), matrix.shape)
+            self.assertEqual((1, len(self.engine.movie_map)), matrix.shape)
+            self.assertEqual(2, matrix.nnz)
 
     @patch("builtins.input", return_value=dino_alien)
     def test_recommend(self, _mock_input: Any) -> None:
         if _enabled:
             sys.stdout = io.StringIO()
             self.assertEqual(
-                {0, 1},
-                self.engine.recommend(user_id=0),
+                {2},
+                self.engine.recommend(),
             )
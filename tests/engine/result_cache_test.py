@@ -0,0 +1,104 @@
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import numpy as np
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.db.connect import close_mongo_client
+from mediabridge.engine.model_artifact import export_model
+from mediabridge.engine.recommendation_engine import RecommendationEngine
+from mediabridge.engine.result_cache import ResultCache, cache_key, set_digest
+from tests.engine.fold_in_test import _two_tastes_model
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.db_file = Path(self.tmp.name) / "cache.sqlite"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_cache_key(self) -> None:
+        key = cache_key([16377, 1, 1], limit=5)
+        self.assertEqual(key, cache_key([1, 16377], limit=5))
+        self.assertNotEqual(key, cache_key([1, 16377], limit=6))
+        self.assertNotEqual(key, cache_key([1], [16377], limit=5))
+        self.assertNotEqual(key, cache_key([1, 16377], limit=5, exact=True))
+
+    def test_set_digest(self) -> None:
+        digest = set_digest(["16377", "1", "1"])
+        self.assertEqual(digest, set_digest([1, 16377]))
+        self.assertNotEqual(digest, set_digest([1]))
+
+    def test_lru(self) -> None:
+        cache = ResultCache(max_entries=2)
+        cache.put("v1", "a", [1])
+        cache.put("v1", "b", [2])
+        self.assertEqual([1], cache.get("v1", "a"))
+        cache.put("v1", "c", [3])  # evicts b, the least recently used
+        self.assertIsNone(cache.get("v1", "b"))
+        self.assertEqual([3], cache.get("v1", "c"))
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+
+    def test_new_version_invalidates(self) -> None:
+        cache = ResultCache(db_file=self.db_file)
+        cache.put("v1", "a", [1])
+        self.assertIsNone(cache.get("v2", "a"))
+        cache.put("v2", "b", [2])
+        self.assertEqual(1, len(cache))
+        count = "SELECT COUNT(*) FROM recommendation"
+        assert cache._conn
+        self.assertEqual((1,), cache._conn.execute(count).fetchone())
+        cache.close()
+
+    def test_persistent_tier(self) -> None:
+        writer = ResultCache(db_file=self.db_file)
+        writer.put("v1", "a", [1, 2])
+        writer.put("v1", "b", [3])
+        reader = ResultCache(db_file=self.db_file)
+        self.assertEqual([1, 2], reader.get("v1", "a"))
+        self.assertEqual(1, len(reader))
+
+        reader.max_rows = 1
+        reader.evict()
+        self.assertIsNone(ResultCache(db_file=self.db_file).get("v1", "a"))
+        reader.ttl_seconds = 0
+        reader.evict()
+        self.assertIsNone(ResultCache(db_file=self.db_file).get("v1", "b"))
+        writer.close()
+        reader.close()
+
+    def test_engine(self) -> None:
+        id_maps = IdMaps(
+            IdMap.from_ids(np.arange(200)), IdMap.from_ids(np.arange(40) + 100)
+        )
+        model = _two_tastes_model()
+        serving_dir = Path(self.tmp.name) / "serving"
+        export_model(model, id_maps, serving_dir)
+        with patch.dict(os.environ, {"MONGODB_URI": "mongodb://localhost:1"}):
+            engine = RecommendationEngine([], serving_dir, cache=ResultCache())
+        close_mongo_client()
+        assert engine._serving
+        engine._serving.refresh_seconds = 0
+
+        found = engine.recommend_new_user([100, 102], limit=5)
+        with patch.object(engine, "_recommend_new_user") as compute:
+            self.assertEqual(found, engine.recommend_new_user([102, 100], limit=5))
+            compute.assert_not_called()
+
+            export_model(model, id_maps, serving_dir)
+            compute.return_value = [101]
+            self.assertEqual([101], engine.recommend_new_user([100, 102], limit=5))
+            compute.assert_called_once()
+
+        # Each candidate set has its own entries.
+        with patch.dict(os.environ, {"MONGODB_URI": "mongodb://localhost:1"}):
+            some = RecommendationEngine(["103", "101"], serving_dir, cache=engine.cache)
+        close_mongo_client()
+        key = some._cache_key([100], [], 5, False)
+        self.assertNotEqual(key, engine._cache_key([100], [], 5, False))
+        self.assertEqual([101, 103], sorted(some.recommend_new_user([100], limit=5)))
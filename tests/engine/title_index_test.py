@@ -0,0 +1,87 @@
+import unittest
+from typing import Any
+from unittest.mock import patch
+
+from mediabridge.engine import title_index
+from mediabridge.engine.title_index import TitleIndex
+
+
+class FakeMovies:
+    """Just enough of a pymongo Collection, recording each query."""
+
+    def __init__(self, docs: list[dict[str, str]]) -> None:
+        self.docs = docs
+        self.queries: list[dict[str, Any]] = []
+
+    def estimated_document_count(self) -> int:
+        return len(self.docs)
+
+    def find(
+        self, query: dict[str, Any], projection: dict[str, int]
+    ) -> list[dict[str, str]]:
+        self.queries.append(query)
+        if not query:
+            return list(self.docs)
+        ((field, cond),) = query.items()
+        return [d for d in self.docs if d[field] in cond["$in"]]
+
+
+class TitleIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.movies = FakeMovies(
+            [
+                {"netflix_id": "1", "title": "Dinosaur Planet"},
+                {"netflix_id": "16377", "title": "The Green Mile"},
+                {"netflix_id": "9", "title": "Class of Nuke 'Em High 2"},
+            ]
+        )
+        self.index = TitleIndex(self.movies)
+
+    def test_lookups_need_no_queries(self) -> None:
+        self.assertEqual(3, len(self.index))
+        self.assertEqual(
+            ["The Green Mile", "Dinosaur Planet"], self.index.titles(["16377", "1"])
+        )
+        self.assertEqual(["9"], self.index.ids(["Class of Nuke 'Em High 2"]))
+        self.assertEqual([{}], self.movies.queries)
+
+    def test_misses_are_one_bulk_query(self) -> None:
+        self.movies.docs.append({"netflix_id": "2", "title": "Isle of Man TT 2004"})
+        self.assertEqual(
+            ["Isle of Man TT 2004", None, "Dinosaur Planet", None],
+            self.index.titles(["2", "99", "1", "98"]),
+        )
+        self.assertEqual(
+            {"netflix_id": {"$in": ["2", "98", "99"]}}, self.movies.queries[-1]
+        )
+        self.index.titles(["2", "99"])  # both now known, or known to be missing
+        self.index.ids(["Dinosaur Planet", "Alien Files"])
+        self.index.ids(["Alien Files"])
+        self.assertEqual(3, len(self.movies.queries))
+
+    def test_refresh(self) -> None:
+        self.index.refresh_seconds = 0
+        self.movies.docs.pop()
+        self.assertEqual([None], self.index.titles(["9"]))
+        self.assertEqual(2, len(self.index))
+
+    def test_max_age(self) -> None:
+        # A title edited in place leaves the count as is.
+        self.movies.docs[0] = {"netflix_id": "1", "title": "Dinosaur Planet (2003)"}
+        self.index.refresh_seconds = 0
+        self.assertEqual(["Dinosaur Planet"], self.index.titles(["1"]))
+        self.index.max_age_seconds = 0
+        self.assertEqual(["Dinosaur Planet (2003)"], self.index.titles(["1"]))
+
+    def test_misses_are_forgotten(self) -> None:
+        self.index.titles(["99"])
+        self.index.refresh_seconds = 0
+        self.movies.docs.append({"netflix_id": "99", "title": "Late Arrival"})
+        self.movies.docs.pop(0)  # the count is unchanged
+        self.assertEqual(["Late Arrival"], self.index.titles(["99"]))
+
+        with patch.object(title_index, "MAX_UNKNOWN", 2):
+            self.index.refresh_seconds = 60
+            self.index.titles(["97", "98"])
+            self.index.titles(["96"])
+            self.assertEqual({"96"}, self.index._unknown_ids)
@@ -0,0 +1,79 @@
+import pickle
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from lightfm.evaluation import auc_score, precision_at_k, recall_at_k
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.interaction_matrix import save_csr
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.data_processing.sampling import Sample, SampleBy
+from mediabridge.recommender.evaluate import evaluate
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.split import HoldOut, Split, split_ratings
+
+
+class EvaluateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        rng = np.random.default_rng(0)
+        pairs = np.unique(rng.integers(0, 300 * 60, 6_000))
+        user, movie = pairs // 60 + 1, pairs % 60 + 1
+        ratings = RatingBatch(
+            user_id=user.astype(np.uint32),
+            movie_id=movie.astype(np.uint16),
+            rating=np.where(user % 2 == movie % 2, 5, 1).astype(np.uint8),
+            day=np.zeros(len(pairs), dtype=np.uint16),
+        )
+        id_maps = IdMaps(IdMap.from_ids(user), IdMap.from_ids(movie))
+        split = Split(Sample(SampleBy.user, 0.5), HoldOut.random, fraction=0.3)
+        result = split_ratings([ratings], id_maps, split)
+        self.train, self.test = result.train, result.test
+        save_csr(self.train, id_maps, self.dir / "split/train")
+        save_csr(self.test, id_maps, self.dir / "split/test")
+        LightFM = import_lightfm_silently()
+        self.model = LightFM(no_components=8, loss="logistic", random_state=0)
+        self.model.fit(self.train.tocoo(), epochs=5)
+        with open(self.dir / "model.pkl", "wb") as fout:
+            pickle.dump(self.model, fout)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_matches_lightfm(self) -> None:
+        metrics = evaluate(self.dir / "model.pkl", self.dir / "split", k=5)
+        liked = self.test.multiply(self.test > 0).tocsr()
+        args = dict(test_interactions=liked, train_interactions=self.train)
+        self.assertEqual(len(precision_at_k(self.model, k=5, **args)), metrics.users)
+        expected = precision_at_k(self.model, k=5, **args).mean()
+        self.assertAlmostEqual(expected, metrics.precision, places=4)
+        expected = recall_at_k(self.model, k=5, **args).mean()
+        self.assertAlmostEqual(expected, metrics.recall, places=4)
+        self.assertAlmostEqual(
+            auc_score(self.model, **args).mean(), metrics.auc, delta=0.02
+        )
+        self.assertTrue(0 < metrics.coverage <= 1)
+
+    def test_parallel_and_sampled(self) -> None:
+        model_file, split_dir = self.dir / "model.pkl", self.dir / "split"
+        serial = evaluate(model_file, split_dir, chunk_users=1_000)
+        parallel = evaluate(model_file, split_dir, workers=2, chunk_users=16)
+        self.assertEqual(serial.users, parallel.users)
+        self.assertAlmostEqual(serial.auc, parallel.auc)
+        self.assertEqual(serial.coverage, parallel.coverage)
+
+        sampled = evaluate(
+            model_file, split_dir, sample=Sample(SampleBy.user, 0.5, seed=3)
+        )
+        self.assertLess(sampled.users, serial.users)
+        self.assertGreater(sampled.users, 0)
+
+    def test_sample_is_independent_of_the_split(self) -> None:
+        # The split chose its test users by Sample(SampleBy.user, 0.5) too.
+        model_file, split_dir = self.dir / "model.pkl", self.dir / "split"
+        everyone = evaluate(model_file, split_dir)
+        sampled = evaluate(model_file, split_dir, sample=Sample(SampleBy.user, 0.5))
+        self.assertAlmostEqual(0.5, sampled.users / everyone.users, delta=0.15)
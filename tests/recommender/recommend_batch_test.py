@@ -0,0 +1,138 @@
+import json
+import os
+import pickle
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pyarrow.parquet as pq
+from scipy.sparse import random as sparse_random
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.interaction_matrix import save_csr
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.data_processing.rating_store import build_rating_store
+from mediabridge.engine.fold_in import ItemFactors
+from mediabridge.recommender.import_utils import import_lightfm_silently
+from mediabridge.recommender.recommend_batch import (
+    BatchJob,
+    OutputFormat,
+    run_batch,
+    score_unrated,
+    top_k_rows,
+)
+
+
+class RecommendBatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        rng = np.random.default_rng(0)
+        matrix = sparse_random(50, 30, density=0.3, format="csr", random_state=rng)
+        matrix.data = np.where(matrix.data > 0.4, 1, -1).astype(np.int8)
+        self.matrix = matrix
+        self.id_maps = IdMaps(
+            IdMap.from_ids(np.arange(50) * 3 + 7), IdMap.from_ids(np.arange(30) + 1)
+        )
+        save_csr(matrix, self.id_maps, self.dir / "matrix")
+        LightFM = import_lightfm_silently()
+        self.model = LightFM(no_components=4, loss="logistic", random_state=0)
+        self.model.fit(matrix.tocoo(), epochs=2)
+        with open(self.dir / "model.pkl", "wb") as fout:
+            pickle.dump(self.model, fout)
+
+        # The matrix only has 1 and 5 star ratings, as ±1. The store has those,
+        # plus a 3 star rating of each user's favourite movie, that is unrated
+        # in the matrix.
+        factors = ItemFactors.from_model(self.model)
+        favourite = top_k_rows(
+            score_unrated(self.model.user_embeddings, factors, matrix), k=1
+        )[0][:, 0]
+        coo = matrix.tocoo()
+        users = np.concatenate([coo.row, np.arange(50)])
+        movies = np.concatenate([coo.col, favourite])
+        stars = np.concatenate([np.where(coo.data > 0, 5, 1), np.full(50, 3)])
+        ratings = RatingBatch(
+            user_id=self.id_maps.users.to_raw(users),
+            movie_id=self.id_maps.movies.to_raw(movies).astype(np.uint16),
+            rating=stars.astype(np.uint8),
+            day=np.zeros(len(users), dtype=np.uint16),
+        )
+        build_rating_store([ratings], self.dir / "ratings")
+        self.rated = set(zip(users.tolist(), movies.tolist()))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _job(self, fmt: OutputFormat, k: int = 5) -> BatchJob:
+        return BatchJob(
+            self.dir / "model.pkl",
+            self.dir / "matrix",
+            self.dir / "ratings",
+            self.dir / "out",
+            fmt,
+            k,
+            7,
+        )
+
+    def test_top_k_rows(self) -> None:
+        factors = ItemFactors.from_model(self.model)
+        users = self.model.user_embeddings
+        top, scores = top_k_rows(score_unrated(users, factors, self.matrix), k=5)
+        self.assertEqual((50, 5), top.shape)
+        for u in (0, 17, 49):
+            expected = factors.score(users[u])
+            expected[self.matrix[u].indices] = -np.inf
+            self.assertEqual(np.argsort(-expected)[:5].tolist(), top[u].tolist())
+            self.assertTrue((np.diff(scores[u]) <= 0).all())
+
+    def test_ndjson_and_resume(self) -> None:
+        job = self._job(OutputFormat.ndjson)
+        self.assertEqual(50, run_batch(job, workers=2))
+        parts = sorted(job.out_dir.glob("part-*"))
+        self.assertEqual(8, len(parts))  # ceil(50 / 7)
+        rows = [json.loads(line) for p in parts for line in open(p)]
+        self.assertEqual(
+            self.id_maps.users.raw_ids.tolist(), [r["user_id"] for r in rows]
+        )
+        for row in rows:
+            user = int(self.id_maps.users.to_dense([row["user_id"]])[0])
+            movies = self.id_maps.movies.to_dense(row["movie_ids"]).tolist()
+            self.assertEqual(5, len(movies))
+            # Not even the 3 star favourite, that the matrix lacks.
+            self.assertFalse({(user, m) for m in movies} & self.rated)
+
+        parts[3].unlink()
+        self.assertEqual(7, run_batch(job, workers=2))  # just the missing block
+        self.assertEqual(0, run_batch(job))
+
+    def test_changed_job_restarts(self) -> None:
+        run_batch(self._job(OutputFormat.ndjson))
+        # Another k, or a retrained model, invalidates every block.
+        job = self._job(OutputFormat.ndjson, k=3)
+        self.assertEqual(50, run_batch(job))
+        rows = [
+            json.loads(line) for p in job.out_dir.glob("part-*") for line in open(p)
+        ]
+        self.assertEqual({3}, {len(row["movie_ids"]) for row in rows})
+
+        os.utime(job.model_file, ns=(0, 0))
+        self.assertEqual(50, run_batch(job))
+        self.assertEqual(0, run_batch(job))
+
+    def test_other_id_maps(self) -> None:
+        other = IdMaps(self.id_maps.users, IdMap.from_ids(np.arange(31) + 1))
+        other.save(self.dir / "other")
+        job = replace(self._job(OutputFormat.ndjson), matrix_dir=self.dir / "other")
+        with self.assertRaisesRegex(ValueError, "30 movies"):
+            run_batch(job)
+
+    def test_parquet(self) -> None:
+        job = self._job(OutputFormat.parquet)
+        run_batch(job)
+        table = pq.read_table(job.out_dir)
+        self.assertEqual(50, table.num_rows)
+        self.assertEqual(["user_id", "movie_ids", "scores"], table.column_names)
+        self.assertEqual(5, len(table["movie_ids"][0].as_py()))
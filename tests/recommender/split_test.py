@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.interaction_matrix import build_matrix
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.data_processing.sampling import Sample, SampleBy
+from mediabridge.recommender.split import HoldOut, Split, split_ratings
+
+
+def _chunks(ratings: RatingBatch, size: int) -> list[RatingBatch]:
+    return [ratings[i : i + size] for i in range(0, len(ratings), size)]
+
+
+class SplitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        pairs = np.unique(rng.integers(0, 200 * 50, 4_000))
+        self.ratings = RatingBatch(
+            user_id=(pairs // 50 * 7 + 1).astype(np.uint32),
+            movie_id=(pairs % 50 + 1).astype(np.uint16),
+            rating=rng.choice(np.array([1, 3, 5], dtype=np.uint8), len(pairs)),
+            day=rng.integers(12_000, 12_100, len(pairs)).astype(np.uint16),
+        )
+        self.id_maps = IdMaps(
+            IdMap.from_ids(self.ratings.user_id), IdMap.from_ids(np.arange(1, 51))
+        )
+        self.full = build_matrix([self.ratings], self.id_maps)
+        self.sample = Sample(SampleBy.user, 0.25, seed=1)
+
+    def _check_partition(self, split: Split) -> tuple[RatingBatch, RatingBatch]:
+        """Checks the train and test matrices partition the full one."""
+        result = split_ratings(_chunks(self.ratings, 333), self.id_maps, split)
+        self.assertEqual(self.full.shape, result.train.shape)
+        self.assertEqual(0, result.train.multiply(result.test).nnz)
+        self.assertEqual(0, abs(result.train + result.test - self.full).sum())
+        test_users = self.id_maps.users.to_raw(result.test_rows)
+        self.assertTrue(split.is_test_user(test_users).all())
+
+        kept = self.ratings[np.flatnonzero(self.ratings.rating != 3)]
+        tested = kept[np.flatnonzero(split.is_test_user(kept.user_id))]
+        rows = self.id_maps.users.to_dense(tested.user_id)
+        cols = self.id_maps.movies.to_dense(tested.movie_id)
+        held = np.asarray(result.test[rows, cols]).ravel() != 0
+        return tested[np.flatnonzero(held)], tested[np.flatnonzero(~held)]
+
+    def test_random(self) -> None:
+        split = Split(self.sample, HoldOut.random, fraction=0.3)
+        held, revealed = self._check_partition(split)
+        self.assertAlmostEqual(0.3, len(held) / (len(held) + len(revealed)), delta=0.1)
+
+    def test_last(self) -> None:
+        split = Split(self.sample, HoldOut.last, last_n=2)
+        held, revealed = self._check_partition(split)
+        for user in np.unique(held.user_id).tolist():
+            days = held.day[held.user_id == user]
+            earlier = revealed.day[revealed.user_id == user]
+            self.assertEqual(min(2, len(days) + len(earlier)), len(days))
+            self.assertTrue((earlier <= days.min()).all())
+
+    def test_movies(self) -> None:
+        movie_ids = np.arange(30, 51, dtype=np.uint16)
+        test_users = np.unique(self.ratings.user_id)[:20]
+        split = Split(test_users, HoldOut.movies, movie_ids=movie_ids)
+        held, revealed = self._check_partition(split)
+        self.assertTrue(np.isin(held.movie_id, movie_ids).all())
+        self.assertFalse(np.isin(revealed.movie_id, movie_ids).any())
+        self.assertLessEqual(len(np.unique(held.user_id)), 20)
+
+    def test_chunking_does_not_matter(self) -> None:
+        split = Split(self.sample, HoldOut.last, last_n=3)
+        whole = split_ratings([self.ratings], self.id_maps, split)
+        chunked = split_ratings(_chunks(self.ratings, 10), self.id_maps, split)
+        self.assertEqual(0, abs(whole.test - chunked.test).sum())
+        self.assertEqual(0, split_ratings([], self.id_maps, split).train.nnz)
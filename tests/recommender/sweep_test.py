@@ -0,0 +1,69 @@
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy.sparse import random as sparse_random
+
+from mediabridge.recommender.sweep import (
+    SweepParams,
+    attach_coo,
+    attach_csr,
+    run_sweep,
+    shared_csr,
+    shared_interactions,
+)
+
+
+class SweepTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        full = sparse_random(100, 30, density=0.2, format="csr", random_state=rng)
+        full.data = np.where(full.data > 0.3, 1, -1).astype(np.int8)
+        held = rng.random(full.nnz) < 0.2
+        self.train = full.copy()
+        self.train.data[held] = 0
+        self.train.eliminate_zeros()
+        self.test = (full - self.train).tocsr()
+
+    def test_shared_csr(self) -> None:
+        blocks: list[SharedMemory] = []
+        with shared_csr(self.train) as spec:
+            matrix = attach_csr(spec, blocks)
+            self.assertEqual(self.train.shape, matrix.shape)
+            self.assertEqual(0, abs(matrix - self.train).sum())
+            for shm in blocks:
+                shm.close()
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(spec.data.name)  # unlinked on exit
+
+    def test_shared_interactions(self) -> None:
+        blocks: list[SharedMemory] = []
+        with shared_interactions(self.train) as spec:
+            matrix = attach_coo(spec, blocks)
+            # As LightFM fits them, so no worker needs to convert a copy.
+            self.assertEqual(np.float32, matrix.data.dtype)
+            self.assertEqual(np.int32, matrix.row.dtype)
+            self.assertEqual(np.int32, matrix.col.dtype)
+            self.assertEqual(0, abs(matrix.tocsr() - self.train).sum())
+            del matrix
+            for shm in blocks:
+                shm.close()
+
+    def test_run_sweep(self) -> None:
+        grid = [SweepParams(4, "logistic", 0.05), SweepParams(8, "warp", 0.05)]
+        results = run_sweep(
+            self.train, self.test, grid, [2, 1], k=5, workers=2, num_threads=1
+        )
+        self.assertEqual(4, len(results))
+        self.assertEqual(
+            {(4, 1), (4, 2), (8, 1), (8, 2)},
+            {(r.no_components, r.epochs) for r in results},
+        )
+        scores = [r.score for r in results]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+        for params in grid:
+            one, two = sorted(
+                (r for r in results if r.no_components == params.no_components),
+                key=lambda r: r.epochs,
+            )
+            self.assertLess(one.seconds, two.seconds)
@@ -0,0 +1,133 @@
+import pickle
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from typer.testing import CliRunner
+
+from mediabridge.data_processing.id_map import IdMap, IdMaps
+from mediabridge.data_processing.interaction_matrix import load_csr, save_csr
+from mediabridge.data_processing.rating_parser import RatingBatch
+from mediabridge.data_processing.sampling import Sample, SampleBy
+from mediabridge.recommender.split import HoldOut, Split, split_ratings
+from mediabridge.recommender.train_model import (
+    Checkpoint,
+    TrainConfig,
+    app,
+    fit_with_early_stopping,
+)
+
+
+class TrainModelTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.checkpoint_dir = Path(self.tmp.name) / "checkpoint"
+        # Two tastes: odd users like odd movies, even users like even ones.
+        rng = np.random.default_rng(0)
+        pairs = np.unique(rng.integers(0, 300 * 60, 6_000))
+        user, movie = pairs // 60 + 1, pairs % 60 + 1
+        self.ratings = RatingBatch(
+            user_id=user.astype(np.uint32),
+            movie_id=movie.astype(np.uint16),
+            rating=np.where(user % 2 == movie % 2, 5, 1).astype(np.uint8),
+            day=np.zeros(len(pairs), dtype=np.uint16),
+        )
+        self.id_maps = IdMaps(IdMap.from_ids(user), IdMap.from_ids(movie))
+        split = Split(Sample(SampleBy.user, 0.2), HoldOut.random, fraction=0.3)
+        result = split_ratings([self.ratings], self.id_maps, split)
+        self.train, self.test = result.train, result.test
+        self.config = TrainConfig(no_components=8, k=5)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _fit(self, max_epochs: int, config: TrainConfig | None = None) -> Checkpoint:
+        return fit_with_early_stopping(
+            self.train,
+            self.test,
+            config or self.config,
+            self.checkpoint_dir,
+            max_epochs=max_epochs,
+            patience=100,
+            num_threads=1,
+        )
+
+    def test_checkpoint_and_resume(self) -> None:
+        first = self._fit(max_epochs=3)
+        self.assertEqual(3, first.epoch)
+        with open(self.checkpoint_dir / "best.pkl", "rb") as fin:
+            best = pickle.load(fin)
+        self.assertEqual((60, 8), best.item_embeddings.shape)
+
+        resumed = self._fit(max_epochs=5)
+        self.assertEqual(5, resumed.epoch)
+        self.assertEqual(first.scores, resumed.scores[:3])
+        self.assertGreater(resumed.scores[-1], resumed.scores[0])  # it learns
+
+        restarted = self._fit(max_epochs=1, config=TrainConfig(no_components=4, k=5))
+        self.assertEqual(1, restarted.epoch)
+
+    def _save_split(self) -> Path:
+        split_dir = Path(self.tmp.name) / "split"
+        save_csr(self.train, self.id_maps, split_dir / "train")
+        save_csr(self.test, self.id_maps, split_dir / "test")
+        return split_dir
+
+    def test_fits_the_saved_split(self) -> None:
+        split_dir = self._save_split()
+        self.train = load_csr(split_dir / "train")
+        self.test = load_csr(split_dir / "test")
+        self.assertFalse(self.train.data.flags.writeable)
+        self.assertEqual(2, self._fit(max_epochs=2).epoch)
+
+    def test_train_needs_a_best_model(self) -> None:
+        split_dir = self._save_split()
+        args = [
+            f"--split-dir={split_dir}",
+            f"--out-file={Path(self.tmp.name) / 'model.pkl'}",
+            f"--checkpoint-dir={self.checkpoint_dir}",
+            "--components=8",
+            "--k=5",
+            "--threads=1",
+            "--no-export",
+        ]
+        runner = CliRunner()
+        self.assertEqual(2, runner.invoke(app, [*args, "--max-epochs=0"]).exit_code)
+
+        self.assertEqual(0, runner.invoke(app, [*args, "--max-epochs=2"]).exit_code)
+        (self.checkpoint_dir / "best.pkl").unlink()
+        result = runner.invoke(app, [*args, "--max-epochs=2"])  # already finished
+        self.assertEqual(1, result.exit_code)
+        self.assertIn("--no-resume", result.output)
+
+    def test_new_split_restarts(self) -> None:
+        self.assertEqual(3, self._fit(max_epochs=3).epoch)
+        self.assertEqual(3, self._fit(max_epochs=1).epoch)  # resumed, at epoch 3
+        # A split that holds out different ratings, with the same shape.
+        split = Split(Sample(SampleBy.user, 0.2, seed=1), HoldOut.random, 0.3)
+        result = split_ratings([self.ratings], self.id_maps, split)
+        self.assertEqual(self.train.shape, result.train.shape)
+        self.train, self.test = result.train, result.test
+        self.assertEqual(1, self._fit(max_epochs=1).epoch)
+
+    def test_stale_epochs(self) -> None:
+        checkpoint = Checkpoint(model=None, config=self.config)
+        self.assertEqual(0, checkpoint.stale_epochs())
+        checkpoint.scores = [0.1, 0.3, 0.2, 0.3, 0.30001]
+        self.assertEqual(5, checkpoint.best_epoch)
+        self.assertEqual(0, checkpoint.stale_epochs())
+        self.assertEqual(3, checkpoint.stale_epochs(min_delta=1e-3))
+
+    def test_early_stopping(self) -> None:
+        checkpoint = fit_with_early_stopping(
+            self.train,
+            self.test,
+            self.config,
+            self.checkpoint_dir,
+            max_epochs=100,
+            patience=2,
+            min_delta=1.0,  # no epoch can improve that much
+            num_threads=1,
+        )
+        self.assertEqual(3, checkpoint.epoch)
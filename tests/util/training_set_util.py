@@ -0,0 +1,18 @@
+from pathlib import Path
+
+# movie_id -> [(user_id, rating, date), ...]
+RATINGS = {
+    1: [(30, 3, "2005-09-06"), (6, 5, "2005-05-13")],
+    2: [(7, 1, "2004-02-17")],
+    3: [(6, 4, "2003-01-05"), (8, 2, "2004-07-21"), (9, 5, "2005-12-30")],
+}
+
+
+def write_training_set(
+    training_dir: Path,
+    ratings: dict[int, list[tuple[int, int, str]]] = RATINGS,
+) -> None:
+    """Writes a tiny training_set folder, in the Netflix prize mv_00*.txt format."""
+    for movie_id, rows in ratings.items():
+        lines = [f"{movie_id}:"] + [f"{u},{r},{d}" for u, r, d in rows]
+        (training_dir / f"mv_{movie_id:07d}.txt").write_text("\n".join(lines) + "\n")